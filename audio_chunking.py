@@ -0,0 +1,89 @@
+import os
+import re
+import shutil
+import subprocess
+
+_WORD_NORMALIZE = re.compile(r'[^\w]+', re.UNICODE)
+SEGMENT_PLACEHOLDER = "[…]"  # на месте отрезка длинного аудио, который не удалось распознать
+
+def ffmpeg_available() -> bool:
+	"""Проверяет, что ffmpeg и ffprobe доступны в PATH"""
+	return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+def probe_duration(path: str) -> float | None:
+	"""Возвращает длительность аудио в секундах через ffprobe"""
+	try:
+		result = subprocess.run(
+			["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+			capture_output=True, text=True, timeout=30, check=True,
+		)
+		return float(result.stdout.strip())
+	except (subprocess.SubprocessError, ValueError, OSError):
+		return None
+
+def plan_segments(duration: float, segment_seconds: float, overlap_seconds: float) -> list[tuple[float, float]]:
+	"""Разбивает длительность на отрезки (начало, длина) с перекрытием"""
+	if duration <= segment_seconds:
+		return [(0.0, duration)]
+	step = segment_seconds - overlap_seconds
+	segments = []
+	start = 0.0
+	while start < duration:
+		length = min(segment_seconds, duration - start)
+		segments.append((start, length))
+		if start + length >= duration:
+			break
+		start += step
+	return segments
+
+def extract_segment(path: str, start: float, length: float, out_path: str) -> str:
+	"""Вырезает отрезок и пережимает его в компактный моно opus (16 кГц), которого достаточно для Whisper"""
+	subprocess.run(
+		[
+			"ffmpeg", "-v", "error", "-y",
+			"-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", path,
+			"-vn", "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k",
+			out_path,
+		],
+		capture_output=True, timeout=300, check=True,
+	)
+	return out_path
+
+def _normalize(word: str) -> str:
+	return _WORD_NORMALIZE.sub('', word.lower())
+
+def stitch_transcripts(parts: list[str | None], max_overlap_words: int = 40) -> str:
+	"""Склеивает транскрипции соседних отрезков, убирая повтор на стыке. None — нераспознанный отрезок:
+	на его месте ставится SEGMENT_PLACEHOLDER (один на несколько подряд), а следующий отрезок
+	приклеивается без поиска повтора — его начало перекрывается с потерянным, а не с предыдущим текстом"""
+	words: list[str] = []
+	after_gap = False
+	for part in parts:
+		if part is None:
+			if not after_gap:
+				words.append(SEGMENT_PLACEHOLDER)
+			after_gap = True
+			continue
+
+		part_words = part.split()
+		if not words or after_gap:
+			words.extend(part_words)
+			after_gap = False
+			continue
+
+		tail = [_normalize(w) for w in words[-max_overlap_words:]]
+		head = [_normalize(w) for w in part_words[:max_overlap_words]]
+		overlap = 0
+		for size in range(min(len(tail), len(head)), 0, -1):
+			if tail[-size:] == head[:size]:
+				overlap = size
+				break
+		words.extend(part_words[overlap:])
+	return " ".join(words)
+
+def cleanup(paths: list[str]) -> None:
+	for path in paths:
+		try:
+			os.remove(path)
+		except OSError:
+			pass
@@ -0,0 +1,243 @@
+"""Локальные заглушки Telegram Bot API и Groq API для нагрузочных тестов.
+
+Обе заглушки — aiohttp-приложения с настраиваемой задержкой и долей ошибок. FakeTelegram
+отдает бота апдейты через long polling (getUpdates) и замечает момент, когда бот закончил ответ:
+последняя часть ответа приходит с клавиатурой чата (кнопка "regenerate")."""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+# Минимальные валидные файлы: содержимое заглушкам не важно, важен размер и путь
+FAKE_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 20_000 + b"\xff\xd9"
+FAKE_OGG = b"OggS" + b"\x00" * 30_000
+
+@dataclass
+class Latency:
+	"""Задержка ответа: base плюс равномерный разброс до jitter секунд; error_rate — доля ответов 500"""
+	base: float = 0.0
+	jitter: float = 0.0
+	error_rate: float = 0.0
+
+	async def apply(self) -> bool:
+		"""Ждет задержку и возвращает True, если этот ответ должен завершиться ошибкой"""
+		delay = self.base + random.uniform(0, self.jitter)
+		if delay > 0:
+			await asyncio.sleep(delay)
+		return random.random() < self.error_rate
+
+@dataclass
+class PendingRequest:
+	kind: str
+	sent_at: float
+	done: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+class FakeTelegram:
+	def __init__(self, token: str, latency: Latency) -> None:
+		self.token = token
+		self.latency = latency
+		self.updates: list[dict] = []
+		self._update_id = 0
+		self._message_id = 1_000_000
+		self._new_updates = asyncio.Event()
+		# chat_id -> ожидающие ответа запросы в порядке отправки
+		self.pending: dict[int, list[PendingRequest]] = {}
+		self.calls: dict[str, int] = {}
+
+	def app(self) -> web.Application:
+		app = web.Application(client_max_size=64 * 1024 * 1024)
+		app.router.add_post(f"/bot{self.token}/{{method}}", self._api)
+		app.router.add_get(f"/file/bot{self.token}/{{path:.+}}", self._file)
+		return app
+
+	def _next_message_id(self) -> int:
+		self._message_id += 1
+		return self._message_id
+
+	# --- Апдейты от "пользователей" ---
+
+	@staticmethod
+	def _user(user_id: int) -> dict:
+		return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+	def _message(self, user_id: int, **content) -> dict:
+		return {
+			"message_id": self._next_message_id(),
+			"date": int(time.time()),
+			"chat": {"id": user_id, "type": "private"},
+			"from": self._user(user_id),
+			**content,
+		}
+
+	def _push(self, message: dict) -> None:
+		self._update_id += 1
+		self.updates.append({"update_id": self._update_id, "message": message})
+		self._new_updates.set()
+
+	def _expect(self, user_id: int, kind: str) -> PendingRequest:
+		request = PendingRequest(kind, time.perf_counter())
+		self.pending.setdefault(user_id, []).append(request)
+		return request
+
+	@staticmethod
+	def _photo(file_key: str) -> list[dict]:
+		return [{
+			"file_id": f"photo-{file_key}", "file_unique_id": f"p{file_key}",
+			"width": 1280, "height": 960, "file_size": len(FAKE_JPEG),
+		}]
+
+	def send_text(self, user_id: int, text: str) -> PendingRequest:
+		request = self._expect(user_id, "text")
+		self._push(self._message(user_id, text=text))
+		return request
+
+	def send_photo(self, user_id: int, file_key: str, caption: str = "") -> PendingRequest:
+		request = self._expect(user_id, "photo")
+		self._push(self._message(user_id, photo=self._photo(file_key), caption=caption or None))
+		return request
+
+	def send_album(self, user_id: int, file_keys: list[str], caption: str = "") -> PendingRequest:
+		request = self._expect(user_id, "album")
+		# Как в Telegram: у каждого отправленного альбома свой media_group_id, даже если файлы те же
+		group_id = f"group-{self._next_message_id()}"
+		for i, file_key in enumerate(file_keys):
+			self._push(self._message(
+				user_id, photo=self._photo(file_key), media_group_id=group_id,
+				caption=caption if i == 0 and caption else None,
+			))
+		return request
+
+	def send_voice(self, user_id: int, file_key: str, duration: int = 5) -> PendingRequest:
+		request = self._expect(user_id, "voice")
+		self._push(self._message(user_id, voice={
+			"file_id": f"voice-{file_key}", "file_unique_id": f"v{file_key}",
+			"duration": duration, "mime_type": "audio/ogg", "file_size": len(FAKE_OGG),
+		}))
+		return request
+
+	# --- Bot API ---
+
+	def _complete_if_final(self, params: dict) -> None:
+		"""Последняя часть ответа несет клавиатуру чата — по ней считаем ответ доставленным"""
+		if "regenerate" not in (params.get("reply_markup") or ""):
+			return
+		queue = self.pending.get(int(params.get("chat_id", 0)))
+		if queue:
+			request = queue.pop(0)
+			if not request.done.done():
+				request.done.set_result(time.perf_counter() - request.sent_at)
+
+	async def _get_updates(self, params: dict) -> list[dict]:
+		offset = int(params.get("offset") or 0)
+		timeout = float(params.get("timeout") or 0)
+		self.updates = [u for u in self.updates if u["update_id"] >= offset]
+		if not self.updates and timeout:
+			self._new_updates.clear()
+			try:
+				await asyncio.wait_for(self._new_updates.wait(), timeout)
+			except asyncio.TimeoutError:
+				pass
+		return self.updates[:100]
+
+	async def _api(self, request: web.Request) -> web.Response:
+		method = request.match_info["method"]
+		params = dict(await request.post())
+		self.calls[method] = self.calls.get(method, 0) + 1
+
+		if method == "getUpdates":
+			return web.json_response({"ok": True, "result": await self._get_updates(params)})
+		if method == "getMe":
+			return web.json_response({"ok": True, "result": {
+				"id": 1, "is_bot": True, "first_name": "UmaBot", "username": "uma_load_bot",
+			}})
+
+		if await self.latency.apply():
+			return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500)
+
+		chat_id = int(params.get("chat_id") or 0)
+		if method in ("sendMessage", "editMessageText"):
+			self._complete_if_final(params)
+			return web.json_response({"ok": True, "result": {
+				"message_id": int(params.get("message_id") or self._next_message_id()),
+				"date": int(time.time()),
+				"chat": {"id": chat_id, "type": "private"},
+				"text": params.get("text", ""),
+			}})
+		if method == "getFile":
+			file_id = params.get("file_id", "")
+			is_voice = file_id.startswith("voice-")
+			return web.json_response({"ok": True, "result": {
+				"file_id": file_id,
+				"file_unique_id": file_id.split("-", 1)[-1],
+				"file_size": len(FAKE_OGG if is_voice else FAKE_JPEG),
+				"file_path": f"{'voice' if is_voice else 'photos'}/{file_id}.{'oga' if is_voice else 'jpg'}",
+			}})
+		# sendChatAction, answerCallbackQuery, deleteMessage и прочее
+		return web.json_response({"ok": True, "result": True})
+
+	async def _file(self, request: web.Request) -> web.Response:
+		if await self.latency.apply():
+			return web.Response(status=500)
+		path = request.match_info["path"]
+		return web.Response(body=FAKE_OGG if path.startswith("voice/") else FAKE_JPEG)
+
+class FakeGroq:
+	"""OpenAI-совместимые эндпоинты Groq: chat completions и транскрипция"""
+
+	def __init__(self, latency: Latency, transcription_latency: Latency | None = None, reply_chars: int = 1200) -> None:
+		self.latency = latency
+		self.transcription_latency = transcription_latency or latency
+		self.reply_chars = reply_chars
+		self.calls: dict[str, int] = {}
+
+	def app(self) -> web.Application:
+		app = web.Application(client_max_size=64 * 1024 * 1024)
+		app.router.add_post("/openai/v1/chat/completions", self._chat)
+		app.router.add_post("/openai/v1/audio/transcriptions", self._transcription)
+		return app
+
+	def _reply(self) -> str:
+		paragraph = "<b>Ответ:</b> это синтетический ответ модели для нагрузочного теста. "
+		text = (paragraph * (self.reply_chars // len(paragraph) + 1))[:self.reply_chars]
+		return text.rsplit(" ", 1)[0]
+
+	async def _chat(self, request: web.Request) -> web.Response:
+		self.calls["chat"] = self.calls.get("chat", 0) + 1
+		body = await request.json()
+		if await self.latency.apply():
+			return web.json_response({"error": {"message": "injected failure", "type": "server_error"}}, status=500)
+		prompt_tokens = sum(len(json.dumps(m.get("content", ""), ensure_ascii=False)) for m in body["messages"]) // 4
+		content = self._reply()
+		completion_tokens = len(content) // 4
+		return web.json_response({
+			"id": f"chatcmpl-{time.time_ns()}",
+			"object": "chat.completion",
+			"created": int(time.time()),
+			"model": body["model"],
+			"choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+			"usage": {
+				"prompt_tokens": prompt_tokens,
+				"completion_tokens": completion_tokens,
+				"total_tokens": prompt_tokens + completion_tokens,
+			},
+		})
+
+	async def _transcription(self, request: web.Request) -> web.Response:
+		self.calls["transcription"] = self.calls.get("transcription", 0) + 1
+		# Вычитываем загрузку целиком, как настоящий сервер
+		await request.read()
+		if await self.transcription_latency.apply():
+			return web.json_response({"error": {"message": "injected failure", "type": "server_error"}}, status=500)
+		return web.json_response({"text": "Расскажи, пожалуйста, какая завтра будет погода в Москве"})
+
+async def start_app(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+	"""Запускает приложение и возвращает (runner, базовый URL)"""
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+	site = web.TCPSite(runner, host, port)
+	await site.start()
+	bound_port = site._server.sockets[0].getsockname()[1]
+	return runner, f"http://{host}:{bound_port}"
@@ -0,0 +1,185 @@
+"""Нагрузочный тест UmaBot против локальных заглушек Telegram и Groq.
+
+Каждый виртуальный пользователь отправляет сообщение, ждет полного ответа бота и сразу отправляет
+следующее (замкнутый цикл). Задержка считается от появления апдейта в getUpdates до последней части
+ответа. Запуск из корня репозитория:
+
+	python -m benchmarks.load_test --users 50 --messages 20 --groq-latency 0.8 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Модули бота лежат в корне репозитория; тест меняет рабочий каталог, поэтому путь фиксируется заранее
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fakes import FakeGroq, FakeTelegram, Latency, start_app
+
+TOKEN = "123456:LOADTEST"
+TEXTS = [
+	"Как дела?",
+	"Объясни, почему небо голубое, и приведи пару примеров из физики",
+	"Напиши короткое стихотворение про осень",
+	"Какой сейчас курс доллара?",
+	"Что посмотреть вечером?",
+	"Сравни Python и Go для backend-разработки",
+]
+
+def percentile(values: list[float], p: float) -> float:
+	"""Перцентиль по ближайшему рангу"""
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	rank = max(1, math.ceil(p / 100 * len(ordered)))
+	return ordered[rank - 1]
+
+def parse_mix(value: str) -> dict[str, float]:
+	mix = {}
+	for part in value.split(","):
+		kind, weight = part.split("=")
+		mix[kind.strip()] = float(weight)
+	unknown = set(mix) - {"text", "photo", "album", "voice"}
+	if unknown:
+		raise argparse.ArgumentTypeError(f"Неизвестные типы трафика: {', '.join(sorted(unknown))}")
+	return mix
+
+def summarize(latencies: dict[str, list[float]], timeouts: dict[str, int], elapsed: float) -> dict:
+	report = {"elapsed_seconds": round(elapsed, 3), "types": {}}
+	everything = []
+	for kind in sorted(set(latencies) | set(timeouts)):
+		values = latencies.get(kind, [])
+		everything.extend(values)
+		report["types"][kind] = {
+			"completed": len(values),
+			"timeouts": timeouts.get(kind, 0),
+			"p50": round(percentile(values, 50), 4),
+			"p95": round(percentile(values, 95), 4),
+			"p99": round(percentile(values, 99), 4),
+		}
+	report["total"] = {
+		"completed": len(everything),
+		"timeouts": sum(timeouts.values()),
+		"throughput_per_second": round(len(everything) / elapsed, 3) if elapsed else 0.0,
+		"p50": round(percentile(everything, 50), 4),
+		"p95": round(percentile(everything, 95), 4),
+		"p99": round(percentile(everything, 99), 4),
+	}
+	return report
+
+async def run_user(telegram: FakeTelegram, user_id: int, args, latencies, timeouts, rng: random.Random) -> None:
+	kinds, weights = zip(*args.mix.items())
+	for n in range(args.messages):
+		kind = rng.choices(kinds, weights)[0]
+		# Ключ файла уникален, если не задан --repeat-media: иначе ответы возьмутся из кэша медиа
+		key = f"{user_id}-{n}" if not args.repeat_media else f"shared-{n % 3}"
+		if kind == "text":
+			request = telegram.send_text(user_id, rng.choice(TEXTS))
+		elif kind == "photo":
+			request = telegram.send_photo(user_id, key, caption=rng.choice(["", "Что на фото?"]))
+		elif kind == "album":
+			request = telegram.send_album(user_id, [f"{key}-{i}" for i in range(args.album_size)], caption="Сравни фото")
+		else:
+			request = telegram.send_voice(user_id, key)
+		try:
+			latencies.setdefault(kind, []).append(await asyncio.wait_for(asyncio.shield(request.done), args.timeout))
+		except asyncio.TimeoutError:
+			timeouts[kind] = timeouts.get(kind, 0) + 1
+			# Ответ, который так и не пришел, больше не ждем
+			queue = telegram.pending.get(user_id, [])
+			if request in queue:
+				queue.remove(request)
+		if args.think_time:
+			await asyncio.sleep(rng.uniform(0, args.think_time))
+
+async def main(args) -> dict:
+	telegram = FakeTelegram(TOKEN, Latency(args.telegram_latency, args.telegram_jitter, args.telegram_errors))
+	groq = FakeGroq(
+		Latency(args.groq_latency, args.groq_jitter, args.groq_errors),
+		Latency(args.transcription_latency, args.groq_jitter, args.groq_errors),
+	)
+	telegram_runner, telegram_url = await start_app(telegram.app())
+	groq_runner, groq_url = await start_app(groq.app())
+
+	# Конфигурация бота читается при импорте, поэтому окружение выставляется до него
+	workdir = tempfile.mkdtemp(prefix="umabot-load-")
+	os.chdir(workdir)
+	os.environ.update({
+		"TELEGRAM_BOT_TOKEN": TOKEN,
+		"TELEGRAM_API_BASE": telegram_url,
+		"GROQ_API_KEY": "gsk_load_test",
+		"GROQ_BASE_URL": groq_url,
+		"SEARCH_BACKEND": "stub",
+		"MEDIA_CACHE_DIR": os.path.join(workdir, "media_cache"),
+		"ADMIN_USER_ID": "1",
+	})
+	from main import UmaBot
+
+	# Бот запускается как в продакшене: прогрев базы, готовность, остановка с дожиданием запросов
+	bot = UmaBot()
+	running = asyncio.create_task(bot.run())
+	ready = asyncio.create_task(bot.ready.wait())
+	await asyncio.wait({running, ready}, return_when=asyncio.FIRST_COMPLETED)
+	if not ready.done():
+		ready.cancel()
+		await running  # прогрев не удался: run() завершится с ошибкой загрузки базы
+		raise RuntimeError("Бот остановился, не дойдя до готовности")
+	latencies: dict[str, list[float]] = {}
+	timeouts: dict[str, int] = {}
+	rng = random.Random(args.seed)
+	start = time.perf_counter()
+	try:
+		await asyncio.gather(*(
+			run_user(telegram, 10_000 + i, args, latencies, timeouts, random.Random(rng.random()))
+			for i in range(args.users)
+		))
+	finally:
+		elapsed = time.perf_counter() - start
+		# shutdown() сам закрывает сессию бота и базу
+		bot.request_stop()
+		await running
+		await telegram_runner.cleanup()
+		await groq_runner.cleanup()
+
+	report = summarize(latencies, timeouts, elapsed)
+	report["config"] = {key: value for key, value in vars(args).items() if key != "json"}
+	report["calls"] = {"telegram": telegram.calls, "groq": groq.calls}
+	report["workdir"] = workdir
+	return report
+
+def build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description="Нагрузочный тест UmaBot на локальных заглушках API")
+	parser.add_argument("--users", type=int, default=20, help="одновременных пользователей")
+	parser.add_argument("--messages", type=int, default=10, help="сообщений на пользователя")
+	parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=0.6,photo=0.2,album=0.1,voice=0.1"),
+						help="доли трафика, например text=0.6,photo=0.2,album=0.1,voice=0.1")
+	parser.add_argument("--album-size", type=int, default=3)
+	parser.add_argument("--repeat-media", action="store_true", help="повторять одни и те же файлы (проверка кэша медиа)")
+	parser.add_argument("--think-time", type=float, default=0.0, help="максимальная пауза пользователя между сообщениями, с")
+	parser.add_argument("--timeout", type=float, default=60.0, help="сколько ждать ответа, с")
+	parser.add_argument("--telegram-latency", type=float, default=0.03)
+	parser.add_argument("--telegram-jitter", type=float, default=0.02)
+	parser.add_argument("--telegram-errors", type=float, default=0.0, help="доля ответов Bot API с ошибкой 500")
+	parser.add_argument("--groq-latency", type=float, default=0.5)
+	parser.add_argument("--groq-jitter", type=float, default=0.3)
+	parser.add_argument("--groq-errors", type=float, default=0.0, help="доля ответов Groq с ошибкой 500")
+	parser.add_argument("--transcription-latency", type=float, default=0.3)
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--json", help="файл для отчета в JSON")
+	return parser
+
+if __name__ == "__main__":
+	args = build_parser().parse_args()
+	json_path = os.path.abspath(args.json) if args.json else None
+	report = asyncio.run(main(args))
+	output = json.dumps(report, ensure_ascii=False, indent=2)
+	if json_path:
+		with open(json_path, "w", encoding="utf-8") as f:
+			f.write(output)
+	print(output, file=sys.stdout)
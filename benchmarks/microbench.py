@@ -0,0 +1,195 @@
+"""Микробенчмарки горячих путей: Database на синтетических базах и обработка HTML-ответов модели.
+
+Результаты пишутся в JSON; с --compare печатается отношение к прошлому прогону, чтобы ловить регрессии
+между коммитами. Запуск из корня репозитория:
+
+	python -m benchmarks.microbench --sizes 1000,10000,100000 --json bench.json
+	python -m benchmarks.microbench --sizes 1000,10000,100000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from database import Database
+from html_sanitizer import sanitize_html, split_html_message
+
+def measure(fn, repeats: int, budget: float) -> dict:
+	"""Время одного вызова: не меньше одного запуска, не больше repeats и не дольше budget секунд в сумме"""
+	timings = []
+	spent = 0.0
+	while len(timings) < repeats and (not timings or spent < budget):
+		start = time.perf_counter()
+		fn()
+		elapsed = time.perf_counter() - start
+		timings.append(elapsed)
+		spent += elapsed
+	return {
+		"runs": len(timings),
+		"min": min(timings),
+		"median": statistics.median(timings),
+		"mean": statistics.fmean(timings),
+	}
+
+# --- Синтетические данные ---
+
+def build_dataset(users: int, messages_per_user: int, rng: random.Random) -> dict:
+	"""База в формате database.json: пользователи с короткой историей диалогов"""
+	now = datetime.now()
+	data = {"users": {}, "conversations": {}, "broadcasts": []}
+	for user_id in range(1, users + 1):
+		registered = now - timedelta(days=rng.randint(0, 365))
+		data["users"][str(user_id)] = {
+			"username": f"user{user_id}",
+			"first_name": "Имя",
+			"registration_date": registered.isoformat(),
+			"last_activity": (now - timedelta(hours=rng.randint(0, 240))).isoformat(),
+		}
+		conversation = []
+		for n in range(rng.randint(0, messages_per_user)):
+			stamp = (now - timedelta(minutes=rng.randint(0, 20_000))).isoformat()
+			conversation.append({
+				"timestamp": stamp,
+				"message": {"text": f"Вопрос номер {n} про что-нибудь важное", "type": "text", "timestamp": stamp},
+				"response": "<b>Ответ:</b> " + "содержательный текст ответа " * 8,
+			})
+		data["conversations"][str(user_id)] = conversation
+	return data
+
+_PARAGRAPHS = [
+	"<b>Кратко:</b> это типичный ответ модели с <i>акцентами</i>, <u>подчеркиваниями</u> и ссылкой "
+	"на <a href=\"https://umaai.site\">umaai.site</a>.",
+	"Список шагов:\n• первый шаг & немного деталей\n• второй шаг с <code>inline_code()</code>\n• третий шаг",
+	"<pre><code class=\"language-python\">def handler(message):\n    if a < b and b > c:\n        return {\"ok\": True}\n</code></pre>",
+	"<blockquote>Цитата с важной мыслью, которую модель решила выделить отдельно.</blockquote>",
+	"## Заголовок в Markdown, который модель вставила вопреки инструкции",
+	"Обычный абзац текста без разметки, довольно длинный, чтобы было где искать пробелы и переносы строк. " * 3,
+	"<h2>Незакрытый заголовок и <b>жирный <i>курсив</b> с перепутанной вложенностью</i>",
+	"Эмодзи 🚀🎨💡 и символы за пределами BMP: 𝔘𝔪𝔞, а также сущности &amp; &lt;tag&gt; &nbsp;.",
+]
+
+def llm_output(chars: int, rng: random.Random) -> str:
+	parts = []
+	length = 0
+	while length < chars:
+		paragraph = rng.choice(_PARAGRAPHS)
+		parts.append(paragraph)
+		length += len(paragraph) + 2
+	return "\n\n".join(parts)
+
+# --- Бенчмарки ---
+
+def bench_database(sizes: list[int], args, rng: random.Random) -> list[dict]:
+	results = []
+	for size in sizes:
+		workdir = tempfile.mkdtemp(prefix="umabot-bench-")
+		path = os.path.join(workdir, "database.json")
+		with open(path, "w", encoding="utf-8") as f:
+			json.dump(build_dataset(size, args.history, rng), f, ensure_ascii=False)
+
+		start = time.perf_counter()
+		db = Database(path)
+		results.append({"name": "database.load", "size": size, "runs": 1, **dict.fromkeys(("min", "median", "mean"), time.perf_counter() - start)})
+
+		# Загрузка прежнего database.json переносит его в снимок и history_store; дальше база грузится уже из них
+		db.flush()
+		db.close()
+		start = time.perf_counter()
+		db = Database(path)
+		results.append({"name": "database.load_snapshot", "size": size, "runs": 1, **dict.fromkeys(("min", "median", "mean"), time.perf_counter() - start)})
+
+		user_ids = [rng.randint(1, size) for _ in range(args.repeats)]
+		cases = {
+			"database.add_message_to_conversation": lambda: db.add_message_to_conversation(
+				rng.choice(user_ids), {"text": "Новый вопрос", "type": "text", "timestamp": datetime.now().isoformat()}, "Ответ"
+			),
+			"database.get_conversation_history": lambda: db.get_conversation_history(rng.choice(user_ids)),
+			"database.get_statistics": db.get_statistics,
+			"database.get_all_users": db.get_all_users,
+		}
+		for name, fn in cases.items():
+			results.append({"name": name, "size": size, **measure(fn, args.repeats, args.budget)})
+		shutil.rmtree(workdir)
+	return results
+
+def bench_html(args, rng: random.Random) -> list[dict]:
+	results = []
+	for chars in (2_000, 8_000, 32_000):
+		text = llm_output(chars, rng)
+		sanitized = sanitize_html(text)
+		# clean_html_tags в GroqClient — обертка над sanitize_html; меряем без импорта клиента Groq
+		results.append({"name": "html.sanitize", "size": chars, **measure(lambda: sanitize_html(text), args.repeats * 10, args.budget)})
+		results.append({"name": "html.sanitize_partial", "size": chars, **measure(lambda: sanitize_html(text[:-7], partial=True), args.repeats * 10, args.budget)})
+		results.append({"name": "html.split_message", "size": chars, **measure(lambda: split_html_message(sanitized), args.repeats * 10, args.budget)})
+	return results
+
+def git_commit() -> str | None:
+	try:
+		return subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+		).stdout.strip()
+	except Exception:
+		return None
+
+def compare(current: list[dict], baseline_path: str) -> None:
+	with open(baseline_path, "r", encoding="utf-8") as f:
+		baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+	print(f"{'benchmark':45} {'size':>8} {'before':>11} {'after':>11} {'ratio':>7}")
+	for result in current:
+		before = baseline.get((result["name"], result["size"]))
+		if not before:
+			continue
+		ratio = result["median"] / before["median"] if before["median"] else float("inf")
+		flag = "  <-- медленнее" if ratio > 1.2 else ""
+		print(f"{result['name']:45} {result['size']:>8} {before['median']:>11.6f} {result['median']:>11.6f} {ratio:>7.2f}{flag}")
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Микробенчмарки Database и обработки HTML")
+	parser.add_argument("--sizes", default="1000,10000,100000", help="число пользователей в синтетических базах (до 1000000)")
+	parser.add_argument("--history", type=int, default=10, help="максимум записей истории на пользователя")
+	parser.add_argument("--repeats", type=int, default=20, help="максимум повторов на бенчмарк")
+	parser.add_argument("--budget", type=float, default=10.0, help="лимит времени на бенчмарк, с")
+	parser.add_argument("--only", choices=("database", "html"), help="запустить только одну группу")
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--json", help="файл для результатов")
+	parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+	args = parser.parse_args()
+
+	rng = random.Random(args.seed)
+	results = []
+	if args.only in (None, "html"):
+		results += bench_html(args, rng)
+	if args.only in (None, "database"):
+		results += bench_database([int(size) for size in args.sizes.split(",")], args, rng)
+
+	report = {
+		"meta": {
+			"commit": git_commit(),
+			"timestamp": datetime.now().isoformat(timespec="seconds"),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"args": vars(args),
+		},
+		"results": results,
+	}
+	if args.json:
+		with open(args.json, "w", encoding="utf-8") as f:
+			json.dump(report, f, ensure_ascii=False, indent=2)
+	if args.compare:
+		compare(results, args.compare)
+	else:
+		print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+	main()
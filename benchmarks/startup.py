@@ -0,0 +1,151 @@
+"""Время холодного запуска бота: каждый прогон — новый процесс Python, как у свежей реплики после рестарта.
+
+Этапы:
+- process — от запуска интерпретатора до готовности (меряется снаружи, включает старт Python);
+- import — импорт main со всеми зависимостями;
+- init — конструктор UmaBot (после ленивой загрузки базу не читает);
+- warm_up.database, warm_up.groq — то, что бот делает в фоне после старта polling.
+
+Запуск из корня репозитория:
+
+	python -m benchmarks.startup --sizes 0,10000,100000 --json startup.json
+	python -m benchmarks.startup --compare startup.json
+	python -m benchmarks.startup --importtime 15
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.microbench import build_dataset, compare, git_commit
+
+# Выполняется в дочернем процессе: печатает длительности этапов одной строкой JSON
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+bot = main.UmaBot()
+constructed = time.perf_counter()
+bot.database.warm_up()
+database_loaded = time.perf_counter()
+bot.groq_client.warm_up()
+groq_ready = time.perf_counter()
+print(json.dumps({
+	"import": imported - started,
+	"init": constructed - imported,
+	"warm_up.database": database_loaded - constructed,
+	"warm_up.groq": groq_ready - database_loaded,
+}))
+"""
+
+def child_env(workdir: str) -> dict:
+	env = dict(os.environ)
+	env.update({
+		"PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+		"TELEGRAM_BOT_TOKEN": "123456:STARTUP",
+		"GROQ_API_KEY": "gsk_startup",
+		"MEDIA_CACHE_DIR": os.path.join(workdir, "media_cache"),
+		"METRICS_PORT": "0",
+		"TRACE_EXPORTER": "none",
+	})
+	return env
+
+def run_once(workdir: str) -> dict:
+	start = time.perf_counter()
+	result = subprocess.run(
+		[sys.executable, "-c", CHILD], cwd=workdir, env=child_env(workdir), capture_output=True, text=True,
+	)
+	elapsed = time.perf_counter() - start
+	if result.returncode != 0:
+		raise RuntimeError(f"Запуск бота завершился с ошибкой:\n{result.stderr}")
+	phases = json.loads(result.stdout.strip().splitlines()[-1])
+	phases["process"] = elapsed
+	return phases
+
+def summarize(name: str, size: int, timings: list[float]) -> dict:
+	return {
+		"name": name,
+		"size": size,
+		"runs": len(timings),
+		"min": min(timings),
+		"median": statistics.median(timings),
+		"mean": statistics.fmean(timings),
+	}
+
+def bench_startup(sizes: list[int], args) -> list[dict]:
+	results = []
+	rng = random.Random(args.seed)
+	for size in sizes:
+		workdir = tempfile.mkdtemp(prefix="umabot-startup-")
+		if size:
+			with open(os.path.join(workdir, "database.json"), "w", encoding="utf-8") as f:
+				json.dump(build_dataset(size, args.history, rng), f, ensure_ascii=False)
+		runs = [run_once(workdir) for _ in range(args.repeats)]
+		for phase in ("process", "import", "init", "warm_up.database", "warm_up.groq"):
+			results.append(summarize(f"startup.{phase}", size, [run[phase] for run in runs]))
+	return results
+
+def import_profile(top: int) -> None:
+	"""Самые долгие импорты main по -X importtime (суммарно с вложенными)"""
+	workdir = tempfile.mkdtemp(prefix="umabot-startup-")
+	result = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", "import main"],
+		cwd=workdir, env=child_env(workdir), capture_output=True, text=True,
+	)
+	rows = []
+	for line in result.stderr.splitlines():
+		if not line.startswith("import time:") or "cumulative" in line:
+			continue
+		_, cumulative, module = line[len("import time:"):].split("|")
+		rows.append((int(cumulative), module.rstrip()))
+	print(f"{'cumulative, ms':>15}  module")
+	for cumulative, module in sorted(rows, reverse=True)[:top]:
+		print(f"{cumulative / 1000:>15.1f}  {module}")
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Время холодного запуска UmaBot")
+	parser.add_argument("--sizes", default="0,10000,100000", help="число пользователей в базе (0 — без файла базы)")
+	parser.add_argument("--history", type=int, default=10, help="максимум записей истории на пользователя")
+	parser.add_argument("--repeats", type=int, default=5, help="запусков на размер базы")
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--importtime", type=int, metavar="N", help="вместо замеров показать N самых долгих импортов")
+	parser.add_argument("--json", help="файл для результатов")
+	parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+	args = parser.parse_args()
+
+	if args.importtime:
+		import_profile(args.importtime)
+		return
+
+	results = bench_startup([int(size) for size in args.sizes.split(",")], args)
+	report = {
+		"meta": {
+			"commit": git_commit(),
+			"timestamp": datetime.now().isoformat(timespec="seconds"),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"args": vars(args),
+		},
+		"results": results,
+	}
+	if args.json:
+		with open(args.json, "w", encoding="utf-8") as f:
+			json.dump(report, f, ensure_ascii=False, indent=2)
+	if args.compare:
+		compare(results, args.compare)
+	else:
+		print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+	main()
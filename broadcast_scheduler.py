@@ -6,6 +6,7 @@ from database import Database
 from keyboards import get_broadcast_keyboard
 from config import DAILY_MESSAGES
 from aiogram import Bot
+import tracing
 
 class BroadcastScheduler:
 	def __init__(self, bot: Bot, database: Database):
@@ -13,6 +14,7 @@ class BroadcastScheduler:
 		self.database = database
 		self.logger = logging.getLogger(__name__)
 		self.is_running = False
+		self.is_sending = False  # идет рассылка: при остановке ее дают дослать
 		self.task: asyncio.Task | None = None
 	
 	async def start_scheduler(self):
@@ -22,8 +24,14 @@ class BroadcastScheduler:
 		self.task = asyncio.create_task(self._scheduler_loop())
 		self.logger.info("Планировщик рассылок запущен")
 	
-	async def stop_scheduler(self):
+	async def stop_scheduler(self, timeout: float = 0):
+		"""Останавливает планировщик; начатую рассылку ждет до timeout секунд, а не обрывает на середине"""
 		self.is_running = False
+		if self.task and self.is_sending and timeout:
+			try:
+				await asyncio.wait_for(asyncio.shield(self.task), timeout)
+			except asyncio.TimeoutError:
+				self.logger.warning("Рассылка не завершилась за отведенное время и будет прервана")
 		if self.task:
 			self.task.cancel()
 			try:
@@ -36,10 +44,16 @@ class BroadcastScheduler:
 		while self.is_running:
 			try:
 				now = datetime.now()
-				if now.hour == 10 and now.minute == 0:
-					await self._send_daily_broadcast()
-				await self._check_scheduled_broadcasts()
-				await asyncio.sleep(60)
+				self.is_sending = True
+				try:
+					if now.hour == 10 and now.minute == 0:
+						with tracing.span("daily_broadcast"):
+							await self._send_daily_broadcast()
+					await self._check_scheduled_broadcasts()
+				finally:
+					self.is_sending = False
+				if self.is_running:
+					await asyncio.sleep(60)
 			except Exception as e:
 				self.logger.error(f"Ошибка в планировщике: {e}")
 				await asyncio.sleep(60)
@@ -71,7 +85,8 @@ class BroadcastScheduler:
 					scheduled_time = datetime.fromisoformat(broadcast["scheduled_time"])
 					now = datetime.now()
 					if now >= scheduled_time:
-						await self._send_scheduled_broadcast(broadcast)
+						with tracing.span("scheduled_broadcast", broadcast_id=broadcast["id"]):
+							await self._send_scheduled_broadcast(broadcast)
 		except Exception as e:
 			self.logger.error(f"Ошибка при проверке запланированных рассылок: {e}")
 	
@@ -7,6 +7,10 @@ load_dotenv()
 GROQ_API_KEY = os.getenv('GROQ_API_KEY', '')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 
+# API endpoints: переопределяются для локального Bot API сервера и нагрузочных тестов (benchmarks/)
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL') or None  # None — адрес SDK по умолчанию
+
 # Admin ID safe parse
 _admin_env = os.getenv('ADMIN_USER_ID', '').strip()
 try:
@@ -16,14 +20,92 @@ except ValueError:
 
 # Groq Models
 TEXT_MODEL = "openai/gpt-oss-120b"
+FAST_TEXT_MODEL = "llama-3.1-8b-instant"  # простые короткие сообщения
 MULTIMODAL_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 AUDIO_MODEL = "whisper-large-v3-turbo"
 
+# Message routing
+ROUTER_ENABLED = os.getenv('ROUTER_ENABLED', '1') != '0'
+ROUTER_SIMPLE_MAX_CHARS = 120  # длиннее — сразу основная модель
+
+# Browser search (retrieval)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'duckduckgo')  # duckduckgo / stub
+SEARCH_MAX_RESULTS = 5
+SEARCH_FETCH_PAGES = 3  # сколько страниц выдачи скачивать параллельно
+SEARCH_PAGE_TIMEOUT = 5
+SEARCH_CACHE_SIZE = 500
+SEARCH_CACHE_TTL = {  # секунд, по классу запроса
+	"rates": 5 * 60,
+	"weather": 15 * 60,
+	"news": 10 * 60,
+	"datetime": 0,  # не кэшируется
+	"general": 60 * 60,
+}
+
 # File size limits
 MAX_IMAGE_SIZE = 20 * 1024 * 1024  # 20MB
 MAX_IMAGE_PIXELS = 33 * 1024 * 1024  # 33 megapixels
 MAX_AUDIO_SIZE = 25 * 1024 * 1024  # 25MB for free tier
 
+# Long audio: файлы больше MAX_AUDIO_SIZE режем на перекрывающиеся отрезки и распознаем параллельно (нужен ffmpeg)
+AUDIO_CHUNK_THRESHOLD_SECONDS = 10 * 60  # длиннее и неизвестного размера — распознаем отрезками
+AUDIO_CHUNK_SECONDS = 5 * 60
+AUDIO_CHUNK_OVERLAP_SECONDS = 5
+AUDIO_CHUNK_CONCURRENCY = 4
+
+# Media groups (albums)
+MEDIA_GROUP_DEBOUNCE = 0.4  # секунд тишины после последнего фото альбома
+MEDIA_GROUP_MAX_WAIT = 2.0  # максимум ожидания с первого фото
+MEDIA_GROUP_MAX_ITEMS = 10  # лимит Telegram на альбом
+
+# Delivery
+CHAT_ACTION_INTERVAL = 4.0  # индикатор "печатает" гаснет через ~5 секунд
+
+# Admin panel
+ADMIN_STATS_CACHE_TTL = 30  # секунд; статистика пересчитывается по всей базе
+
+# Shutdown: сколько ждать завершения начатых запросов и рассылок после SIGTERM
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '25'))
+
+# Event loop watchdog
+LOOP_MONITOR_INTERVAL = 0.1  # секунд между замерами задержки
+LOOP_BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', '0.5'))  # блокировка дольше — снимок стека в лог
+
+# Sampling profiler (админ-панель)
+PROFILER_DURATION = 30  # секунд
+PROFILER_INTERVAL = 0.01  # 100 снимков стеков в секунду
+
+# Token quotas: токенов (prompt + completion) на пользователя в сутки; 0 — без ограничения
+USER_DAILY_TOKEN_QUOTA = int(os.getenv('USER_DAILY_TOKEN_QUOTA', '0'))
+
+# Metrics (Prometheus, GET /metrics); 0 — эндпоинт выключен
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Tracing: file — span'ы в TRACE_FILE (JSONL, OTLP JSON), otlp — в коллектор OTLP/HTTP, none — без экспорта
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://127.0.0.1:4318')
+TRACE_BATCH_SIZE = 256
+TRACE_FLUSH_INTERVAL = 2.0  # секунд
+
+# Database snapshot codec: auto (orjson, если установлен, иначе json), json, orjson или msgpack
+DB_CODEC = os.getenv('DB_CODEC', 'auto')
+
+# Conversation history: на диске (SQLite рядом с базой), в памяти — LRU недавно активных пользователей
+HISTORY_CACHE_USERS = int(os.getenv('HISTORY_CACHE_USERS', '5000'))
+HISTORY_MAX_ENTRIES = 50  # записей истории на пользователя
+
+# FSM states (админские сценарии)
+FSM_STATE_FILE = os.getenv('FSM_STATE_FILE', 'fsm_states.json')
+FSM_STATE_TTL = 600  # секунд; забытое состояние не превратит следующее сообщение в рассылку
+FSM_RELOAD_INTERVAL = 1.0  # как часто проверять изменения файла другими процессами
+
+# Media cache (по file_unique_id)
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', 'media_cache')
+MEDIA_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB на диске
+MEDIA_CACHE_MAX_RESULTS = 5000  # транскрипции и описания изображений
+
 # Website
 UMA_WEBSITE = "https://umaai.site"
 UMA_WEBSITE_ALT = "https://www.umaai.site"  # Альтернативный URL
@@ -1,114 +1,211 @@
-import json
 import os
-from typing import Dict, List, Optional
-from datetime import datetime
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 import logging
 
+import snapshot
+from history_store import HistoryStore, default_path as default_history_path
+from records import ConversationEntry, Store, UserRecord
+
 class Database:
-    def __init__(self, db_file: str = "database.json"):
+    def __init__(self, db_file: str = "database.json", lazy: bool = False, history_file: str = None):
+        """lazy=True откладывает разбор файла до warm_up() или первого обращения к данным.
+        Пользователи и рассылки — в снимке db_file, истории диалогов и расход токенов — в history_file (SQLite)"""
         self.db_file = db_file
-        self.data = self._load_data()
+        self.history = HistoryStore(history_file or default_history_path(db_file))
+        self._data: Optional[Store] = None
+        self._usage: Dict[int, Dict[str, Dict]] = {}
+        self._usage_day: Optional[str] = None  # день, расход за который сейчас в памяти
+        self._load_lock = threading.Lock()
+        self._file_version: Optional[int] = None  # формат файла на диске; прежний переписывается при первом сохранении
+        if not lazy:
+            self.warm_up()
+    
+    @property
+    def data(self) -> Store:
+        """Пользователи и рассылки в компактном представлении (records.Store)"""
+        if self._data is None:
+            self.warm_up()
+        return self._data
+    
+    @property
+    def usage(self) -> Dict[int, Dict[str, Dict]]:
+        """Расход токенов за сегодня: user_id -> день -> модель -> счетчики; прошлые дни остаются только на диске"""
+        if self._data is None:
+            self.warm_up()
+        return self._usage
+    
+    @data.setter
+    def data(self, value: Store):
+        self._data = value
     
-    def _load_data(self) -> Dict:
-        """Загружает данные из файла"""
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+    
+    def warm_up(self):
+        """Загружает базу, если она еще не загружена; безопасно вызывать из фонового потока"""
+        with self._load_lock:
+            if self._data is None:
+                self._data = self._load_data()
+    
+    def _load_data(self) -> Store:
+        """Загружает данные из файла: снимок (snapshot.py) или прежний database.json"""
         if os.path.exists(self.db_file):
             try:
-                with open(self.db_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {"users": {}, "conversations": {}, "broadcasts": []}
-        return {"users": {}, "conversations": {}, "broadcasts": []}
+                store, self._file_version = snapshot.read(self.db_file)
+            except snapshot.SnapshotError:
+                # Снимок новее кода или нет кодека: пустая база затерла бы его при первом сохранении
+                raise
+            except Exception as e:
+                broken_path = f"{self.db_file}.broken"
+                os.replace(self.db_file, broken_path)
+                logging.error(f"Не удалось загрузить базу {self.db_file}: {e}. Файл перенесен в {broken_path}")
+                store = Store()
+        else:
+            store = Store()
+        
+        if store.conversations or store.usage:
+            # Снимок до версии 3: истории и расход токенов переезжают в history_store, снимок сразу переписывается
+            self.history.import_conversations(store.conversations)
+            self.history.save_usage(store.usage)
+            logging.info(f"Истории {len(store.conversations)} пользователей перенесены в {self.history.path}")
+            store.conversations, store.usage = {}, {}
+            snapshot.backup_legacy(self.db_file, self._file_version)
+            snapshot.write(self.db_file, store)
+            self._file_version = snapshot.SNAPSHOT_VERSION
+        
+        self._usage_day = datetime.now().date().isoformat()
+        self._usage = self.history.load_usage(self._usage_day)
+        return store
     
     def _save_data(self):
-        """Сохраняет данные в файл"""
-        with open(self.db_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        """Сохраняет пользователей и рассылки в файл; истории и расход токенов пишет history_store"""
+        if self._file_version is not None and self._file_version < snapshot.SNAPSHOT_VERSION:
+            snapshot.backup_legacy(self.db_file, self._file_version)
+        snapshot.write(self.db_file, self.data)
+        self._file_version = snapshot.SNAPSHOT_VERSION
+    
+    def flush(self):
+        """Сохраняет накопленные в памяти изменения (например, расход токенов) — вызывается при остановке"""
+        self._save_data()
+        self.history.save_usage(self._usage_today()[1])
+    
+    def close(self):
+        self.history.close()
     
     def add_user(self, user_id: int, username: str = None, first_name: str = None) -> None:
         """Добавляет нового пользователя"""
-        data = self._load_data()
-        user_id_str = str(user_id)
+        now = int(time.time())
+        user = self.data.users.get(user_id)
         
-        if user_id_str not in data["users"]:
-            data["users"][user_id_str] = {
-                "username": username,
-                "first_name": first_name,
-                "registration_date": datetime.now().isoformat(),
-                "last_activity": datetime.now().isoformat()
-            }
+        if user is None:
+            self.data.users[user_id] = UserRecord(username, first_name, registered=now, last_activity=now)
         else:
             # Обновляем последнюю активность
-            data["users"][user_id_str]["last_activity"] = datetime.now().isoformat()
+            user.last_activity = now
             if username:
-                data["users"][user_id_str]["username"] = username
+                user.username = username
             if first_name:
-                data["users"][user_id_str]["first_name"] = first_name
+                user.first_name = first_name
         
         self._save_data()
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Получает информацию о пользователе"""
-        return self.data["users"].get(str(user_id))
+        user = self.data.users.get(user_id)
+        return user.to_legacy() if user else None
     
     def get_all_users(self) -> List[int]:
         """Получает список всех активных пользователей"""
-        return [int(uid) for uid, user in self.data["users"].items() if user.get("is_active", True)]
+        return [user_id for user_id, user in self.data.users.items() if user.is_active]
     
     def add_message_to_conversation(self, user_id: int, message: Dict, response: str):
-        """Добавляет сообщение в историю диалога"""
-        user_key = str(user_id)
-        if user_key not in self.data["conversations"]:
-            self.data["conversations"][user_key] = []
-        
-        conversation_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "message": message,
-            "response": response
-        }
-        
-        self.data["conversations"][user_key].append(conversation_entry)
-        
-        # Ограничиваем историю последними 50 сообщениями
-        if len(self.data["conversations"][user_key]) > 50:
-            self.data["conversations"][user_key] = self.data["conversations"][user_key][-50:]
-        
-        self._save_data()
+        """Добавляет сообщение в историю диалога (история ограничена последними 50 сообщениями)"""
+        self.history.append(user_id, ConversationEntry.from_message(message, response, created=int(time.time())))
     
-    def get_conversation_history(self, user_id: int, limit: int = 10) -> List[Dict]:
-        """Получает историю диалога пользователя"""
-        user_key = str(user_id)
-        if user_key not in self.data["conversations"]:
-            return []
-        
-        return self.data["conversations"][user_key][-limit:]
+    def get_last_turn(self, user_id: int) -> Optional[Tuple[int, Dict]]:
+        """Последняя запись диалога и ее номер (для перегенерации)"""
+        last = self.history.last(user_id)
+        return (last[0], last[1].to_legacy()) if last else None
+    
+    def replace_response(self, user_id: int, seq: int, response: str) -> bool:
+        """Заменяет ответ в записи диалога с номером seq (для перегенерации)"""
+        return self.history.replace_response(user_id, seq, response)
+    
+    def get_conversation_history(self, user_id: int, limit: int = 10, before: int = None) -> List[Dict]:
+        """Получает историю диалога пользователя (записи в прежнем формате: timestamp, message, response).
+        before — только записи раньше указанного номера"""
+        return [entry.to_legacy() for entry in self.history.get(user_id, limit, before)]
     
     def clear_conversation(self, user_id: int):
         """Очищает историю диалога пользователя"""
-        user_key = str(user_id)
-        if user_key in self.data["conversations"]:
-            self.data["conversations"][user_key] = []
-            self._save_data()
+        self.history.clear(user_id)
+    
+    def _usage_today(self) -> Tuple[str, Dict[int, Dict[str, Dict]]]:
+        """Сегодняшний день и расход за него. В памяти держится только отчетный (сегодняшний) день: прошлые уже
+        сохранены на диск в record_usage, поэтому с наступлением нового дня они из памяти просто убираются"""
+        day = datetime.now().date().isoformat()
+        usage = self.usage
+        if day != self._usage_day:
+            usage.clear()
+            self._usage_day = day
+        return day, usage
+    
+    def record_usage(self, user_id: int, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+        """Учитывает расход токенов по пользователю, дню и модели и сразу сохраняет его: не каждый ответ модели
+        становится новым ходом (перегенерация, ошибка доставки), а квота не должна сбрасываться перезапуском"""
+        day, usage_today = self._usage_today()
+        usage = usage_today.setdefault(user_id, {}).setdefault(day, {})
+        entry = usage.setdefault(model, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+        entry["requests"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        entry["cached_tokens"] += cached_tokens
+        self.history.save_usage({user_id: {day: usage}})
+    
+    def get_user_tokens_today(self, user_id: int) -> int:
+        """Сколько токенов (prompt + completion) пользователь израсходовал сегодня"""
+        day, usage = self._usage_today()
+        models = usage.get(user_id, {}).get(day, {})
+        return sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in models.values())
+    
+    def get_usage_statistics(self, top: int = 5) -> dict:
+        """Расход токенов за сегодня: по моделям и самые активные пользователи"""
+        day, usage = self._usage_today()
+        by_model: Dict[str, Dict[str, int]] = {}
+        by_user: Dict[int, int] = {}
+        for user_id, days in usage.items():
+            for model, entry in days.get(day, {}).items():
+                totals = by_model.setdefault(model, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+                for key in totals:
+                    totals[key] += entry.get(key, 0)
+                by_user[user_id] = by_user.get(user_id, 0) + entry["prompt_tokens"] + entry["completion_tokens"]
+        top_users = sorted(by_user.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {"by_model": by_model, "top_users": top_users}
     
     def add_broadcast(self, message: str, scheduled_time: str = None, sent: bool = False):
         """Добавляет рассылку"""
         broadcast = {
-            "id": len(self.data["broadcasts"]) + 1,
+            "id": len(self.data.broadcasts) + 1,
             "message": message,
             "scheduled_time": scheduled_time,
             "sent": sent,
             "created_at": datetime.now().isoformat()
         }
-        self.data["broadcasts"].append(broadcast)
+        self.data.broadcasts.append(broadcast)
         self._save_data()
         return broadcast["id"]
     
     def get_pending_broadcasts(self) -> List[Dict]:
         """Получает список ожидающих рассылок"""
-        return [b for b in self.data["broadcasts"] if not b["sent"]]
+        return [b for b in self.data.broadcasts if not b["sent"]]
     
     def mark_broadcast_sent(self, broadcast_id: int):
         """Отмечает рассылку как отправленную"""
-        for broadcast in self.data["broadcasts"]:
+        for broadcast in self.data.broadcasts:
             if broadcast["id"] == broadcast_id:
                 broadcast["sent"] = True
                 broadcast["sent_at"] = datetime.now().isoformat()
@@ -118,68 +215,36 @@ class Database:
     def get_statistics(self) -> dict:
         """Получает статистику для админ-панели"""
         try:
-            data = self._load_data()
-            from datetime import datetime, timedelta
+            data = self.data
             
-            today = datetime.now().date()
-            week_ago = today - timedelta(days=7)
+            # Границы дней в секундах эпохи: записи хранят время целыми числами, даты не разбираются
+            today = datetime.combine(datetime.now().date(), datetime.min.time())
+            today_start = int(today.timestamp())
+            tomorrow_start = int((today + timedelta(days=1)).timestamp())
+            week_start = int((today - timedelta(days=7)).timestamp())
             
-            total_users = len(data.get("users", {}))
-            total_messages = 0
-            text_messages = 0
-            image_messages = 0
-            audio_messages = 0
+            total_users = len(data.users)
             active_today = 0
             new_this_week = 0
-            messages_today = 0
-            messages_this_week = 0
             
             # Подсчитываем статистику по пользователям
-            for user_id, user_data in data.get("users", {}).items():
+            for user in data.users.values():
                 # Активность сегодня
-                if user_data.get("last_activity"):
-                    last_activity = datetime.fromisoformat(user_data["last_activity"]).date()
-                    if last_activity == today:
-                        active_today += 1
+                if user.last_activity is not None and today_start <= user.last_activity < tomorrow_start:
+                    active_today += 1
                 
                 # Новые пользователи за неделю
-                if user_data.get("registration_date"):
-                    reg_date = datetime.fromisoformat(user_data["registration_date"]).date()
-                    if reg_date >= week_ago:
-                        new_this_week += 1
-                
-                # Сообщения пользователя
-                conversation = data.get("conversations", {}).get(str(user_id), [])
-                for entry in conversation:
-                    if "message" in entry:
-                        total_messages += 1
-                        msg_type = entry["message"].get("type", "")
-                        
-                        if msg_type == "text":
-                            text_messages += 1
-                        elif msg_type == "image":
-                            image_messages += 1
-                        elif msg_type == "audio":
-                            audio_messages += 1
-                        
-                        # Сообщения за сегодня и неделю
-                        if "timestamp" in entry["message"]:
-                            msg_date = datetime.fromisoformat(entry["message"]["timestamp"]).date()
-                            if msg_date == today:
-                                messages_today += 1
-                            if msg_date >= week_ago:
-                                messages_this_week += 1
+                if user.registered is not None and user.registered >= week_start:
+                    new_this_week += 1
+            
+            # Сообщения считаются запросом к history_store: истории неактивных пользователей в память не грузятся
+            messages = self.history.count_messages(today_start, tomorrow_start, week_start)
             
             return {
                 "total_users": total_users,
                 "active_today": active_today,
                 "new_this_week": new_this_week,
-                "total_messages": total_messages,
-                "text_messages": text_messages,
-                "image_messages": image_messages,
-                "audio_messages": audio_messages,
-                "messages_today": messages_today,
-                "messages_this_week": messages_this_week
+                **messages,
             }
         except Exception as e:
             logging.error(f"Ошибка при получении статистики: {e}")
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from config import CHAT_ACTION_INTERVAL
+from html_sanitizer import split_html_message
+from keyboards import get_chat_keyboard
+from metrics import MESSAGES, timed
+
+class ChatActionKeepAlive:
+	"""Повторяет chat action, пока идет генерация: Telegram гасит индикатор через ~5 секунд"""
+
+	def __init__(self, bot: Bot, chat_id: int, action: str, interval: float = CHAT_ACTION_INTERVAL) -> None:
+		self.bot = bot
+		self.chat_id = chat_id
+		self.action = action
+		self.interval = interval
+		self.task: asyncio.Task | None = None
+
+	async def _loop(self) -> None:
+		while True:
+			try:
+				await self.bot.send_chat_action(self.chat_id, self.action)
+			except Exception as e:
+				logging.getLogger(__name__).debug(f"Не удалось отправить chat action: {e}")
+			await asyncio.sleep(self.interval)
+
+	async def __aenter__(self) -> "ChatActionKeepAlive":
+		self.task = asyncio.create_task(self._loop())
+		return self
+
+	async def __aexit__(self, *exc) -> None:
+		if self.task:
+			self.task.cancel()
+			try:
+				await self.task
+			except asyncio.CancelledError:
+				pass
+
+class ResponseDelivery:
+	"""Единый этап доставки ответа: плейсхолдер, chat action, генерация, отправка частей, сохранение"""
+
+	def __init__(self, bot: Bot) -> None:
+		self.bot = bot
+		self.logger = logging.getLogger(__name__)
+		# Сохранение хода идет после отправки; следующий запрос пользователя дожидается его
+		self._pending_persist: dict[int, asyncio.Future] = {}
+
+	async def wait_persisted(self, user_id: int) -> None:
+		pending = self._pending_persist.get(user_id)
+		if pending is not None:
+			await asyncio.shield(pending)
+
+	async def safe_edit_text(self, message: Message, text: str, reply_markup=None) -> None:
+		"""Безопасное редактирование текста с обработкой ошибок"""
+		try:
+			await message.edit_text(text, reply_markup=reply_markup)
+		except Exception as e:
+			self.logger.warning(f"Не удалось отредактировать сообщение: {e}")
+			# Если содержимое не изменилось, удаляем старое сообщение и отправляем новое
+			if "message is not modified" in str(e):
+				try:
+					await message.delete()
+					await message.answer(text, reply_markup=reply_markup)
+				except Exception as e2:
+					self.logger.error(f"Не удалось удалить/отправить сообщение: {e2}")
+			else:
+				# Для других ошибок просто отправляем новое сообщение
+				try:
+					await message.answer(text, reply_markup=reply_markup)
+				except Exception as e2:
+					self.logger.error(f"Не удалось отправить новое сообщение: {e2}")
+
+	async def _send_parts(self, chat_id: int, placeholder: Message | None, parts: list[str]) -> None:
+		keyboard = get_chat_keyboard()
+		first_markup = keyboard if len(parts) == 1 else None
+
+		async def _send_tail() -> None:
+			# Хвостовые части идут подряд одной очередью; клавиатура — только у последней
+			for i, part in enumerate(parts[1:], 1):
+				is_last = i == len(parts) - 1
+				await self.bot.send_message(chat_id, part, reply_markup=keyboard if is_last else None)
+
+		if placeholder is None:
+			await self.bot.send_message(chat_id, parts[0], reply_markup=first_markup)
+			await _send_tail()
+			return
+
+		# Хвост — только после правки: если она не удастся, safe_edit_text отправит первую часть новым сообщением,
+		# и она должна прийти раньше остальных
+		await self.safe_edit_text(placeholder, parts[0], first_markup)
+		await _send_tail()
+
+	async def respond(
+		self,
+		user_id: int,
+		chat_id: int,
+		action: str,
+		placeholder: Message | Awaitable[Message],
+		generate: Callable[[], Awaitable[str]],
+		persist: Callable[[str], None],
+		message_type: str = "text",
+	) -> str:
+		"""Генерирует ответ, заменяет им плейсхолдер и только потом сохраняет ход в историю"""
+		persisted = asyncio.get_running_loop().create_future()
+		placeholder_task = None
+		if not isinstance(placeholder, Message):
+			# Плейсхолдер, chat action и подготовка запроса (get_file, загрузка медиа) идут одновременно
+			placeholder_task = asyncio.ensure_future(placeholder)
+			placeholder_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+		async with ChatActionKeepAlive(self.bot, chat_id, action):
+			try:
+				with timed("generate_total", type=message_type):
+					response = await generate()
+			except Exception:
+				MESSAGES.inc(type=message_type, status="error")
+				raise
+			# Регистрируем до первого await: следующий запрос пользователя не прочитает историю без этого хода
+			self._pending_persist[user_id] = persisted
+
+		try:
+			if placeholder_task is not None:
+				try:
+					with timed("placeholder_wait", type=message_type):
+						placeholder = await placeholder_task
+				except Exception as e:
+					self.logger.warning(f"Не удалось отправить плейсхолдер: {e}")
+					placeholder = None
+			with timed("send", type=message_type):
+				await self._send_parts(chat_id, placeholder, split_html_message(response))
+			MESSAGES.inc(type=message_type, status="ok")
+		finally:
+			try:
+				with timed("db_write", type=message_type):
+					persist(response)
+			except Exception as e:
+				self.logger.error(f"Не удалось сохранить ход диалога пользователя {user_id}: {e}")
+			persisted.set_result(None)
+			if self._pending_persist.get(user_id) is persisted:
+				del self._pending_persist[user_id]
+		return response
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from config import FSM_STATE_FILE, FSM_STATE_TTL, FSM_RELOAD_INTERVAL
+
+try:
+	import fcntl
+except ImportError:  # Windows: блокировка между процессами недоступна, остается блокировка внутри процесса
+	fcntl = None
+
+class StateStorage:
+	"""Состояния диалогов (FSM) с истечением срока: хранятся в JSON-файле, переживают перезапуск
+	и видны другим процессам бота, которые перечитывают файл при изменении mtime.
+	Файловая блокировка и чтение/запись файла блокируют поток, поэтому из event loop вызываются
+	асинхронные get_state/set_state/clear_state, которые выполняют их в отдельном потоке"""
+
+	def __init__(
+		self,
+		path: str = FSM_STATE_FILE,
+		ttl: float = FSM_STATE_TTL,
+		reload_interval: float = FSM_RELOAD_INTERVAL,
+	) -> None:
+		self.path = path
+		self.ttl = ttl
+		self.reload_interval = reload_interval
+		self.logger = logging.getLogger(__name__)
+		self._lock = threading.Lock()
+		# user_id -> (состояние, время истечения по time.time(): общее для процессов и перезапусков)
+		self._states: dict[int, tuple[str, float]] = {}
+		self._version: tuple[int, int] | None = None
+		self._next_check = 0.0
+		self._reload(force=True)
+
+	def _file_version(self) -> tuple[int, int]:
+		stat = os.stat(self.path)
+		return stat.st_mtime_ns, stat.st_size
+
+	def _reload(self, force: bool = False) -> None:
+		"""Перечитывает файл, если его изменил другой процесс; stat не чаще раза в reload_interval"""
+		now = time.monotonic()
+		if not force and now < self._next_check:
+			return
+		self._next_check = now + self.reload_interval
+		try:
+			version = self._file_version()
+		except FileNotFoundError:
+			self._states = {}
+			self._version = None
+			return
+		if not force and version == self._version:
+			return
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				raw = json.load(f)
+			self._states = {int(user_id): (state, expires) for user_id, (state, expires) in raw.items()}
+			self._version = version
+		except Exception as e:
+			self.logger.warning(f"Не удалось загрузить состояния FSM: {e}")
+
+	@contextmanager
+	def _modify(self):
+		"""Чтение-изменение-запись под блокировкой потока и файловой блокировкой (flock) на path + ".lock":
+		другой процесс не вклинится между перечитыванием файла и записью и не потеряет чужое изменение"""
+		with self._lock:
+			if fcntl is None:
+				self._reload(force=True)
+				yield
+				return
+			with open(self.path + ".lock", 'a') as lock_file:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+				try:
+					self._reload(force=True)
+					yield
+				finally:
+					fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+	def _save(self) -> None:
+		now = time.time()
+		# Просроченные записи в файл не попадают
+		self._states = {user_id: entry for user_id, entry in self._states.items() if entry[1] > now}
+		# Свой временный файл у каждого процесса и потока
+		tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp_path, 'w', encoding='utf-8') as f:
+			json.dump({str(user_id): list(entry) for user_id, entry in self._states.items()}, f, ensure_ascii=False)
+		os.replace(tmp_path, self.path)
+		self._version = self._file_version()
+
+	def _get(self, user_id: int) -> str | None:
+		"""Текущее состояние пользователя или None, если его нет или срок истек"""
+		with self._lock:
+			self._reload()
+			entry = self._states.get(user_id)
+			if entry is None:
+				return None
+			state, expires = entry
+			if expires > time.time():
+				return state
+		self.logger.info(f"Состояние {state} пользователя {user_id} истекло")
+		with self._modify():
+			entry = self._states.get(user_id)
+			if entry is not None and entry[1] > time.time():
+				return entry[0]  # другой процесс успел задать новое состояние
+			if entry is not None:
+				del self._states[user_id]
+				self._save()
+		return None
+
+	def _set(self, user_id: int, state: str, ttl: float | None = None) -> None:
+		with self._modify():
+			self._states[user_id] = (state, time.time() + (self.ttl if ttl is None else ttl))
+			self._save()
+
+	def _clear(self, user_id: int) -> None:
+		with self._modify():
+			if self._states.pop(user_id, None) is not None:
+				self._save()
+
+	async def get_state(self, user_id: int) -> str | None:
+		return await asyncio.to_thread(self._get, user_id)
+
+	async def set_state(self, user_id: int, state: str, ttl: float | None = None) -> None:
+		await asyncio.to_thread(self._set, user_id, state, ttl)
+
+	async def clear_state(self, user_id: int) -> None:
+		await asyncio.to_thread(self._clear, user_id)
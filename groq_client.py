@@ -1,37 +1,196 @@
+import asyncio
 import base64
-import io
+import hashlib
+import html
+import json
 import logging
-import re
-from typing import Optional, Dict, Any
-from groq import Groq
-from PIL import Image
-import requests
-from config import GROQ_API_KEY, TEXT_MODEL, MULTIMODAL_MODEL, AUDIO_MODEL
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional, Dict, Any, Callable
+import audio_chunking
+from config import (
+    GROQ_API_KEY, GROQ_BASE_URL, ROUTER_ENABLED, TEXT_MODEL, MULTIMODAL_MODEL, AUDIO_MODEL, MAX_AUDIO_SIZE,
+    AUDIO_CHUNK_THRESHOLD_SECONDS, AUDIO_CHUNK_SECONDS, AUDIO_CHUNK_OVERLAP_SECONDS, AUDIO_CHUNK_CONCURRENCY,
+)
+from html_sanitizer import sanitize_html
+from intents import INTENTS, SEARCH_INTENTS
+from media_cache import MediaCache
+from metrics import MODEL_LATENCY, MODEL_REQUESTS, MODEL_TOKENS, timed
+from router import MessageRouter
+from search import SearchService
+
+SUPPORTED_AUDIO_EXTENSIONS = {".flac", ".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".ogg", ".wav", ".webm"}
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+AUDIO_SEGMENT_ATTEMPTS = 2
 
 def clean_html_tags(text: str) -> str:
-    """Удаляет неподдерживаемые HTML теги из текста"""
-    # Список поддерживаемых тегов в Telegram
-    allowed_tags = [
-        'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del',
-        'code', 'pre', 'a', 'blockquote', 'tg-spoiler'
-    ]
-    
-    # Удаляем неподдерживаемые теги (h1-h6, div, p, span и др.)
-    # Заменяем заголовки на жирный текст
-    text = re.sub(r'<h[1-6][^>]*>(.*?)</h[1-6]>', r'<b>\1</b>', text, flags=re.IGNORECASE | re.DOTALL)
-    
-    # Удаляем другие неподдерживаемые теги, оставляя содержимое
-    text = re.sub(r'<(?!/?(?:' + '|'.join(allowed_tags) + r')\b)[^>]+>', '', text, flags=re.IGNORECASE)
+    """Приводит HTML ответа к подмножеству тегов Telegram"""
+    return sanitize_html(text)
+
+class _StreamReader:
+    """Файлоподобная обертка над потоком загрузки; при наличии sink копирует прочитанное в файл.
+    Намеренно не имеет fileno/seek, чтобы запрос уходил chunked, а не с длиной сокета"""
+    def __init__(self, source, sink=None):
+        self.source = source
+        self.sink = sink
     
-    return text
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size if size is not None and size >= 0 else None)
+        if chunk and self.sink is not None:
+            self.sink.write(chunk)
+        return chunk
 
 class GroqClient:
-    def __init__(self):
-        self.client = Groq(api_key=GROQ_API_KEY)
+    def __init__(self, usage_recorder: Callable[..., None] = None):
+        # SDK Groq и requests импортируются лениво: их загрузка и сборка HTTP-клиента не задерживают старт
+        self._client = None
+        self._client_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        # Получает (user_id, model, prompt_tokens, completion_tokens, cached_tokens) после каждого ответа модели
+        self.usage_recorder = usage_recorder
+        self.media_cache = MediaCache()
+        self._downloads: dict[str, asyncio.Task] = {}
+        self.router = MessageRouter()
+        self.search = SearchService()
+    
+    @property
+    def client(self):
+        """Клиент Groq, создается при первом обращении (вызовы идут из рабочих потоков, отсюда блокировка)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from groq import Groq
+                    self._client = Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
+        return self._client
+    
+    def warm_up(self) -> None:
+        """Заранее загружает SDK и HTTP-библиотеки; вызывается в фоне при старте бота"""
+        import requests  # noqa: F401
+        self.client
+    
+    async def close(self) -> None:
+        """Закрывает HTTP-клиент SDK, если он уже создан; вызывается при остановке бота"""
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None:
+            await asyncio.to_thread(client.close)
+    
+    def _finalize_response(self, content: str) -> str:
+        """Чистит HTML ответа модели и проверяет его правилами модерации"""
+        if INTENTS.matches_any(content, ("moderation_competitor",)):
+            self.logger.warning("Ответ модели упоминает сторонние сервисы генерации вопреки системному промпту")
+        return clean_html_tags(content)
+    
+    def _download_file(self, url: str, file_unique_id: str = None) -> bytes:
+        """Скачивает файл, используя кэш по file_unique_id"""
+        if file_unique_id:
+            cached = self.media_cache.get_bytes(file_unique_id)
+            if cached is not None:
+                return cached
+        
+        import requests
+        with timed("media_download", type="file"):
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+        
+        if file_unique_id:
+            self.media_cache.put_bytes(file_unique_id, response.content)
+        return response.content
+    
+    async def _complete(self, operation: str, model: str, messages: list, user_id: int = None, **params):
+        """Запрос к chat completions в отдельном потоке с замером длительности, исхода и расхода токенов"""
+        status = "error"
+        try:
+            with timed(operation, MODEL_LATENCY, model=model, operation=operation):
+                response = await asyncio.to_thread(
+                    self.client.chat.completions.create, model=model, messages=messages, **params
+                )
+            status = "ok"
+            self._record_usage(user_id, model, response)
+            return response
+        finally:
+            MODEL_REQUESTS.inc(model=model, operation=operation, status=status)
     
-    async def process_text_message(self, text: str, conversation_history: list = None, use_browser_search: bool = False) -> str:
-        """Обрабатывает текстовое сообщение с помощью GPT OSS 120B"""
+    def _record_usage(self, user_id: int, model: str, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        # Кэшированные токены промпта отдаются не всеми моделями
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        MODEL_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        MODEL_TOKENS.inc(completion_tokens, model=model, kind="completion")
+        MODEL_TOKENS.inc(cached_tokens, model=model, kind="cached")
+        if self.usage_recorder and user_id is not None:
+            try:
+                self.usage_recorder(user_id, model, prompt_tokens, completion_tokens, cached_tokens)
+            except Exception as e:
+                self.logger.error(f"Не удалось записать расход токенов пользователя {user_id}: {e}")
+    
+    def prefetch(self, url: str, file_unique_id: str) -> None:
+        """Начинает загрузку файла в кэш сразу после get_file, не дожидаясь очереди на обработку"""
+        if file_unique_id in self._downloads or self.media_cache.get_path(file_unique_id):
+            return
+        task = asyncio.create_task(asyncio.to_thread(self._download_file, url, file_unique_id))
+        self._downloads[file_unique_id] = task
+        
+        def _done(t: asyncio.Task) -> None:
+            self._downloads.pop(file_unique_id, None)
+            if not t.cancelled() and t.exception():
+                self.logger.warning(f"Не удалось заранее загрузить файл {file_unique_id}: {t.exception()}")
+        task.add_done_callback(_done)
+    
+    async def _fetch_file(self, url: str, file_unique_id: str = None) -> bytes:
+        """Возвращает файл: из уже идущей предзагрузки, из кэша или скачивает в отдельном потоке"""
+        download = self._downloads.get(file_unique_id) if file_unique_id else None
+        if download is not None:
+            try:
+                return await asyncio.shield(download)
+            except Exception:
+                pass  # предзагрузка не удалась — пробуем еще раз ниже
+        return await asyncio.to_thread(self._download_file, url, file_unique_id)
+    
+    @staticmethod
+    def _history_messages(conversation_history: list = None) -> list:
+        """Последние 5 сообщений диалога в формате chat completions"""
+        messages = []
+        for entry in (conversation_history or [])[-5:]:
+            if "message" in entry and "response" in entry:
+                messages.append({"role": "user", "content": entry["message"].get("text", "")})
+                messages.append({"role": "assistant", "content": entry["response"]})
+        return messages
+    
+    @staticmethod
+    def _result_key(file_unique_ids: list, text: str = "", user_id: int = None, history: list = None) -> str:
+        """Ключ результата: набор файлов плюс хэш подписи, пользователя и истории, из которой собран ответ.
+        Ответ зависит от истории диалога, поэтому тот же файл от другого пользователя — другой ключ"""
+        context = json.dumps([text, user_id, history or []], ensure_ascii=False)
+        context_hash = hashlib.sha1(context.encode('utf-8')).hexdigest()[:16]
+        return "+".join(file_unique_ids) + ":" + context_hash
+    
+    async def answer_text(self, text: str, conversation_history: list = None, use_browser_search: bool = False,
+                          user_id: int = None) -> str:
+        """Маршрутизирует текст: шаблонный ответ, быстрая модель или GPT OSS 120B"""
+        if not ROUTER_ENABLED:
+            return await self.process_text_message(text, conversation_history, use_browser_search, user_id=user_id)
+        
+        decision = self.router.route(text, use_browser_search)
+        if decision.route == "template":
+            return decision.reply
+        
+        fallback_model = TEXT_MODEL if decision.model != TEXT_MODEL else None
+        return await self.process_text_message(
+            text, conversation_history, use_browser_search,
+            model=decision.model, fallback_model=fallback_model, user_id=user_id
+        )
+    
+    async def process_text_message(self, text: str, conversation_history: list = None, use_browser_search: bool = False,
+                                   model: str = TEXT_MODEL, fallback_model: str = None, user_id: int = None) -> str:
+        """Обрабатывает текстовое сообщение с помощью GPT OSS 120B (или указанной модели)"""
         try:
             messages = []
             
@@ -94,32 +253,52 @@ class GroqClient:
                         messages.append({"role": "user", "content": entry["message"].get("text", "")})
                         messages.append({"role": "assistant", "content": entry["response"]})
             
+            # Подмешиваем результаты веб-поиска для вопросов об актуальном
+            if use_browser_search:
+                search_context = await self.search.get_context(text)
+                if search_context:
+                    messages.append({
+                        "role": "system",
+                        "content": search_context + "\n\nИспользуй эти данные для ответа и укажи источники ссылками."
+                    })
+            
             # Добавляем текущее сообщение
             messages.append({"role": "user", "content": text})
             
-            response = self.client.chat.completions.create(
-                model=TEXT_MODEL,
+            response = await self._complete(
+                "text",
+                model=model,
+                user_id=user_id,
                 messages=messages,
                 max_tokens=1000,
                 temperature=0.7
             )
             
             content = response.choices[0].message.content
-            return clean_html_tags(content)
+            return self._finalize_response(content)
             
         except Exception as e:
+            if fallback_model:
+                self.logger.warning(f"Модель {model} недоступна ({e}), повтор на {fallback_model}")
+                return await self.process_text_message(
+                    text, conversation_history, use_browser_search, model=fallback_model, user_id=user_id
+                )
             self.logger.error(f"Ошибка при обработке текста: {e}")
             return "Извините, произошла ошибка при обработке вашего сообщения. Попробуйте еще раз."
     
-    async def process_image_message(self, image_url: str, text: str = "", conversation_history: list = None) -> str:
+    async def process_image_message(self, image_url: str, text: str = "", conversation_history: list = None,
+                                    file_unique_id: str = None, use_cache: bool = True, user_id: int = None) -> str:
         """Обрабатывает сообщение с изображением с помощью LLaMA 4 Scout"""
         try:
-            # Загружаем изображение
-            response = requests.get(image_url)
-            response.raise_for_status()
+            history = self._history_messages(conversation_history)
+            result_key = self._result_key([file_unique_id], text, user_id, history) if file_unique_id else None
+            if result_key and use_cache:
+                cached = self.media_cache.get_result("image", result_key)
+                if cached is not None:
+                    return cached
             
-            # Конвертируем в base64
-            image_data = base64.b64encode(response.content).decode('utf-8')
+            # Загружаем изображение и конвертируем в base64
+            image_data = base64.b64encode(await self._fetch_file(image_url, file_unique_id)).decode('utf-8')
             
             messages = []
             
@@ -163,11 +342,7 @@ class GroqClient:
             messages.append({"role": "system", "content": system_message})
             
             # Добавляем историю диалога
-            if conversation_history:
-                for entry in conversation_history[-5:]:  # Последние 5 сообщений
-                    if "message" in entry and "response" in entry:
-                        messages.append({"role": "user", "content": entry["message"].get("text", "")})
-                        messages.append({"role": "assistant", "content": entry["response"]})
+            messages.extend(history)
             
             # Формируем сообщение с изображением
             content = []
@@ -194,39 +369,173 @@ class GroqClient:
             
             messages.append({"role": "user", "content": content})
             
-            response = self.client.chat.completions.create(
+            response = await self._complete(
+                "image",
                 model=MULTIMODAL_MODEL,
+                user_id=user_id,
                 messages=messages,
                 max_tokens=1000,
                 temperature=0.7
             )
             
-            content = response.choices[0].message.content
-            return clean_html_tags(content)
+            content = self._finalize_response(response.choices[0].message.content)
+            if result_key:
+                self.media_cache.put_result("image", result_key, content)
+            return content
             
         except Exception as e:
             self.logger.error(f"Ошибка при обработке изображения: {e}")
             return "Извините, произошла ошибка при обработке изображения. Попробуйте еще раз."
     
-    async def transcribe_audio(self, audio_url: str) -> str:
-        """Транскрибирует аудио с помощью Groq Whisper API"""
+    @staticmethod
+    def _audio_filename(audio_url: str) -> str:
+        """Имя файла для Whisper: Groq определяет формат по расширению"""
+        ext = os.path.splitext(audio_url)[1].lower()
+        if ext == ".oga":
+            ext = ".ogg"
+        return "audio" + (ext if ext in SUPPORTED_AUDIO_EXTENSIONS else ".ogg")
+    
+    def _create_transcription(self, file, max_retries: int = None) -> str:
+        """Отправляет файл (или поток) в Groq Whisper"""
+        client = self.client if max_retries is None else self.client.with_options(max_retries=max_retries)
+        status = "error"
         try:
-            # Скачиваем аудио файл
-            response = requests.get(audio_url, timeout=30)
+            with timed("transcription", MODEL_LATENCY, model=AUDIO_MODEL, operation="transcription"):
+                transcription = client.audio.transcriptions.create(
+                    file=file,
+                    model=AUDIO_MODEL,
+                    language="ru"  # Указываем русский язык для лучшего качества
+                )
+            status = "ok"
+        finally:
+            MODEL_REQUESTS.inc(model=AUDIO_MODEL, operation="transcription", status=status)
+        return transcription.text.strip()
+    
+    def _transcribe_stream(self, audio_url: str, file_unique_id: str = None) -> str:
+        """Передает загрузку из Telegram прямо в запрос к Whisper, не держа файл в памяти"""
+        import requests
+        filename = self._audio_filename(audio_url)
+        with requests.get(audio_url, stream=True, timeout=30) as response:
             response.raise_for_status()
-            
-            # Создаем временный файл в памяти
-            audio_file = io.BytesIO(response.content)
-            audio_file.name = "audio.ogg"  # Groq требует имя файла
-            
-            # Транскрибируем с помощью Groq Whisper
-            transcription = self.client.audio.transcriptions.create(
-                file=audio_file,
-                model=AUDIO_MODEL,
-                language="ru"  # Указываем русский язык для лучшего качества
+            response.raw.decode_content = True
+            
+            # Поток нельзя перечитать, поэтому повторы запроса отключены
+            if not file_unique_id:
+                return self._create_transcription((filename, _StreamReader(response.raw)), max_retries=0)
+            
+            # Параллельно с отправкой сохраняем файл в кэш
+            tmp_path = self.media_cache.temp_path(file_unique_id)
+            try:
+                with open(tmp_path, 'wb') as sink:
+                    text = self._create_transcription((filename, _StreamReader(response.raw, sink)), max_retries=0)
+                self.media_cache.commit_file(file_unique_id, tmp_path)
+                return text
+            finally:
+                audio_chunking.cleanup([tmp_path])
+    
+    def _transcribe_file(self, path: str, filename: str) -> str:
+        with open(path, 'rb') as f:
+            return self._create_transcription((filename, f))
+    
+    def _download_to_disk(self, url: str, file_unique_id: str = None) -> tuple[str, bool]:
+        """Скачивает файл на диск по частям. Возвращает путь и признак временного файла"""
+        import requests
+        tmp_path = self.media_cache.temp_path(file_unique_id or "download")
+        with requests.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        
+        if file_unique_id:
+            cached_path = self.media_cache.commit_file(file_unique_id, tmp_path)
+            if cached_path:
+                return cached_path, False
+        return tmp_path, True
+    
+    async def _transcribe_long_audio(self, audio_url: str, file_unique_id: str = None,
+                                     cached_path: str = None, duration: float = None) -> str:
+        """Режет длинное аудио на перекрывающиеся отрезки, распознает их параллельно и склеивает.
+        Отрезок, который не удалось распознать и со второй попытки, заменяется в тексте на "[…]" """
+        if cached_path:
+            path, is_temp = cached_path, False
+        else:
+            path, is_temp = await asyncio.to_thread(self._download_to_disk, audio_url, file_unique_id)
+        segments_dir = tempfile.mkdtemp(prefix="uma_audio_")
+        
+        try:
+            duration = duration or await asyncio.to_thread(audio_chunking.probe_duration, path)
+            if not duration:
+                self.logger.error("Не удалось определить длительность аудио")
+                return ""
+            
+            segments = audio_chunking.plan_segments(duration, AUDIO_CHUNK_SECONDS, AUDIO_CHUNK_OVERLAP_SECONDS)
+            semaphore = asyncio.Semaphore(AUDIO_CHUNK_CONCURRENCY)
+            
+            async def _transcribe_segment(index: int, start: float, length: float) -> str | None:
+                async with semaphore:
+                    segment_path = os.path.join(segments_dir, f"{index}.ogg")
+                    try:
+                        await asyncio.to_thread(audio_chunking.extract_segment, path, start, length, segment_path)
+                        for attempt in range(1, AUDIO_SEGMENT_ATTEMPTS + 1):
+                            try:
+                                return await asyncio.to_thread(self._transcribe_file, segment_path, "segment.ogg")
+                            except Exception as e:
+                                self.logger.warning(f"Отрезок {index} ({start:.0f} с), попытка {attempt}: {e}")
+                    except Exception as e:
+                        self.logger.warning(f"Не удалось вырезать отрезок {index} ({start:.0f} с): {e}")
+                    finally:
+                        audio_chunking.cleanup([segment_path])
+                    return None
+            
+            parts = await asyncio.gather(*(
+                _transcribe_segment(i, start, length) for i, (start, length) in enumerate(segments)
+            ))
+            failed = sum(part is None for part in parts)
+            if failed == len(parts):
+                return ""
+            self.logger.info(
+                f"Длинное аудио ({duration:.0f} с) распознано по {len(segments)} отрезкам, не распознано: {failed}"
             )
+            return audio_chunking.stitch_transcripts(parts)
+        finally:
+            shutil.rmtree(segments_dir, ignore_errors=True)
+            if is_temp:
+                audio_chunking.cleanup([path])
+    
+    async def transcribe_audio(self, audio_url: str, file_unique_id: str = None,
+                               file_size: int = None, duration: float = None) -> str:
+        """Транскрибирует аудио с помощью Groq Whisper API"""
+        import requests
+        try:
+            if file_unique_id:
+                cached = self.media_cache.get_result("transcription", file_unique_id)
+                if cached is not None:
+                    return cached
+            
+            cached_path = self.media_cache.get_path(file_unique_id) if file_unique_id else None
+            if cached_path:
+                file_size = os.path.getsize(cached_path)
+            # Отрезками — только то, что нельзя отправить одним запросом (или неизвестного размера, но длинное);
+            # без ffmpeg резать нечем, и файл уходит одним запросом, как раньше
+            is_long = (file_size or 0) > MAX_AUDIO_SIZE or (
+                file_size is None and (duration or 0) > AUDIO_CHUNK_THRESHOLD_SECONDS
+            )
+            if is_long and not audio_chunking.ffmpeg_available():
+                self.logger.warning("Для длинного аудио нужен ffmpeg, но он не найден в PATH: отправляем файл целиком")
+                is_long = False
+            
+            if is_long:
+                text = await self._transcribe_long_audio(audio_url, file_unique_id, cached_path, duration)
+            elif cached_path:
+                text = await asyncio.to_thread(self._transcribe_file, cached_path, self._audio_filename(audio_url))
+            else:
+                text = await asyncio.to_thread(self._transcribe_stream, audio_url, file_unique_id)
             
-            return transcription.text.strip()
+            # Неполную транскрипцию не кэшируем: при повторной отправке пропущенные отрезки распознаются снова
+            if file_unique_id and text and audio_chunking.SEGMENT_PLACEHOLDER not in text:
+                self.media_cache.put_result("transcription", file_unique_id, text)
+            return text
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Ошибка при скачивании аудио: {e}")
@@ -235,20 +544,21 @@ class GroqClient:
             self.logger.error(f"Ошибка при транскрибации аудио: {e}")
             return ""
     
-    async def process_audio_message(self, audio_url: str, conversation_history: list = None) -> str:
+    async def process_audio_message(self, audio_url: str, conversation_history: list = None, file_unique_id: str = None,
+                                    file_size: int = None, duration: float = None, user_id: int = None) -> str:
         """Обрабатывает голосовое сообщение"""
         try:
             # Сначала транскрибируем аудио
-            transcribed_text = await self.transcribe_audio(audio_url)
+            transcribed_text = await self.transcribe_audio(audio_url, file_unique_id, file_size, duration)
             
             if not transcribed_text:
                 return "🎤 Извините, не удалось распознать речь в голосовом сообщении. Попробуйте:\n\n• Говорить четче и громче\n• Записать сообщение в тихом месте\n• Отправить текстом, если проблема повторяется"
             
             # Добавляем информацию о том, что это транскрибированный текст
-            response_prefix = f"🎤 Распознано: \"{transcribed_text}\"\n\n"
+            response_prefix = f"🎤 Распознано: \"{html.escape(transcribed_text, quote=False)}\"\n\n"
             
             # Затем обрабатываем транскрибированный текст
-            ai_response = await self.process_text_message(transcribed_text, conversation_history)
+            ai_response = await self.answer_text(transcribed_text, conversation_history, user_id=user_id)
             
             return response_prefix + ai_response
             
@@ -258,27 +568,28 @@ class GroqClient:
     
     def should_use_browser_search(self, text: str) -> bool:
         """Определяет, нужно ли использовать browser search"""
-        search_keywords = [
-            "новости", "курс", "погода", "время", "дата", "актуально", 
-            "сейчас", "сегодня", "последние", "обновление", "поиск"
-        ]
-        
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in search_keywords)
+        return INTENTS.matches_any(text, SEARCH_INTENTS)
     
-    async def _download_and_encode_image(self, image_url: str) -> str:
+    async def _download_and_encode_image(self, image_url: str, file_unique_id: str = None) -> str:
         """Загружает изображение и кодирует в base64"""
         try:
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            return base64.b64encode(response.content).decode('utf-8')
+            return base64.b64encode(await self._fetch_file(image_url, file_unique_id)).decode('utf-8')
         except Exception as e:
             self.logger.error(f"Ошибка при загрузке изображения {image_url}: {e}")
             return None
     
-    async def process_multiple_images_message(self, image_urls: list, text: str = "", conversation_history: list = None) -> str:
+    async def process_multiple_images_message(self, image_urls: list, text: str = "", conversation_history: list = None,
+                                              file_unique_ids: list = None, use_cache: bool = True, user_id: int = None) -> str:
         """Обрабатывает сообщение с несколькими изображениями"""
         try:
+            file_unique_ids = file_unique_ids or [None] * len(image_urls)
+            history = self._history_messages(conversation_history)
+            result_key = self._result_key(file_unique_ids, text, user_id, history) if all(file_unique_ids) else None
+            if result_key and use_cache:
+                cached = self.media_cache.get_result("images", result_key)
+                if cached is not None:
+                    return cached
+            
             # Системное сообщение
             system_message = """Ты — Uma AI, ИИ-ассистент для анализа изображений на базе LLaMA 4 Scout. 
             Описывай изображения подробно, отвечай на вопросы о них, выполняй OCR если есть текст.
@@ -322,19 +633,15 @@ class GroqClient:
             messages.append({"role": "system", "content": system_message})
             
             # Добавляем историю диалога
-            if conversation_history:
-                for entry in conversation_history[-5:]:  # Последние 5 сообщений
-                    if "message" in entry and "response" in entry:
-                        messages.append({"role": "user", "content": entry["message"].get("text", "")})
-                        messages.append({"role": "assistant", "content": entry["response"]})
+            messages.extend(history)
             
             # Формируем контент с несколькими изображениями
             content = []
             
             # Добавляем все изображения
-            for i, image_url in enumerate(image_urls):
+            for i, (image_url, file_unique_id) in enumerate(zip(image_urls, file_unique_ids)):
                 try:
-                    image_data = await self._download_and_encode_image(image_url)
+                    image_data = await self._download_and_encode_image(image_url, file_unique_id)
                     if image_data:
                         content.append({
                             "type": "image_url",
@@ -363,15 +670,19 @@ class GroqClient:
             
             messages.append({"role": "user", "content": content})
             
-            response = self.client.chat.completions.create(
+            response = await self._complete(
+                "images",
                 model=MULTIMODAL_MODEL,
+                user_id=user_id,
                 messages=messages,
                 max_tokens=1500,
                 temperature=0.7
             )
             
-            content = response.choices[0].message.content
-            return clean_html_tags(content)
+            content = self._finalize_response(response.choices[0].message.content)
+            if result_key:
+                self.media_cache.put_result("images", result_key, content)
+            return content
             
         except Exception as e:
             self.logger.error(f"Ошибка при обработке нескольких изображений: {e}")
@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from config import HISTORY_CACHE_USERS, HISTORY_MAX_ENTRIES
+from records import ConversationEntry, MessageType
+import snapshot
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS turns (
+	user_id INTEGER NOT NULL,
+	seq INTEGER NOT NULL,
+	type INTEGER NOT NULL,
+	sent INTEGER,
+	row BLOB NOT NULL,
+	PRIMARY KEY (user_id, seq)
+) WITHOUT ROWID;
+-- Номер последней записи пользователя с очищенной историей: нумерация продолжается после вытеснения из кэша и рестарта
+CREATE TABLE IF NOT EXISTS cleared (
+	user_id INTEGER PRIMARY KEY,
+	last_seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+	user_id INTEGER NOT NULL,
+	day TEXT NOT NULL,
+	models BLOB NOT NULL,
+	PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+"""
+
+def default_path(db_file: str) -> str:
+	"""Файл историй рядом со снимком: database.json -> database.history.sqlite3"""
+	return os.path.splitext(db_file)[0] + ".history.sqlite3"
+
+class HistoryStore:
+	"""Истории диалогов и расход токенов по пользователям во встроенной базе SQLite.
+	В памяти — LRU историй недавно активных пользователей; каждое изменение сразу пишется на диск (write-through),
+	поэтому память растет с числом активных пользователей, а не всех, кто когда-либо писал боту"""
+
+	def __init__(self, path: str, max_users: int = HISTORY_CACHE_USERS, max_entries: int = HISTORY_MAX_ENTRIES) -> None:
+		self.path = path
+		self.max_users = max_users
+		self.max_entries = max_entries
+		# Обращения идут из event loop и из потока прогрева
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(path, check_same_thread=False)
+		self._db.execute("PRAGMA journal_mode=WAL")
+		self._db.execute("PRAGMA synchronous=NORMAL")
+		self._db.executescript(_SCHEMA)
+		# Записи кодируются кодеком снимков; выбранный при создании базы кодек закрепляется в meta
+		codec_name = self._meta("codec")
+		if codec_name is None:
+			codec_name = snapshot.get_codec().name
+			with self._db:
+				self._db.execute("INSERT INTO meta (key, value) VALUES ('codec', ?)", (codec_name,))
+		self.codec = snapshot.get_codec(codec_name)
+		# user_id -> (номер последней записи, записи по возрастанию номера). Номера в кэше идут подряд:
+		# у entries[i] номер last_seq - len(entries) + 1 + i
+		self._cache: OrderedDict[int, tuple[int, list[ConversationEntry]]] = OrderedDict()
+
+	def _meta(self, key: str) -> str | None:
+		row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+	def _encode(self, entry: ConversationEntry) -> tuple[int, int | None, bytes]:
+		return int(entry.type), entry.sent, self.codec.dumps(entry.to_row())
+
+	def _load(self, user_id: int) -> tuple[int, list[ConversationEntry]]:
+		"""История из кэша или с диска; вызывается под блокировкой"""
+		cached = self._cache.get(user_id)
+		if cached is not None:
+			self._cache.move_to_end(user_id)
+			return cached
+		rows = self._db.execute(
+			"SELECT seq, row FROM turns WHERE user_id = ? ORDER BY seq DESC LIMIT ?", (user_id, self.max_entries),
+		).fetchall()
+		rows.reverse()
+		entries = [ConversationEntry.from_row(self.codec.loads(row)) for _, row in rows]
+		if rows:
+			last_seq = rows[-1][0]
+		else:
+			row = self._db.execute("SELECT last_seq FROM cleared WHERE user_id = ?", (user_id,)).fetchone()
+			last_seq = row[0] if row else 0
+		cached = (last_seq, entries)
+		self._cache[user_id] = cached
+		while len(self._cache) > self.max_users:
+			self._cache.popitem(last=False)
+		return cached
+
+	def get(self, user_id: int, limit: int | None = None, before: int | None = None) -> list[ConversationEntry]:
+		"""Последние limit записей; before — только записи с номером меньше before"""
+		with self._lock:
+			last_seq, entries = self._load(user_id)
+			if before is not None:
+				entries = entries[:max(0, len(entries) - (last_seq - before + 1))]
+			return entries[-limit:] if limit else list(entries)
+
+	def last(self, user_id: int) -> tuple[int, ConversationEntry] | None:
+		"""Последняя запись и ее номер"""
+		with self._lock:
+			last_seq, entries = self._load(user_id)
+			return (last_seq, entries[-1]) if entries else None
+
+	def append(self, user_id: int, entry: ConversationEntry) -> None:
+		"""Добавляет ход и обрезает историю до max_entries"""
+		with self._lock:
+			last_seq, entries = self._load(user_id)
+			seq = last_seq + 1
+			entries.append(entry)
+			if len(entries) > self.max_entries:
+				del entries[:-self.max_entries]
+			self._cache[user_id] = (seq, entries)
+			with self._db:
+				self._db.execute(
+					"INSERT OR REPLACE INTO turns (user_id, seq, type, sent, row) VALUES (?, ?, ?, ?, ?)",
+					(user_id, seq, *self._encode(entry)),
+				)
+				self._db.execute("DELETE FROM turns WHERE user_id = ? AND seq <= ?", (user_id, seq - self.max_entries))
+
+	def replace_response(self, user_id: int, seq: int, response: str) -> bool:
+		"""Заменяет ответ в записи с номером seq; False, если записи уже нет (история очищена или обрезана)"""
+		with self._lock:
+			last_seq, entries = self._load(user_id)
+			index = len(entries) - 1 - (last_seq - seq)
+			if not 0 <= index < len(entries):
+				return False
+			entry = entries[index]
+			entry.response = response
+			with self._db:
+				self._db.execute(
+					"UPDATE turns SET row = ? WHERE user_id = ? AND seq = ?",
+					(self._encode(entry)[2], user_id, seq),
+				)
+			return True
+
+	def clear(self, user_id: int) -> bool:
+		"""Удаляет историю; номера записей продолжаются с прежнего, чтобы не путать кэш и диск"""
+		with self._lock:
+			last_seq, entries = self._load(user_id)
+			if not entries:
+				return False
+			self._cache[user_id] = (last_seq, [])
+			with self._db:
+				self._db.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+				self._db.execute(
+					"INSERT OR REPLACE INTO cleared (user_id, last_seq) VALUES (?, ?)", (user_id, last_seq),
+				)
+			return True
+
+	def count_messages(self, today_start: int, tomorrow_start: int, week_start: int) -> dict:
+		"""Счетчики для админ-панели одним запросом по диску, без загрузки историй в память"""
+		with self._lock:
+			row = self._db.execute(
+				"SELECT COUNT(*), SUM(type = ?), SUM(type = ?), SUM(type = ?), "
+				"SUM(sent >= ? AND sent < ?), SUM(sent >= ?) FROM turns",
+				(MessageType.TEXT, MessageType.IMAGE, MessageType.AUDIO, today_start, tomorrow_start, week_start),
+			).fetchone()
+		total, text, image, audio, today, week = (value or 0 for value in row)
+		return {
+			"total_messages": total,
+			"text_messages": text,
+			"image_messages": image,
+			"audio_messages": audio,
+			"messages_today": today,
+			"messages_this_week": week,
+		}
+
+	def _save_usage(self, user_id: int, day: str, models: dict) -> None:
+		self._db.execute(
+			"INSERT OR REPLACE INTO usage (user_id, day, models) VALUES (?, ?, ?)",
+			(user_id, day, self.codec.dumps(models)),
+		)
+
+	def save_usage(self, usage: dict[int, dict[str, dict]]) -> None:
+		with self._lock, self._db:
+			for user_id, days in usage.items():
+				for day, models in days.items():
+					self._save_usage(user_id, day, models)
+
+	def load_usage(self, day: str) -> dict[int, dict[str, dict]]:
+		"""Расход за день (сегодняшний): прошлые дни остаются только на диске"""
+		with self._lock:
+			rows = self._db.execute("SELECT user_id, models FROM usage WHERE day = ?", (day,)).fetchall()
+		return {user_id: {day: self.codec.loads(models)} for user_id, models in rows}
+
+	def import_conversations(self, conversations: dict[int, list[ConversationEntry]]) -> None:
+		"""Переносит истории из снимка прежней версии; повторный импорт тех же данных ничего не дублирует"""
+		with self._lock, self._db:
+			for user_id, entries in conversations.items():
+				entries = entries[-self.max_entries:]
+				self._db.executemany(
+					"INSERT OR REPLACE INTO turns (user_id, seq, type, sent, row) VALUES (?, ?, ?, ?, ?)",
+					[(user_id, seq, *self._encode(entry)) for seq, entry in enumerate(entries, 1)],
+				)
+			self._cache.clear()
+
+	def export(self) -> tuple[dict[int, list[ConversationEntry]], dict[int, dict[str, dict]]]:
+		"""Все истории и расход токенов за все дни — для выгрузки в прежний формат (snapshot.py --legacy)"""
+		with self._lock:
+			turns = self._db.execute("SELECT user_id, row FROM turns ORDER BY user_id, seq").fetchall()
+			usage_rows = self._db.execute("SELECT user_id, day, models FROM usage ORDER BY user_id, day").fetchall()
+		conversations: dict[int, list[ConversationEntry]] = {}
+		for user_id, row in turns:
+			conversations.setdefault(user_id, []).append(ConversationEntry.from_row(self.codec.loads(row)))
+		usage: dict[int, dict[str, dict]] = {}
+		for user_id, day, models in usage_rows:
+			usage.setdefault(user_id, {})[day] = self.codec.loads(models)
+		return conversations, usage
+
+	def close(self) -> None:
+		with self._lock:
+			self._db.close()
@@ -0,0 +1,280 @@
+import html
+import re
+
+# Разметка Telegram: https://core.telegram.org/bots/api#html-style
+SIMPLE_TAGS = frozenset({'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 'tg-spoiler'})
+# Теги, которые нельзя вкладывать сами в себя
+NON_NESTABLE_TAGS = frozenset({'a', 'blockquote', 'code', 'pre'})
+HEADING_TAGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+LINE_BREAK_TAGS = frozenset({'br'})
+TELEGRAM_ENTITIES = frozenset({'lt', 'gt', 'amp', 'quot'})
+ALLOWED_URL_SCHEMES = ('http://', 'https://', 'tg://', 'mailto:')
+
+# Один проход: тег, сущность или одиночный спецсимвол
+_TOKEN = re.compile(
+	r'<(?P<close>/?)(?P<name>[a-zA-Z][a-zA-Z0-9-]*)(?P<attrs>[^<>]*)>'
+	r'|&(?P<entity>#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{1,31});'
+	r'|(?P<special>[<>&])'
+)
+_HREF = re.compile(r'''href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+_CLASS = re.compile(r'''class\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+_LANGUAGE_CLASS = re.compile(r'^language-[\w+#.-]{1,32}$')
+# Незавершенный хвост при потоковом выводе: "<b", "</blockq", "&am"
+_PARTIAL_TAIL = re.compile(r'(?:<(?:/?[a-zA-Z][^<>]*)?|&#?[a-zA-Z0-9]{0,31})$')
+
+def _attr(pattern: re.Pattern, attrs: str) -> str | None:
+	match = pattern.search(attrs)
+	if not match:
+		return None
+	return html.unescape(next(group for group in match.groups() if group is not None))
+
+class _OpenTag:
+	__slots__ = ("name", "markup")
+
+	def __init__(self, name: str, markup: str) -> None:
+		self.name = name
+		self.markup = markup
+
+	@property
+	def closing(self) -> str:
+		return f"</{self.name}>"
+
+class _Sanitizer:
+	def __init__(self) -> None:
+		self.out: list[str] = []
+		self.stack: list[_OpenTag] = []
+
+	def _in(self, name: str) -> bool:
+		return any(tag.name == name for tag in self.stack)
+
+	def _in_code(self) -> bool:
+		return bool(self.stack) and self.stack[-1].name in ('code', 'pre')
+
+	def _is_code_markup(self, name: str, is_close: bool) -> bool:
+		"""Внутри кода разметкой считаются только закрытие code/pre и <code> сразу внутри <pre>"""
+		if is_close:
+			return name in ('code', 'pre') and self._in(name)
+		return name == 'code' and self.stack[-1].name == 'pre'
+
+	def _open_markup(self, name: str, attrs: str) -> str | None:
+		"""Разметка открывающего тега с допустимыми атрибутами или None, если тег нужно отбросить"""
+		if name in SIMPLE_TAGS:
+			return f"<{name}>"
+		if name == 'a':
+			href = _attr(_HREF, attrs)
+			if not href or not href.strip().lower().startswith(ALLOWED_URL_SCHEMES):
+				return None
+			return f'<a href="{html.escape(href.strip(), quote=True)}">'
+		if name == 'blockquote':
+			return "<blockquote expandable>" if re.search(r'\bexpandable\b', attrs, re.IGNORECASE) else "<blockquote>"
+		if name == 'pre':
+			return "<pre>"
+		if name == 'code':
+			css_class = _attr(_CLASS, attrs)
+			if css_class and _LANGUAGE_CLASS.match(css_class) and self.stack and self.stack[-1].name == 'pre':
+				return f'<code class="{css_class}">'
+			return "<code>"
+		if name == 'span':
+			return "<tg-spoiler>" if _attr(_CLASS, attrs) == 'tg-spoiler' else None
+		return None
+
+	def open_tag(self, name: str, attrs: str) -> None:
+		if name in HEADING_TAGS:
+			name, attrs = 'b', ''
+		if name in NON_NESTABLE_TAGS and self._in(name):
+			return
+		markup = self._open_markup(name, attrs)
+		if markup is None:
+			return
+		if markup == "<tg-spoiler>":
+			name = 'tg-spoiler'
+		self.stack.append(_OpenTag(name, markup))
+		self.out.append(markup)
+
+	def _pop(self) -> _OpenTag:
+		"""Закрывает верхний тег; пустой (например, открытый заново после перепутанной вложенности) убирается"""
+		tag = self.stack.pop()
+		if self.out and self.out[-1] == tag.markup:
+			self.out.pop()
+		else:
+			self.out.append(tag.closing)
+		return tag
+
+	def close_tag(self, name: str) -> None:
+		if name in HEADING_TAGS:
+			name = 'b'
+		elif name == 'span' and self._in('tg-spoiler'):
+			name = 'tg-spoiler'
+		if not self._in(name):
+			return
+		# Перепутанная вложенность: закрываем лишние теги и открываем их снова после
+		reopen = []
+		while self.stack:
+			tag = self._pop()
+			if tag.name == name:
+				break
+			reopen.append(tag)
+		for tag in reversed(reopen):
+			self.stack.append(tag)
+			self.out.append(tag.markup)
+
+	def entity(self, entity: str) -> None:
+		if entity.lower() in TELEGRAM_ENTITIES or entity.startswith('#'):
+			self.out.append(f"&{entity};")
+		else:
+			self.out.append(html.escape(html.unescape(f"&{entity};"), quote=False))
+
+	def finish(self) -> str:
+		while self.stack:
+			self._pop()
+		return "".join(self.out)
+
+def sanitize_html(text: str, partial: bool = False) -> str:
+	"""Приводит HTML к подмножеству Telegram за один линейный проход: отбрасывает неподдерживаемые теги,
+	экранирует одиночные <, > и &, балансирует вложенность. В режиме partial (потоковое редактирование)
+	незавершенный тег или сущность в конце текста отбрасывается"""
+	if partial:
+		tail = _PARTIAL_TAIL.search(text)
+		if tail and tail.group():
+			text = text[:tail.start()]
+
+	sanitizer = _Sanitizer()
+	pos = 0
+	for match in _TOKEN.finditer(text):
+		if match.start() > pos:
+			sanitizer.out.append(text[pos:match.start()])
+		pos = match.end()
+
+		if match.group('special') is not None:
+			sanitizer.out.append(html.escape(match.group('special'), quote=False))
+		elif match.group('entity') is not None:
+			sanitizer.entity(match.group('entity'))
+		else:
+			name = match.group('name').lower()
+			is_close = bool(match.group('close'))
+			if sanitizer._in_code() and not sanitizer._is_code_markup(name, is_close):
+				# Внутри кода теги — это текст
+				sanitizer.out.append(html.escape(match.group(), quote=False))
+			elif name in LINE_BREAK_TAGS:
+				sanitizer.out.append("\n")
+			elif is_close:
+				sanitizer.close_tag(name)
+			else:
+				sanitizer.open_tag(name, match.group('attrs'))
+
+	if pos < len(text):
+		sanitizer.out.append(text[pos:])
+	return sanitizer.finish()
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Разделители и слова для поиска мест разрыва; приоритет: абзац > строка > пробел
+_SPLIT_UNIT = re.compile(r'\n\s*\n|\n|[ \t]+|[^\s]+')
+_BREAK_PRIORITY = {"paragraph": 3, "line": 2, "space": 1}
+
+def utf16_len(text: str) -> int:
+	"""Длина в единицах UTF-16, как ее считает Telegram"""
+	return len(text.encode('utf-16-le')) // 2
+
+class _Break:
+	__slots__ = ("index", "length", "stack")
+
+	def __init__(self, index: int, length: int, stack: tuple) -> None:
+		self.index = index
+		self.length = length
+		self.stack = stack
+
+def _iter_units(text: str):
+	"""(разметка, видимая длина, тип разрыва после нее, тег) для каждой неделимой единицы текста"""
+	pos = 0
+	for match in _TOKEN.finditer(text):
+		if match.start() > pos:
+			yield from _iter_text_units(text[pos:match.start()])
+		pos = match.end()
+		if match.group('name') is not None:
+			yield match.group(), 0, None, (match.group('name').lower(), bool(match.group('close')))
+		else:
+			yield match.group(), utf16_len(html.unescape(match.group())), None, None
+	if pos < len(text):
+		yield from _iter_text_units(text[pos:])
+
+def _iter_text_units(text: str):
+	for match in _SPLIT_UNIT.finditer(text):
+		unit = match.group()
+		if unit.startswith('\n'):
+			kind = "paragraph" if unit.count('\n') > 1 else "line"
+		elif unit.isspace():
+			kind = "space"
+		else:
+			kind = None
+		yield unit, utf16_len(unit), kind, None
+
+def _hard_cut(unit: str, budget: int) -> tuple[str, str]:
+	"""Режет слово длиннее лимита по символам, не разрывая суррогатные пары"""
+	used = 0
+	for i, char in enumerate(unit):
+		size = 2 if ord(char) > 0xFFFF else 1
+		if used + size > budget:
+			return unit[:i], unit[i:]
+		used += size
+	return unit, ""
+
+def split_html_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list[str]:
+	"""Делит HTML-текст на части не длиннее limit видимых символов (UTF-16). Открытые теги закрываются
+	в конце части и открываются заново в следующей; разрыв предпочтительно по абзацу, затем по строке и пробелу"""
+	if utf16_len(text) <= limit:
+		return [text]
+
+	parts: list[str] = []
+	current: list[str] = []
+	length = 0
+	stack: list[_OpenTag] = []
+	breaks: dict[str, _Break] = {}
+
+	def emit(index: int, cut_stack: tuple) -> None:
+		body = "".join(current[:index]).rstrip()
+		if body:
+			parts.append(body + "".join(tag.closing for tag in reversed(cut_stack)))
+
+	def cut() -> None:
+		nonlocal current, length, breaks
+		# Самый приоритетный разрыв, если он не раньше середины части; иначе самый поздний
+		candidates = sorted(breaks.items(), key=lambda item: (-_BREAK_PRIORITY[item[0]], -item[1].length))
+		chosen = next((b for _, b in candidates if b.length >= limit // 2), None)
+		if chosen is None:
+			chosen = max(breaks.values(), key=lambda b: b.length)
+		emit(chosen.index, chosen.stack)
+		current = [tag.markup for tag in chosen.stack] + current[chosen.index:]
+		length -= chosen.length
+		breaks = {}
+
+	for markup, size, kind, tag in _iter_units(text):
+		if tag is not None:
+			name, is_close = tag
+			if is_close:
+				if any(t.name == name for t in stack):
+					while stack and stack.pop().name != name:
+						pass
+			else:
+				stack.append(_OpenTag(name, markup))
+			current.append(markup)
+			continue
+
+		while length + size > limit:
+			if breaks:
+				cut()
+				continue
+			# Разрывать негде: режем само слово
+			head, markup = _hard_cut(markup, limit - length)
+			current.append(head)
+			emit(len(current), tuple(stack))
+			current = [t.markup for t in stack]
+			length = 0
+			size = utf16_len(markup)
+
+		current.append(markup)
+		length += size
+		if kind is not None:
+			breaks[kind] = _Break(len(current), length, tuple(stack))
+
+	emit(len(current), tuple(stack))
+	return parts or [text]
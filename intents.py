@@ -0,0 +1,113 @@
+import re
+from typing import Iterable
+
+# Типовые окончания русских существительных и прилагательных для терминов вида "погод~"
+_RU_ENDINGS = (
+	r'(?:а|я|о|е|и|ы|у|ю|ь|ом|ем|ой|ей|ый|ий|ам|ям|ах|ях|ов|ев|ами|ями|'
+	r'ого|его|ому|ему|ую|юю|ая|яя|ое|ее|ые|ие|ых|их|ым|им|ыми|ими)?'
+)
+
+# Синтаксис терминов:
+#   "слово"   — точное слово
+#   "основа~" — основа плюс типовое окончание (погода, погоды, погодой...)
+#   "основа*" — основа плюс любое продолжение слова (новости, новостей, новостной...)
+#   "а|б"     — варианты; пробел внутри термина — любые пробелы или дефис
+INTENT_RULES: dict[str, tuple[str, ...]] = {
+	# Актуальная информация (веб-поиск), по классам запросов
+	"rates": ("курс~", "доллар~", "евро", "рубл~", "биткоин~", "bitcoin", "криптовалют*", "валют~", "котировк*", "акци~ компании"),
+	"weather": ("погод~", "температур~", "прогноз~ погоды", "осадк*"),
+	"news": ("новост*", "последн* новост*", "обновлени~", "что произошло", "что случилось"),
+	"datetime": ("время|времени|временем", "дата|даты|дату|дате|датой", "который час", "какое число"),
+	"search": ("актуальн*", "сейчас", "сегодня", "сегодняшн*", "последн*", "поиск~", "найди", "загугли"),
+	# Ответ зависит от текущего момента — результаты поиска не кэшируются (см. search.SearchService)
+	"now": ("сейчас", "сегодня", "сегодняшн*"),
+	# Шаблонные ответы
+	"greeting": ("привет*", "приветствую", "здравствуй|здравствуйте", "добр~ день|добр~ утро|добр~ вечер|доброго дня|доброго утра|доброго вечера", "хай", "салют", "hi", "hello", "hey"),
+	"thanks": ("спасибо", "большое спасибо", "спасибо большое", "спс", "благодарю", "thanks", "thank you", "thx"),
+	"generate_verb": ("нарисуй", "сгенерируй", "создай", "сделай", "генерир*", "озвучь"),
+	"generate_video": ("видео*", "ролик~", "анимаци~", "клип~"),
+	"generate_speech": ("озвучь", "озвуч*", "голос~", "речь|речи", "аудио*", "песн~|песня|песню", "музык~"),
+	"generate_image": ("картинк~", "изображени~", "фото*", "рисун*", "арт", "логотип~", "аватар~|аватарк~"),
+	# Признаки сложного запроса — основная модель
+	"complex": (
+		"почему", "объясни*", "сравни*", "проанализир*", "анализ~", "напиши", "код~", "програм*",
+		"переведи", "докажи", "реши", "посчитай", "вычисли", "план~", "эссе", "стать~", "резюме",
+	),
+	# Модерация ответов: упоминания сторонних генераторов, запрещенные системным промптом
+	"moderation_competitor": ("midjourney", "dall e|dalle", "leonardo ai|leonardo", "stable diffusion", "sora"),
+}
+
+SEARCH_INTENTS = ("rates", "weather", "news", "datetime", "search")
+
+def _compile_term(term: str) -> str:
+	variants = []
+	for variant in term.split('|'):
+		words = []
+		for word in variant.split():
+			if word.endswith('~'):
+				words.append(re.escape(word[:-1]) + _RU_ENDINGS)
+			elif word.endswith('*'):
+				words.append(re.escape(word[:-1]) + r'\w*')
+			else:
+				words.append(re.escape(word))
+		variants.append(r'[\s-]+'.join(words))
+	return '|'.join(variants)
+
+class IntentMatcher:
+	"""Находит все интенты в тексте за один проход одного скомпилированного регулярного выражения"""
+
+	def __init__(self, rules: dict[str, Iterable[str]]) -> None:
+		# Одинаковые термины разных интентов сливаются в одну группу
+		term_intents: dict[str, set[str]] = {}
+		for intent, terms in rules.items():
+			for term in terms:
+				term_intents.setdefault(term.lower().replace('ё', 'е'), set()).add(intent)
+
+		# Фразы и более длинные основы первыми, чтобы они выигрывали у своих префиксов
+		ordered = sorted(term_intents, key=lambda t: (-len(t.split()), -len(t.rstrip('~*'))))
+		self._group_intents: dict[str, frozenset[str]] = {}
+		parts = []
+		for i, term in enumerate(ordered):
+			group = f"t{i}"
+			self._group_intents[group] = frozenset(term_intents[term])
+			parts.append(f"(?P<{group}>{_compile_term(term)})")
+
+		self.intents = frozenset(rules)
+		self._pattern = re.compile(r'(?<!\w)(?:' + '|'.join(parts) + r')(?!\w)', re.IGNORECASE)
+
+	@staticmethod
+	def _prepare(text: str) -> str:
+		# Замена сохраняет длину строки, поэтому позиции совпадений совпадают с исходным текстом
+		return text.lower().replace('ё', 'е')
+
+	def find_all(self, text: str) -> list[tuple[frozenset[str], int, int]]:
+		"""Возвращает (интенты, начало, конец) для каждого найденного термина"""
+		return [
+			(self._group_intents[match.lastgroup], match.start(), match.end())
+			for match in self._pattern.finditer(self._prepare(text))
+		]
+
+	def match(self, text: str) -> set[str]:
+		"""Все интенты, встречающиеся в тексте"""
+		found: set[str] = set()
+		for intents, _, _ in self.find_all(text):
+			found |= intents
+		return found
+
+	def matches_any(self, text: str, intents: Iterable[str]) -> bool:
+		wanted = set(intents)
+		return any(found & wanted for found, _, _ in self.find_all(text))
+
+	def covers(self, text: str, intents: Iterable[str]) -> bool:
+		"""True, если каждое слово текста входит в термин одного из интентов (например, сообщение — только приветствие)"""
+		wanted = set(intents)
+		prepared = self._prepare(text)
+		covered = [False] * len(prepared)
+		for found, start, end in self.find_all(text):
+			if found & wanted:
+				covered[start:end] = [True] * (end - start)
+		words = list(re.finditer(r'\w+', prepared))
+		return bool(words) and all(covered[w.start()] for w in words)
+
+# Единый экземпляр: собирается один раз при импорте и используется поиском, роутером и модерацией
+INTENTS = IntentMatcher(INTENT_RULES)
@@ -1,59 +1,83 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from pydantic import ConfigDict
 from config import UMA_WEBSITE
 
+# Клавиатуры статичны, поэтому собираются один раз при импорте и один экземпляр отдается во все ответы.
+# Модели aiogram изменяемы, поэтому готовые клавиатуры собираются из замороженных подклассов со строками-кортежами:
+# случайное изменение общей клавиатуры падает с ошибкой, а не меняет ее для всех пользователей.
+# Чтобы получить измененную клавиатуру, соберите новую InlineKeyboardMarkup
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton):
+	model_config = ConfigDict(frozen=True)
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup):
+	model_config = ConfigDict(frozen=True)
+
+	inline_keyboard: tuple[tuple[FrozenInlineKeyboardButton, ...], ...]
+
+MAIN_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[FrozenInlineKeyboardButton(text="💬 Новый диалог", callback_data="new_dialog")],
+	[FrozenInlineKeyboardButton(text="📜 История", callback_data="history")],
+	[FrozenInlineKeyboardButton(text="⚙️ Настройки", callback_data="settings")],
+	[FrozenInlineKeyboardButton(text="ℹ️ О проекте", callback_data="about")],
+	[FrozenInlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
+])
+
+CHAT_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[
+		FrozenInlineKeyboardButton(text="🔄 Перегенерировать", callback_data="regenerate"),
+		FrozenInlineKeyboardButton(text="📋 В меню", callback_data="main_menu"),
+	],
+])
+
+ADMIN_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[
+		FrozenInlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"),
+		FrozenInlineKeyboardButton(text="🔬 Профиль", callback_data="admin_profile"),
+	],
+	[FrozenInlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")],
+	[FrozenInlineKeyboardButton(text="✏️ Сообщение рассылки", callback_data="admin_message")],
+	[FrozenInlineKeyboardButton(text="🗓 Планировщик", callback_data="admin_scheduler")],
+	[FrozenInlineKeyboardButton(text="🚀 Тестовая рассылка", callback_data="admin_send_broadcast")],
+	[FrozenInlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")],
+])
+
+UMA_WEBSITE_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[FrozenInlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
+])
+
+SETTINGS_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[FrozenInlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")],
+	[FrozenInlineKeyboardButton(text="🗑 Очистить историю", callback_data="clear_history")],
+])
+
+ABOUT_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[FrozenInlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
+	[FrozenInlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")],
+])
+
+BROADCAST_KEYBOARD = FrozenInlineKeyboardMarkup(inline_keyboard=[
+	[FrozenInlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
+	[FrozenInlineKeyboardButton(text="💬 Начать чат", callback_data="new_dialog")],
+])
+
 def get_main_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[InlineKeyboardButton(text="💬 Новый диалог", callback_data="new_dialog")],
-		[InlineKeyboardButton(text="📜 История", callback_data="history")],
-		[InlineKeyboardButton(text="⚙️ Настройки", callback_data="settings")],
-		[InlineKeyboardButton(text="ℹ️ О проекте", callback_data="about")],
-		[InlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return MAIN_KEYBOARD
 
 def get_chat_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[
-			InlineKeyboardButton(text="🔄 Перегенерировать", callback_data="regenerate"),
-			InlineKeyboardButton(text="📋 В меню", callback_data="main_menu"),
-		],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return CHAT_KEYBOARD
 
 def get_admin_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
-		[InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")],
-		[InlineKeyboardButton(text="✏️ Сообщение рассылки", callback_data="admin_message")],
-		[InlineKeyboardButton(text="🗓 Планировщик", callback_data="admin_scheduler")],
-		[InlineKeyboardButton(text="🚀 Тестовая рассылка", callback_data="admin_send_broadcast")],
-		[InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return ADMIN_KEYBOARD
 
 def get_uma_website_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[InlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return UMA_WEBSITE_KEYBOARD
 
 def get_settings_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")],
-		[InlineKeyboardButton(text="🗑 Очистить историю", callback_data="clear_history")],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return SETTINGS_KEYBOARD
 
 def get_about_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[InlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
-		[InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return ABOUT_KEYBOARD
 
 def get_broadcast_keyboard() -> InlineKeyboardMarkup:
-	keyboard = [
-		[InlineKeyboardButton(text="🌐 Открыть сайт", url=UMA_WEBSITE)],
-		[InlineKeyboardButton(text="💬 Начать чат", callback_data="new_dialog")],
-	]
-	return InlineKeyboardMarkup(inline_keyboard=keyboard)
+	return BROADCAST_KEYBOARD
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from config import LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD
+from metrics import REGISTRY
+
+LOOP_LAG = REGISTRY.histogram(
+	"umabot_event_loop_lag_seconds", "Задержка пробуждения event loop относительно запланированного",
+	buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_LAG_QUANTILES = REGISTRY.gauge(
+	"umabot_event_loop_lag_quantile_seconds", "Перцентили задержки event loop за последние замеры", ("quantile",),
+)
+LOOP_BLOCKS = REGISTRY.counter(
+	"umabot_event_loop_blocked_total", "Сколько раз callback блокировал event loop дольше порога",
+)
+
+class LoopMonitor:
+	"""Сторожевой таймер event loop: корутина меряет задержку пробуждения, отдельный поток
+	замечает зависание дольше threshold и пишет в лог стек, на котором loop стоит"""
+
+	QUANTILES = (0.5, 0.95, 0.99)
+
+	def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD, window: int = 600) -> None:
+		self.interval = interval
+		self.threshold = threshold
+		self.logger = logging.getLogger(__name__)
+		self._samples: deque[float] = deque(maxlen=window)
+		self._heartbeat = time.monotonic()
+		self._loop_thread_id: int | None = None
+		self._task: asyncio.Task | None = None
+		self._watchdog: threading.Thread | None = None
+		self._stopped = threading.Event()
+
+	def start(self) -> None:
+		if self._task is not None:
+			return
+		self._loop_thread_id = threading.get_ident()
+		self._heartbeat = time.monotonic()
+		self._stopped.clear()
+		self._task = asyncio.create_task(self._measure())
+		self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+		self._watchdog.start()
+
+	async def stop(self) -> None:
+		self._stopped.set()
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+
+	async def _measure(self) -> None:
+		samples_since_export = 0
+		while True:
+			expected = time.monotonic() + self.interval
+			await asyncio.sleep(self.interval)
+			now = time.monotonic()
+			self._heartbeat = now
+			lag = max(0.0, now - expected)
+			LOOP_LAG.observe(lag)
+			self._samples.append(lag)
+			samples_since_export += 1
+			# Перцентили пересчитываются примерно раз в секунду, а не на каждом замере
+			if samples_since_export * self.interval >= 1.0:
+				samples_since_export = 0
+				self._export_quantiles()
+
+	def _export_quantiles(self) -> None:
+		ordered = sorted(self._samples)
+		for quantile in self.QUANTILES:
+			index = min(len(ordered) - 1, int(quantile * len(ordered)))
+			LOOP_LAG_QUANTILES.set(ordered[index], quantile=quantile)
+
+	def _watch(self) -> None:
+		"""Поток-сторож: работает, даже когда event loop заблокирован"""
+		reported_heartbeat = None
+		while not self._stopped.wait(self.threshold / 2):
+			heartbeat = self._heartbeat
+			stalled = time.monotonic() - heartbeat
+			if stalled < self.threshold or heartbeat == reported_heartbeat:
+				continue
+			# Одно зависание — один снимок стека
+			reported_heartbeat = heartbeat
+			LOOP_BLOCKS.inc()
+			frame = sys._current_frames().get(self._loop_thread_id)
+			stack = "".join(traceback.format_stack(frame)) if frame is not None else "стек недоступен\n"
+			self.logger.warning(f"Event loop заблокирован уже {stalled:.2f} с, текущий стек:\n{stack}")
@@ -1,13 +1,27 @@
 import asyncio
+import html
 import logging
-from typing import Optional
+import signal
+import time
+
+# Отсчет времени запуска: от начала импорта модуля до готовности принимать апдейты
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Awaitable, Callable
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ChatAction
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import BufferedInputFile, Message, CallbackQuery, Update, User
 from aiogram.filters import Command
 
-from config import TELEGRAM_BOT_TOKEN, ADMIN_USER_ID, UMA_WEBSITE
+from config import (
+	TELEGRAM_BOT_TOKEN, TELEGRAM_API_BASE, ADMIN_USER_ID, UMA_WEBSITE, ADMIN_STATS_CACHE_TTL, METRICS_HOST, METRICS_PORT,
+	USER_DAILY_TOKEN_QUOTA, PROFILER_DURATION, SHUTDOWN_TIMEOUT,
+)
 from database import Database
 from groq_client import GroqClient
 from keyboards import (
@@ -15,24 +29,126 @@ from keyboards import (
 	get_settings_keyboard, get_about_keyboard, get_broadcast_keyboard,
 )
 from broadcast_scheduler import BroadcastScheduler
+from delivery import ResponseDelivery
+from fsm_storage import StateStorage
+from loop_monitor import LoopMonitor
+from media_groups import MediaGroupAggregator
+import profiler
+import tracing
+from metrics import READY, STAGE_LATENCY, STARTUP_SECONDS, start_metrics_server, timed
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+STARTUP_SECONDS.set(time.perf_counter() - IMPORT_STARTED, phase="import")
+
+tracing.setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Тексты меню
+MAIN_MENU_TEXT = "🤖 Главное меню Uma Bot\n\nВыберите действие:"
+SETTINGS_TEXT = "⚙️ Настройки\n\nЗдесь вы можете управлять настройками бота."
+ABOUT_TEXT = (
+	"ℹ️ О проекте Uma Bot\n\n"
+	"Uma Bot — умный ИИ-ассистент.\n\n"
+	"• 💬 Диалоги\n• 🖼️ Анализ изображений\n• 🎤 Речь\n• 🔍 Поиск\n\n"
+	"🌐 Подробнее на сайте:"
+)
+ADMIN_PANEL_TEMPLATE = (
+	"🔧 Админ-панель Uma Bot\n\n"
+	"📊 Статистика:\n"
+	"• Пользователей: {total_users}\n"
+	"• Активных сегодня: {active_today}\n"
+	"• Сообщений: {total_messages}\n\n"
+	"Выберите действие:"
+)
+ADMIN_STATS_TEMPLATE = (
+	"📊 Подробная статистика\n\n"
+	"👥 Пользователи:\n"
+	"• Всего: {total_users}\n"
+	"• Активных сегодня: {active_today}\n"
+	"• Новых за неделю: {new_this_week}\n\n"
+	"💬 Сообщения:\n"
+	"• Всего: {total_messages}\n"
+	"• Текстовых: {text_messages}\n"
+	"• Изображений: {image_messages}\n"
+	"• Голосовых: {audio_messages}\n\n"
+	"📅 Активность:\n"
+	"• За сегодня: {messages_today}\n"
+	"• За неделю: {messages_this_week}\n\n"
+	"🪙 Токены за сегодня:\n"
+	"{usage}"
+)
+ADMIN_BROADCAST_TEXT = (
+	"📢 Управление рассылками\n\n"
+	"• Отправить рассылку всем пользователям\n"
+	"• Запланировать рассылку\n"
+	"• Просмотреть статистику рассылок\n\n"
+	"Выберите действие:"
+)
+ADMIN_MESSAGE_TEXT = (
+	"✏️ Введите текст рассылки:\n\n"
+	"Поддерживается Markdown форматирование:\n"
+	"**жирный**, *курсив*, [ссылка](url)"
+)
+ADMIN_SCHEDULER_TEXT = (
+	"🗓 Планировщик рассылок\n\n"
+	"Введите время в формате:\n"
+	"DD.MM.YYYY HH:MM\n\n"
+	"Например: 15.08.2025 14:30"
+)
+
+QUOTA_EXCEEDED_TEXT = (
+	"⏳ Дневной лимит запросов исчерпан. Возвращайтесь завтра или продолжайте на umaai.site — "
+	"там доступно больше моделей."
+)
+
 # Helpers
+def format_usage(usage: dict) -> str:
+	"""Расход токенов для админ-панели: по моделям и топ пользователей"""
+	if not usage["by_model"]:
+		return "• Нет запросов"
+	lines = [
+		f"• {model}: {entry['prompt_tokens'] + entry['completion_tokens']} "
+		f"(вход {entry['prompt_tokens']}, кэш {entry['cached_tokens']}, выход {entry['completion_tokens']}; "
+		f"запросов {entry['requests']})"
+		for model, entry in sorted(usage["by_model"].items())
+	]
+	lines.append("Топ пользователей:")
+	lines.extend(f"• {user_id}: {tokens}" for user_id, tokens in usage["top_users"])
+	return "\n".join(lines)
+
 def build_file_url(token: str, file_path: str) -> str:
-	return f"https://api.telegram.org/file/bot{token}/{file_path}"
+	return f"{TELEGRAM_API_BASE}/file/bot{token}/{file_path}"
+
+def create_bot() -> Bot:
+	session = None
+	if TELEGRAM_API_BASE != "https://api.telegram.org":
+		session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_BASE))
+	return Bot(token=TELEGRAM_BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode='HTML'))
 
 class UmaBot:
 	def __init__(self) -> None:
-		self.database = Database()
-		self.groq_client = GroqClient()
-		self.user_states: dict[int, str] = {}
+		init_started = time.perf_counter()
+		# База разбирается в фоне после старта (см. _warm_up), конструктор не читает файл
+		self.database = Database(lazy=True)
+		self.groq_client = GroqClient(usage_recorder=self.database.record_usage)
+		self.user_states = StateStorage()
 		self.user_locks: dict[int, asyncio.Lock] = {}  # Блокировки для каждого пользователя
-		self.bot = Bot(token=TELEGRAM_BOT_TOKEN, default=DefaultBotProperties(parse_mode='HTML'))
+		self.media_groups = MediaGroupAggregator(self._process_media_group)
+		self.bot = create_bot()
 		self.dp = Dispatcher()
 		self.scheduler = BroadcastScheduler(self.bot, self.database)
+		self.delivery = ResponseDelivery(self.bot)
+		self.loop_monitor = LoopMonitor()
+		self.metrics_server: asyncio.AbstractServer | None = None
+		self._inflight: set[asyncio.Task] = set()
+		self._stopping = False
+		self.ready = asyncio.Event()  # база загружена, апдейты обрабатываются
+		self._warm_up_task: asyncio.Task | None = None
+		self._startup_error: BaseException | None = None
+		self.callback_handlers: dict[str, tuple[Callable[[CallbackQuery, User], Awaitable[None]], bool]] = {}
+		# Тексты админ-панели: статистика считается проходом по всей базе, поэтому кэшируется на короткий срок
+		self._admin_text_cache: tuple[float, dict[str, str]] | None = None
 		self._register_handlers()
+		STARTUP_SECONDS.set(time.perf_counter() - init_started, phase="init")
 
 	def _get_user_lock(self, user_id: int) -> asyncio.Lock:
 		"""Получает или создает блокировку для пользователя"""
@@ -40,171 +156,232 @@ class UmaBot:
 			self.user_locks[user_id] = asyncio.Lock()
 		return self.user_locks[user_id]
 
+	def _admin_text(self, kind: str) -> str:
+		"""Текст админ-панели ("panel" или "stats") из кэша не старше ADMIN_STATS_CACHE_TTL секунд"""
+		now = time.monotonic()
+		if self._admin_text_cache is None or self._admin_text_cache[0] <= now:
+			stats = self.database.get_statistics()
+			stats["usage"] = html.escape(format_usage(self.database.get_usage_statistics()), quote=False)
+			texts = {
+				"panel": ADMIN_PANEL_TEMPLATE.format(**stats),
+				"stats": ADMIN_STATS_TEMPLATE.format(**stats),
+			}
+			self._admin_text_cache = (now + ADMIN_STATS_CACHE_TTL, texts)
+		return self._admin_text_cache[1][kind]
+
 	async def _safe_edit_text(self, message, text: str, reply_markup=None):
 		"""Безопасное редактирование текста с обработкой ошибок"""
-		try:
-			await message.edit_text(text, reply_markup=reply_markup)
-		except Exception as e:
-			logger.warning(f"Не удалось отредактировать сообщение: {e}")
-			# Если содержимое не изменилось, удаляем старое сообщение и отправляем новое
-			if "message is not modified" in str(e):
-				try:
-					await message.delete()
-					await message.answer(text, reply_markup=reply_markup)
-				except Exception as e2:
-					logger.error(f"Не удалось удалить/отправить сообщение: {e2}")
-			else:
-				# Для других ошибок просто отправляем новое сообщение
-				try:
-					await message.answer(text, reply_markup=reply_markup)
-				except Exception as e2:
-					logger.error(f"Не удалось отправить новое сообщение: {e2}")
-
-	async def _split_long_message(self, text: str, max_length: int = 4096) -> list[str]:
-		"""Разделяет длинное сообщение на части"""
-		if len(text) <= max_length:
-			return [text]
-		
-		messages = []
-		current_pos = 0
-		
-		while current_pos < len(text):
-			# Находим место для разрыва (предпочтительно по переносу строки или пробелу)
-			end_pos = current_pos + max_length
-			
-			if end_pos >= len(text):
-				messages.append(text[current_pos:])
-				break
-			
-			# Ищем последний перенос строки или пробел в пределах лимита
-			last_newline = text.rfind('\n', current_pos, end_pos)
-			last_space = text.rfind(' ', current_pos, end_pos)
-			
-			if last_newline > current_pos:
-				split_pos = last_newline + 1
-			elif last_space > current_pos:
-				split_pos = last_space + 1
-			else:
-				split_pos = end_pos
-			
-			messages.append(text[current_pos:split_pos].rstrip())
-			current_pos = split_pos
-		
-		return messages
+		await self.delivery.safe_edit_text(message, text, reply_markup)
+
+	@asynccontextmanager
+	async def _user_turn(self, user_id: int, message_type: str):
+		"""Блокировка пользователя: его ходы обрабатываются по очереди, и каждый видит сохраненный предыдущий"""
+		queued_at = time.perf_counter()
+		queued_at_ns = time.time_ns()
+		async with self._get_user_lock(user_id):
+			STAGE_LATENCY.observe(time.perf_counter() - queued_at, stage="lock_wait", type=message_type)
+			tracing.record_span("lock_wait", queued_at_ns, time.time_ns(), type=message_type)
+			# Предыдущий ход мог быть еще не сохранен: ответ отправляется раньше записи в историю
+			with timed("persist_wait", type=message_type):
+				await self.delivery.wait_persisted(user_id)
+			yield
+
+	def _persist_turn(self, user_id: int, entry: dict) -> Callable[[str], None]:
+		"""Сохранение хода после доставки ответа; отказ по квоте ходом не считается и в историю не попадает"""
+		def persist(response: str) -> None:
+			if response is not QUOTA_EXCEEDED_TEXT:
+				self.database.add_message_to_conversation(user_id, entry, response)
+		return persist
 
 	async def _process_user_message(self, user_id: int, message_type: str, **kwargs) -> str:
 		"""Обрабатывает сообщение пользователя с блокировкой"""
-		async with self._get_user_lock(user_id):
-			history = self.database.get_conversation_history(user_id)
-			
-			if message_type == "text":
-				text = kwargs.get("text", "")
-				use_search = self.groq_client.should_use_browser_search(text)
-				return await self.groq_client.process_text_message(
-					text=text, 
-					conversation_history=history, 
-					use_browser_search=use_search
-				)
-			elif message_type == "image":
-				image_url = kwargs.get("image_url", "")
-				text = kwargs.get("text", "")
-				return await self.groq_client.process_image_message(
-					image_url=image_url, 
-					text=text, 
-					conversation_history=history
-				)
-			elif message_type == "images":
-				image_urls = kwargs.get("image_urls", [])
-				text = kwargs.get("text", "")
-				return await self.groq_client.process_multiple_images_message(
-					image_urls=image_urls, 
-					text=text, 
-					conversation_history=history
-				)
-			elif message_type == "audio":
-				audio_url = kwargs.get("audio_url", "")
-				return await self.groq_client.process_audio_message(
-					audio_url=audio_url, 
-					conversation_history=history
-				)
+		async with self._user_turn(user_id, message_type):
+			with timed("db_read", type=message_type):
+				history = self.database.get_conversation_history(user_id)
+			return await self._answer(user_id, message_type, history, **kwargs)
+
+	async def _answer(self, user_id: int, message_type: str, history: list, regenerate: bool = False, **kwargs) -> str:
+		"""Ответ модели на сообщение; вызывается под блокировкой пользователя"""
+		# Квота проверяется до запроса к модели; админ не ограничен
+		if USER_DAILY_TOKEN_QUOTA and user_id != ADMIN_USER_ID:
+			if self.database.get_user_tokens_today(user_id) >= USER_DAILY_TOKEN_QUOTA:
+				logger.info(f"Пользователь {user_id} исчерпал дневную квоту токенов")
+				return QUOTA_EXCEEDED_TEXT
+		
+		if message_type == "text":
+			text = kwargs.get("text", "")
+			use_search = self.groq_client.should_use_browser_search(text)
+			return await self.groq_client.answer_text(
+				text=text, 
+				conversation_history=history, 
+				use_browser_search=use_search,
+				user_id=user_id
+			)
+		elif message_type == "image":
+			image_url = kwargs.get("image_url", "")
+			text = kwargs.get("text", "")
+			return await self.groq_client.process_image_message(
+				image_url=image_url, 
+				text=text, 
+				conversation_history=history,
+				file_unique_id=kwargs.get("file_unique_id"),
+				use_cache=not regenerate,
+				user_id=user_id
+			)
+		elif message_type == "images":
+			image_urls = kwargs.get("image_urls", [])
+			text = kwargs.get("text", "")
+			return await self.groq_client.process_multiple_images_message(
+				image_urls=image_urls, 
+				text=text, 
+				conversation_history=history,
+				file_unique_ids=kwargs.get("file_unique_ids"),
+				use_cache=not regenerate,
+				user_id=user_id
+			)
+		elif message_type == "audio":
+			audio_url = kwargs.get("audio_url", "")
+			return await self.groq_client.process_audio_message(
+				audio_url=audio_url, 
+				conversation_history=history,
+				file_unique_id=kwargs.get("file_unique_id"),
+				file_size=kwargs.get("file_size"),
+				duration=kwargs.get("duration"),
+				user_id=user_id
+			)
+		else:
+			return "Неизвестный тип сообщения"
+
+	async def _regenerate_last_turn(self, user_id: int, turn: dict) -> str:
+		"""Повторно обрабатывает последний ход; медиа берется из кэша по file_unique_id.
+		Ход читается под блокировкой пользователя, его номер записывается в turn["seq"] — ответ заменяется именно в нем,
+		даже если пользователь успел отправить новое сообщение"""
+		async with self._user_turn(user_id, "regenerate"):
+			with timed("db_read", type="regenerate"):
+				last = self.database.get_last_turn(user_id)
+				if last is None:
+					return "Нет сообщений для перегенерации"
+				seq, entry = last
+				# Перегенерируемый ход в контекст не попадает
+				history = self.database.get_conversation_history(user_id, before=seq)
+			last_message = entry["message"]
+			msg_type = last_message.get("type")
+			if msg_type == "text":
+				kwargs = {"text": last_message["text"]}
+			elif msg_type == "image":
+				kwargs = {
+					"image_url": last_message.get("image_url", ""),
+					"file_unique_id": last_message.get("file_unique_id"),
+					"text": last_message.get("caption", ""),
+				}
+			elif msg_type == "images":
+				kwargs = {
+					"image_urls": last_message.get("image_urls", []),
+					"file_unique_ids": last_message.get("file_unique_ids"),
+					"text": last_message.get("caption", ""),
+				}
+			elif msg_type == "audio":
+				kwargs = {"audio_url": last_message.get("audio_url", ""), "file_unique_id": last_message.get("file_unique_id")}
 			else:
-				return "Неизвестный тип сообщения"
+				return "Перегенерация недоступна для этого сообщения"
+			turn["seq"] = seq
+			return await self._answer(user_id, msg_type, history, regenerate=True, **kwargs)
 
 	async def _handle_media_group_item(self, message: Message, user):
-		"""Обрабатывает элемент медиа-группы (альбома)"""
-		media_group_id = message.media_group_id
-		
-		# Инициализируем группу, если её ещё нет
-		if media_group_id not in self.media_groups:
-			self.media_groups[media_group_id] = {
-				'messages': [],
-				'user_id': user.id,
-				'chat_id': message.chat.id,
-				'typing_message': None
-			}
-			# Отправляем "печатает" сообщение только для первого изображения в группе
-			typing_message = await message.answer("Анализирую изображения...")
-			self.media_groups[media_group_id]['typing_message'] = typing_message
-		
-		# Добавляем сообщение в группу
-		self.media_groups[media_group_id]['messages'].append(message)
-		
-		# Ждём 1 секунду, чтобы собрать все изображения из альбома
-		await asyncio.sleep(1)
-		
-		# Проверяем, что мы всё ещё обрабатываем эту группу
-		if media_group_id in self.media_groups:
-			group_data = self.media_groups[media_group_id]
-			messages = group_data['messages']
-			typing_message = group_data['typing_message']
-			
-			# Собираем все URL изображений
-			image_urls = []
-			captions = []
-			
-			for msg in messages:
-				if msg.photo:
-					file_id = msg.photo[-1].file_id
-					file = await self.bot.get_file(file_id)
-					image_url = build_file_url(TELEGRAM_BOT_TOKEN, file.file_path)
-					image_urls.append(image_url)
-					if msg.caption:
-						captions.append(msg.caption)
-			
-			# Объединяем все подписи
-			combined_caption = " ".join(captions) if captions else ""
-			
+		"""Добавляет элемент медиа-группы (альбома) в агрегатор"""
+		def _start_group():
+			# Плейсхолдер отправляется один раз на альбом, не задерживая сбор элементов.
+			# message.answer возвращает объект метода Bot API, а не корутину, поэтому ensure_future
+			return asyncio.ensure_future(message.answer("Анализирую изображения..."))
+
+		self.media_groups.add(message.media_group_id, message, on_create=_start_group)
+
+	async def _process_media_group(self, media_group_id: str, messages: list[Message], placeholder_task: asyncio.Task):
+		"""Обрабатывает собранный альбом одним запросом к модели"""
+		first = messages[0]
+		user = first.from_user
+		photos = [msg.photo[-1] for msg in messages if msg.photo]
+		# Объединяем все подписи
+		combined_caption = " ".join(msg.caption for msg in messages if msg.caption)
+		entry = {
+			"file_unique_ids": [photo.file_unique_id for photo in photos],
+			"caption": combined_caption, "type": "images", "timestamp": first.date.isoformat(),
+		}
+
+		async def _generate() -> str:
+			# Собираем все URL изображений одновременно и сразу начинаем загрузку
+			with timed("telegram_get_file", type="images"):
+				files = await asyncio.gather(*(self.bot.get_file(photo.file_id) for photo in photos))
+			entry["image_urls"] = [build_file_url(TELEGRAM_BOT_TOKEN, file.file_path) for file in files]
+			for image_url, file_unique_id in zip(entry["image_urls"], entry["file_unique_ids"]):
+				self.groq_client.prefetch(image_url, file_unique_id)
 			# Обрабатываем все изображения как одно сообщение
-			response = await self._process_user_message(
+			return await self._process_user_message(
 				user.id,
 				"images",
-				image_urls=image_urls,
+				image_urls=entry["image_urls"],
+				file_unique_ids=entry["file_unique_ids"],
 				text=combined_caption
 			)
-			
-			# Сохраняем в историю
-			self.database.add_message_to_conversation(
+
+		await self.delivery.respond(
+			user.id, first.chat.id, ChatAction.UPLOAD_PHOTO,
+			placeholder=placeholder_task,
+			generate=_generate,
+			persist=self._persist_turn(user.id, entry),
+			message_type="images",
+		)
+
+	async def _handle_audio(self, message: Message, media, placeholder_text: str):
+		"""Общая обработка голосовых сообщений и аудиофайлов"""
+		user = message.from_user
+		entry = {"file_unique_id": media.file_unique_id, "type": "audio", "timestamp": message.date.isoformat()}
+
+		async def _generate() -> str:
+			with timed("telegram_get_file", type="audio"):
+				file = await self.bot.get_file(media.file_id)
+			entry["audio_url"] = build_file_url(TELEGRAM_BOT_TOKEN, file.file_path)
+			# Обрабатываем с блокировкой пользователя
+			return await self._process_user_message(
 				user.id,
-				{"image_urls": image_urls, "caption": combined_caption, "type": "images", "timestamp": message.date.isoformat()},
-				response
+				"audio",
+				audio_url=entry["audio_url"],
+				file_unique_id=media.file_unique_id,
+				file_size=media.file_size,
+				duration=media.duration
 			)
-			
-			# Разделяем длинный ответ на части
-			message_parts = await self._split_long_message(response)
-			
-			# Заменяем "печатает" сообщение первой частью ответа
-			await self._safe_edit_text(typing_message, message_parts[0], get_chat_keyboard() if len(message_parts) == 1 else None)
-			
-			# Отправляем остальные части, если есть
-			for i, part in enumerate(message_parts[1:], 1):
-				is_last = i == len(message_parts) - 1
-				await message.answer(part, reply_markup=get_chat_keyboard() if is_last else None)
-			
-			# Удаляем группу из памяти
-			if media_group_id in self.media_groups:
-				del self.media_groups[media_group_id]
+
+		await self.delivery.respond(
+			user.id, message.chat.id, ChatAction.RECORD_VOICE,
+			placeholder=message.answer(placeholder_text),
+			generate=_generate,
+			persist=self._persist_turn(user.id, entry),
+			message_type="audio",
+		)
+
+	async def _track_update(self, handler, event: Update, data: dict):
+		"""Запоминает задачу обработки апдейта, чтобы при остановке дождаться ее завершения.
+		Апдейты, пришедшие до окончания прогрева, ждут готовности"""
+		task = asyncio.current_task()
+		self._inflight.add(task)
+		try:
+			if not self.ready.is_set():
+				await self.ready.wait()
+			return await handler(event, data)
+		finally:
+			self._inflight.discard(task)
+
+	@staticmethod
+	async def _trace_update(handler, event: Update, data: dict):
+		"""Корневой span на каждый апдейт: все этапы обработки становятся его потомками"""
+		user = data.get("event_from_user")
+		with tracing.span("update", update_id=event.update_id, event=event.event_type, user_id=user.id if user else None):
+			return await handler(event, data)
 
 	def _register_handlers(self) -> None:
+		self.dp.update.outer_middleware(self._track_update)
+		self.dp.update.outer_middleware(self._trace_update)
+
 		@self.dp.message(Command("start"))
 		async def start_cmd(message: Message):
 			user = message.from_user
@@ -223,22 +400,10 @@ class UmaBot:
 		async def admin_cmd(message: Message):
 			user = message.from_user
 			if user and user.id == ADMIN_USER_ID:
-				stats = self.database.get_statistics()
-				admin_text = (
-					f"🔧 Админ-панель Uma Bot\n\n"
-					f"📊 Статистика:\n"
-					f"• Пользователей: {stats['total_users']}\n"
-					f"• Активных сегодня: {stats['active_today']}\n"
-					f"• Сообщений: {stats['total_messages']}\n\n"
-					f"Выберите действие:"
-				)
-				await message.answer(admin_text, reply_markup=get_admin_keyboard())
+				await message.answer(self._admin_text("panel"), reply_markup=get_admin_keyboard())
 			else:
 				await message.answer("⛔ У вас нет доступа к админ-панели.")
 
-		# Словарь для хранения медиа-групп
-		self.media_groups = {}
-		
 		@self.dp.message(F.photo)
 		async def handle_photo(message: Message):
 			user = message.from_user
@@ -251,41 +416,32 @@ class UmaBot:
 				await self._handle_media_group_item(message, user)
 				return
 			
-			# Отправляем "печатает" сообщение
-			typing_message = await message.answer("Анализирую изображение...")
-			
-			await self.bot.send_chat_action(message.chat.id, ChatAction.UPLOAD_PHOTO)
-			
-			file_id = message.photo[-1].file_id
-			file = await self.bot.get_file(file_id)
-			image_url = build_file_url(TELEGRAM_BOT_TOKEN, file.file_path)
+			photo = message.photo[-1]
 			caption = message.caption or ""
+			entry = {"file_unique_id": photo.file_unique_id, "caption": caption, "type": "image", "timestamp": message.date.isoformat()}
+			
+			async def _generate() -> str:
+				with timed("telegram_get_file", type="image"):
+					file = await self.bot.get_file(photo.file_id)
+				entry["image_url"] = build_file_url(TELEGRAM_BOT_TOKEN, file.file_path)
+				# Загрузка идет, пока запрос ждет своей очереди под блокировкой пользователя
+				self.groq_client.prefetch(entry["image_url"], photo.file_unique_id)
+				# Обрабатываем с блокировкой пользователя
+				return await self._process_user_message(
+					user.id, 
+					"image", 
+					image_url=entry["image_url"], 
+					file_unique_id=photo.file_unique_id,
+					text=caption
+				)
 			
-			# Обрабатываем с блокировкой пользователя
-			response = await self._process_user_message(
-				user.id, 
-				"image", 
-				image_url=image_url, 
-				text=caption
-			)
-			
-			# Сохраняем в историю
-			self.database.add_message_to_conversation(
-				user.id, 
-				{"image_url": image_url, "caption": caption, "type": "image", "timestamp": message.date.isoformat()}, 
-				response
+			await self.delivery.respond(
+				user.id, message.chat.id, ChatAction.UPLOAD_PHOTO,
+				placeholder=message.answer("Анализирую изображение..."),
+				generate=_generate,
+				persist=self._persist_turn(user.id, entry),
+				message_type="image",
 			)
-			
-			# Разделяем длинный ответ на части
-			message_parts = await self._split_long_message(response)
-			
-			# Заменяем "печатает" сообщение первой частью ответа
-			await self._safe_edit_text(typing_message, message_parts[0], get_chat_keyboard() if len(message_parts) == 1 else None)
-			
-			# Отправляем остальные части, если есть
-			for i, part in enumerate(message_parts[1:], 1):
-				is_last = i == len(message_parts) - 1
-				await message.answer(part, reply_markup=get_chat_keyboard() if is_last else None)
 
 		@self.dp.message(F.voice)
 		async def handle_voice(message: Message):
@@ -293,39 +449,7 @@ class UmaBot:
 			if not user:
 				return
 			
-			# Отправляем "печатает" сообщение
-			typing_message = await message.answer("Обрабатываю голосовое сообщение...")
-			
-			await self.bot.send_chat_action(message.chat.id, ChatAction.RECORD_VOICE)
-			
-			file_id = message.voice.file_id
-			file = await self.bot.get_file(file_id)
-			audio_url = build_file_url(TELEGRAM_BOT_TOKEN, file.file_path)
-			
-			# Обрабатываем с блокировкой пользователя
-			response = await self._process_user_message(
-				user.id, 
-				"audio", 
-				audio_url=audio_url
-			)
-			
-			# Сохраняем в историю
-			self.database.add_message_to_conversation(
-				user.id, 
-				{"audio_url": audio_url, "type": "audio", "timestamp": message.date.isoformat()}, 
-				response
-			)
-			
-			# Разделяем длинный ответ на части
-			message_parts = await self._split_long_message(response)
-			
-			# Заменяем "печатает" сообщение первой частью ответа
-			await self._safe_edit_text(typing_message, message_parts[0], get_chat_keyboard() if len(message_parts) == 1 else None)
-			
-			# Отправляем остальные части, если есть
-			for i, part in enumerate(message_parts[1:], 1):
-				is_last = i == len(message_parts) - 1
-				await message.answer(part, reply_markup=get_chat_keyboard() if is_last else None)
+			await self._handle_audio(message, message.voice, "Обрабатываю голосовое сообщение...")
 
 		@self.dp.message(F.audio)
 		async def handle_audio_file(message: Message):
@@ -333,39 +457,7 @@ class UmaBot:
 			if not user:
 				return
 			
-			# Отправляем "печатает" сообщение
-			typing_message = await message.answer("Обрабатываю аудиофайл...")
-			
-			await self.bot.send_chat_action(message.chat.id, ChatAction.RECORD_VOICE)
-			
-			file_id = message.audio.file_id
-			file = await self.bot.get_file(file_id)
-			audio_url = build_file_url(TELEGRAM_BOT_TOKEN, file.file_path)
-			
-			# Обрабатываем с блокировкой пользователя
-			response = await self._process_user_message(
-				user.id, 
-				"audio", 
-				audio_url=audio_url
-			)
-			
-			# Сохраняем в историю
-			self.database.add_message_to_conversation(
-				user.id, 
-				{"audio_url": audio_url, "type": "audio", "timestamp": message.date.isoformat()}, 
-				response
-			)
-			
-			# Разделяем длинный ответ на части
-			message_parts = await self._split_long_message(response)
-			
-			# Заменяем "печатает" сообщение первой частью ответа
-			await self._safe_edit_text(typing_message, message_parts[0], get_chat_keyboard() if len(message_parts) == 1 else None)
-			
-			# Отправляем остальные части, если есть
-			for i, part in enumerate(message_parts[1:], 1):
-				is_last = i == len(message_parts) - 1
-				await message.answer(part, reply_markup=get_chat_keyboard() if is_last else None)
+			await self._handle_audio(message, message.audio, "Обрабатываю аудиофайл...")
 
 		@self.dp.message(F.document)
 		async def handle_document(message: Message):
@@ -394,13 +486,13 @@ class UmaBot:
 			
 			text = message.text or ""
 			
-			# Проверяем состояние пользователя
-			if user.id in self.user_states:
-				state = self.user_states[user.id]
+			# Проверяем состояние пользователя; состояния бывают только у админа, остальные сразу идут дальше
+			state = await self.user_states.get_state(user.id) if user.id == ADMIN_USER_ID else None
+			if state:
 				if state == "waiting_broadcast_message":
-					# Обработка сообщения для рассылки
+					# Сбрасываем до отправки, чтобы повтор сообщения не ушел второй рассылкой
+					await self.user_states.clear_state(user.id)
 					result = await self.scheduler.send_manual_broadcast(text)
-					del self.user_states[user.id]
 					await message.answer(f"✅ {result}", reply_markup=get_admin_keyboard())
 					return
 				elif state == "waiting_schedule_time":
@@ -409,7 +501,7 @@ class UmaBot:
 						from datetime import datetime
 						scheduled_time = datetime.strptime(text, "%d.%m.%Y %H:%M")
 						# Здесь можно добавить логику сохранения запланированной рассылки
-						del self.user_states[user.id]
+						await self.user_states.clear_state(user.id)
 						await message.answer(
 							f"✅ Рассылка запланирована на {scheduled_time.strftime('%d.%m.%Y %H:%M')}", 
 							reply_markup=get_admin_keyboard()
@@ -422,35 +514,136 @@ class UmaBot:
 						)
 					return
 			
-			# Отправляем "печатает" сообщение
-			typing_message = await message.answer("Уже пишу...")
-			
 			# Обычная обработка текста с блокировкой пользователя
-			await self.bot.send_chat_action(message.chat.id, ChatAction.TYPING)
-			
-			response = await self._process_user_message(
-				user.id, 
-				"text", 
-				text=text
+			await self.delivery.respond(
+				user.id, message.chat.id, ChatAction.TYPING,
+				placeholder=message.answer("Уже пишу..."),
+				generate=lambda: self._process_user_message(user.id, "text", text=text),
+				persist=self._persist_turn(user.id, {"text": text, "type": "text", "timestamp": message.date.isoformat()}),
+				message_type="text",
 			)
-			
-			# Сохраняем в историю
-			self.database.add_message_to_conversation(
-				user.id, 
-				{"text": text, "type": "text", "timestamp": message.date.isoformat()}, 
-				response
+
+		# Таблица callback-кнопок: data -> (обработчик, только для админа); поиск за O(1) вместо цепочки if/elif
+		def on_callback(data: str, admin_only: bool = False):
+			def decorator(handler: Callable[[CallbackQuery, User], Awaitable[None]]):
+				self.callback_handlers[data] = (handler, admin_only)
+				return handler
+			return decorator
+
+		@on_callback("new_dialog")
+		async def cb_new_dialog(query: CallbackQuery, user: User):
+			self.database.clear_conversation(user.id)
+			await self._safe_edit_text(query.message, "💬 Новый диалог начат! Отправьте сообщение.", get_chat_keyboard())
+
+		@on_callback("settings")
+		async def cb_settings(query: CallbackQuery, user: User):
+			await self._safe_edit_text(query.message, SETTINGS_TEXT, get_settings_keyboard())
+
+		@on_callback("about")
+		async def cb_about(query: CallbackQuery, user: User):
+			await self._safe_edit_text(query.message, ABOUT_TEXT, get_about_keyboard())
+
+		@on_callback("main_menu")
+		async def cb_main_menu(query: CallbackQuery, user: User):
+			await self._safe_edit_text(query.message, MAIN_MENU_TEXT, get_main_keyboard())
+
+		@on_callback("clear_history")
+		async def cb_clear_history(query: CallbackQuery, user: User):
+			self.database.clear_conversation(user.id)
+			await self._safe_edit_text(query.message, "🗑 История диалога очищена!", get_main_keyboard())
+
+		@on_callback("regenerate")
+		async def cb_regenerate(query: CallbackQuery, user: User):
+			# Быстрый ответ без блокировки; сам ход перечитывается под ней в _regenerate_last_turn
+			last = self.database.get_last_turn(user.id)
+			if last is None:
+				await query.message.answer("Нет сообщений для перегенерации")
+				return
+			if last[1]["message"].get("type") not in ("text", "image", "images", "audio"):
+				await query.message.answer("Перегенерация недоступна для этого сообщения")
+				return
+			turn: dict = {}
+
+			def persist(response: str) -> None:
+				if "seq" in turn and response is not QUOTA_EXCEEDED_TEXT:
+					self.database.replace_response(user.id, turn["seq"], response)
+
+			await self.delivery.respond(
+				user.id, query.message.chat.id, ChatAction.TYPING,
+				placeholder=query.message,
+				generate=lambda: self._regenerate_last_turn(user.id, turn),
+				persist=persist,
+				message_type="regenerate",
 			)
-			
-			# Разделяем длинный ответ на части
-			message_parts = await self._split_long_message(response)
-			
-			# Заменяем "печатает" сообщение первой частью ответа
-			await self._safe_edit_text(typing_message, message_parts[0], get_chat_keyboard() if len(message_parts) == 1 else None)
-			
-			# Отправляем остальные части, если есть
-			for i, part in enumerate(message_parts[1:], 1):
-				is_last = i == len(message_parts) - 1
-				await message.answer(part, reply_markup=get_chat_keyboard() if is_last else None)
+
+		@on_callback("history")
+		async def cb_history(query: CallbackQuery, user: User):
+			h = self.database.get_conversation_history(user.id, limit=5)
+			if not h:
+				await query.message.answer("История пуста")
+				return
+			text = "📜 Последние сообщения:\n\n"
+			for i, entry in enumerate(h[-5:], 1):
+				msg = entry["message"]
+				if msg.get("type") == "text":
+					val = msg["text"]
+					text += f"{i}. {html.escape(val[:50], quote=False)}{'...' if len(val)>50 else ''}\n"
+				elif msg.get("type") == "image":
+					text += f"{i}. [Изображение]\n"
+				elif msg.get("type") == "audio":
+					text += f"{i}. [Голосовое сообщение]\n"
+			await self._safe_edit_text(query.message, text, get_chat_keyboard())
+
+		@on_callback("share")
+		async def cb_share(query: CallbackQuery, user: User):
+			await query.message.answer("Функция будет добавлена позже")
+
+		# АДМИН ПАНЕЛЬ
+		@on_callback("admin_panel", admin_only=True)
+		async def cb_admin_panel(query: CallbackQuery, user: User):
+			await self._safe_edit_text(query.message, self._admin_text("panel"), get_admin_keyboard())
+
+		@on_callback("admin_broadcast", admin_only=True)
+		async def cb_admin_broadcast(query: CallbackQuery, user: User):
+			await self._safe_edit_text(query.message, ADMIN_BROADCAST_TEXT, get_admin_keyboard())
+
+		@on_callback("admin_message", admin_only=True)
+		async def cb_admin_message(query: CallbackQuery, user: User):
+			await self.user_states.set_state(user.id, "waiting_broadcast_message")
+			await self._safe_edit_text(query.message, ADMIN_MESSAGE_TEXT, get_admin_keyboard())
+
+		@on_callback("admin_scheduler", admin_only=True)
+		async def cb_admin_scheduler(query: CallbackQuery, user: User):
+			await self.user_states.set_state(user.id, "waiting_schedule_time")
+			await self._safe_edit_text(query.message, ADMIN_SCHEDULER_TEXT, get_admin_keyboard())
+
+		@on_callback("admin_send_broadcast", admin_only=True)
+		async def cb_admin_send_broadcast(query: CallbackQuery, user: User):
+			result = await self.scheduler.send_manual_broadcast("🚀 Тестовая рассылка от админа!")
+			await self._safe_edit_text(query.message, f"✅ {result}", get_admin_keyboard())
+
+		@on_callback("admin_stats", admin_only=True)
+		async def cb_admin_stats(query: CallbackQuery, user: User):
+			await self._safe_edit_text(query.message, self._admin_text("stats"), get_admin_keyboard())
+
+		@on_callback("admin_profile", admin_only=True)
+		async def cb_admin_profile(query: CallbackQuery, user: User):
+			if profiler.profile_running():
+				await query.message.answer("🔬 Профилирование уже идет, дождитесь результата")
+				return
+			await query.message.answer(f"🔬 Снимаю профиль работающего бота, {PROFILER_DURATION} с...")
+			data, samples = await profiler.profile()
+			filename = f"umabot-profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed.txt"
+			await query.message.answer_document(
+				BufferedInputFile(data, filename=filename),
+				caption=f"🔬 {samples} снимков стеков. Формат collapsed stacks: flamegraph.pl или speedscope.app",
+				reply_markup=get_admin_keyboard(),
+			)
+
+		@on_callback("admin_back", admin_only=True)
+		async def cb_admin_back(query: CallbackQuery, user: User):
+			await self.user_states.clear_state(user.id)
+			await self._safe_edit_text(query.message, "🔧 Админ-панель\n\nВыберите действие:", get_admin_keyboard())
 
 		@self.dp.callback_query()
 		async def callbacks(query: CallbackQuery):
@@ -464,114 +657,13 @@ class UmaBot:
 				# Сначала отвечаем на callback, чтобы избежать timeout
 				await query.answer()
 				
-				if data == "new_dialog":
-					self.database.clear_conversation(user.id)
-					await self._safe_edit_text(query.message, "💬 Новый диалог начат! Отправьте сообщение.", get_chat_keyboard())
-				elif data == "settings":
-					await self._safe_edit_text(query.message, "⚙️ Настройки\n\nЗдесь вы можете управлять настройками бота.", get_settings_keyboard())
-				elif data == "about":
-					about_text = (
-						"ℹ️ О проекте Uma Bot\n\n"
-						"Uma Bot — умный ИИ-ассистент.\n\n"
-						"• 💬 Диалоги\n• 🖼️ Анализ изображений\n• 🎤 Речь\n• 🔍 Поиск\n\n"
-						"🌐 Подробнее на сайте:"
-					)
-					await self._safe_edit_text(query.message, about_text, get_about_keyboard())
-				elif data == "main_menu":
-					await self._safe_edit_text(query.message, "🤖 Главное меню Uma Bot\n\nВыберите действие:", get_main_keyboard())
-				elif data == "clear_history":
-					self.database.clear_conversation(user.id)
-					await self._safe_edit_text(query.message, "🗑 История диалога очищена!", get_main_keyboard())
-				elif data == "regenerate":
-					history = self.database.get_conversation_history(user.id, limit=1)
-					if history:
-						last_message = history[-1]["message"]
-						if last_message.get("type") == "text":
-							resp = await self._process_user_message(
-								user.id, 
-								"text", 
-								text=last_message["text"]
-							)
-							self.database.add_message_to_conversation(user.id, last_message, resp)
-							await self._safe_edit_text(query.message, resp, get_chat_keyboard())
-						else:
-							await query.message.answer("Перегенерация доступна только для текста")
-					else:
-						await query.message.answer("Нет сообщений для перегенерации")
-				elif data == "history":
-					h = self.database.get_conversation_history(user.id, limit=5)
-					if h:
-						text = "📜 Последние сообщения:\n\n"
-						for i, entry in enumerate(h[-5:], 1):
-							msg = entry["message"]
-							if msg.get("type") == "text":
-								val = msg["text"]
-								text += f"{i}. {val[:50]}{'...' if len(val)>50 else ''}\n"
-							elif msg.get("type") == "image":
-								text += f"{i}. [Изображение]\n"
-							elif msg.get("type") == "audio":
-								text += f"{i}. [Голосовое сообщение]\n"
-						await self._safe_edit_text(query.message, text, get_chat_keyboard())
-					else:
-						await query.message.answer("История пуста")
-				elif data == "share":
-					await query.message.answer("Функция будет добавлена позже")
-				
-				# АДМИН ПАНЕЛЬ
-				elif data == "admin_panel" and user.id == ADMIN_USER_ID:
-					stats = self.database.get_statistics()
-					admin_text = (
-						f"🔧 Админ-панель Uma Bot\n\n"
-						f"📊 Статистика:\n"
-						f"• Пользователей: {stats['total_users']}\n"
-						f"• Активных сегодня: {stats['active_today']}\n"
-						f"• Сообщений: {stats['total_messages']}\n\n"
-						f"Выберите действие:"
-					)
-					await self._safe_edit_text(query.message, admin_text, get_admin_keyboard())
-				elif data == "admin_broadcast" and user.id == ADMIN_USER_ID:
-					await self._safe_edit_text(query.message, 
-						"📢 Управление рассылками\n\n"
-						"• Отправить рассылку всем пользователям\n"
-						"• Запланировать рассылку\n"
-						"• Просмотреть статистику рассылок\n\n"
-						"Выберите действие:", get_admin_keyboard())
-				elif data == "admin_message" and user.id == ADMIN_USER_ID:
-					self.user_states[user.id] = "waiting_broadcast_message"
-					await self._safe_edit_text(query.message,
-						"✏️ Введите текст рассылки:\n\n"
-						"Поддерживается Markdown форматирование:\n"
-						"**жирный**, *курсив*, [ссылка](url)", get_admin_keyboard())
-				elif data == "admin_scheduler" and user.id == ADMIN_USER_ID:
-					self.user_states[user.id] = "waiting_schedule_time"
-					await self._safe_edit_text(query.message,
-						"🗓 Планировщик рассылок\n\n"
-						"Введите время в формате:\n"
-						"DD.MM.YYYY HH:MM\n\n"
-						"Например: 15.08.2025 14:30", get_admin_keyboard())
-				elif data == "admin_send_broadcast" and user.id == ADMIN_USER_ID:
-					result = await self.scheduler.send_manual_broadcast("🚀 Тестовая рассылка от админа!")
-					await self._safe_edit_text(query.message, f"✅ {result}", get_admin_keyboard())
-				elif data == "admin_stats" and user.id == ADMIN_USER_ID:
-					stats = self.database.get_statistics()
-					stats_text = (
-						f"📊 Подробная статистика\n\n"
-						f"👥 Пользователи:\n"
-						f"• Всего: {stats['total_users']}\n"
-						f"• Активных сегодня: {stats['active_today']}\n"
-						f"• Новых за неделю: {stats['new_this_week']}\n\n"
-						f"💬 Сообщения:\n"
-						f"• Всего: {stats['total_messages']}\n"
-						f"• Текстовых: {stats['text_messages']}\n"
-						f"• Изображений: {stats['image_messages']}\n"
-						f"• Голосовых: {stats['audio_messages']}\n\n"
-						f"📅 Активность:\n"
-						f"• За сегодня: {stats['messages_today']}\n"
-						f"• За неделю: {stats['messages_this_week']}"
-					)
-					await self._safe_edit_text(query.message, stats_text, get_admin_keyboard())
-				elif data == "admin_back" and user.id == ADMIN_USER_ID:
-					await self._safe_edit_text(query.message, "🔧 Админ-панель\n\nВыберите действие:", get_admin_keyboard())
+				handler = self.callback_handlers.get(data)
+				if handler is None:
+					return
+				callback, admin_only = handler
+				if admin_only and user.id != ADMIN_USER_ID:
+					return
+				await callback(query, user)
 			except Exception as e:
 				logger.error(f"Ошибка в callback: {e}")
 				# Не пытаемся отвечать на callback если уже произошла ошибка
@@ -581,9 +673,133 @@ class UmaBot:
 					pass
 
 	async def run(self) -> None:
-		# Стартуем планировщик и polling
+		# Стартуем экспорт трассировки, сторож event loop, эндпоинт метрик и polling;
+		# база и клиенты грузятся в фоне, пока aiogram подключается к Telegram
+		tracing.configure()
+		self.loop_monitor.start()
+		if METRICS_PORT:
+			self.metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT, ready=self.ready.is_set)
+		self._install_signal_handlers()
+		self._warm_up_task = asyncio.create_task(self._warm_up())
+		try:
+			# Сигналы и закрытие сессии берем на себя: aiogram остановил бы polling и закрыл HTTP-сессию,
+			# не дожидаясь начатых запросов
+			if not self._stopping:
+				await self.dp.start_polling(self.bot, handle_signals=False, close_bot_session=False)
+		finally:
+			await self.shutdown()
+		if self._startup_error is not None:
+			raise self._startup_error
+
+	async def _warm_up(self) -> None:
+		"""Загружает базу и готовит клиент Groq в рабочих потоках, затем открывает обработку апдейтов"""
+		started = time.perf_counter()
+		db_result, groq_result = await asyncio.gather(
+			asyncio.to_thread(self.database.warm_up),
+			asyncio.to_thread(self.groq_client.warm_up),
+			return_exceptions=True,
+		)
+		if isinstance(groq_result, Exception):
+			# Клиент будет создан заново при первом запросе к модели
+			logger.warning(f"Не удалось подготовить клиент Groq: {groq_result}")
+		STARTUP_SECONDS.set(time.perf_counter() - started, phase="warm_up")
+		if isinstance(db_result, Exception):
+			# Без базы бот не работает, как и при прежней загрузке в конструкторе: готовность не наступает,
+			# /ready отвечает 503, рассылки не запускаются, а run() после остановки пробрасывает ошибку
+			logger.error(f"Не удалось загрузить базу при старте: {db_result}")
+			self._startup_error = db_result
+			self.request_stop()
+			return
+		if self._stopping:
+			return
 		await self.scheduler.start_scheduler()
-		await self.dp.start_polling(self.bot)
+		self.ready.set()
+		READY.set(1)
+		total = time.perf_counter() - IMPORT_STARTED
+		STARTUP_SECONDS.set(total, phase="ready")
+		logger.info(f"Бот готов к работе через {total:.2f} с после старта")
+
+	def _install_signal_handlers(self) -> None:
+		loop = asyncio.get_running_loop()
+		for sig in (signal.SIGINT, signal.SIGTERM):
+			try:
+				loop.add_signal_handler(sig, self.request_stop, sig)
+			except (NotImplementedError, RuntimeError):
+				# Windows: остается KeyboardInterrupt
+				pass
+
+	def request_stop(self, sig: signal.Signals | None = None) -> None:
+		"""Перестает принимать новые апдейты; остальное доделает shutdown после выхода из polling"""
+		if self._stopping:
+			return
+		self._stopping = True
+		logger.info(f"Получен {sig.name if sig else 'запрос'} на остановку, завершаем polling")
+		asyncio.get_running_loop().create_task(self._stop_polling())
+
+	async def _stop_polling(self) -> None:
+		try:
+			await self.dp.stop_polling()
+		except RuntimeError:
+			pass  # polling еще не запущен — run() его и не запустит
+
+	async def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+		"""Дожидается начатых запросов (не дольше timeout), затем сохраняет данные и закрывает соединения"""
+		self._stopping = True
+		READY.set(0)
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + timeout
+
+		def remaining() -> float:
+			return max(0.0, deadline - loop.time())
+
+		# Поток загрузки не прервать; апдейты, ждущие готовности, еще можно обработать
+		if self._warm_up_task is not None:
+			await asyncio.wait({self._warm_up_task}, timeout=remaining())
+			if self.database.loaded and self._startup_error is None:
+				self.ready.set()
+			elif not self.ready.is_set():
+				# Базы нет: апдейты, ждущие готовности, обработать не выйдет, ждать их до таймаута незачем
+				for task in self._inflight - {asyncio.current_task()}:
+					task.cancel()
+
+		# Альбомы, ожидающие таймера, обрабатываются сразу
+		try:
+			await asyncio.wait_for(self.media_groups.flush_all(), remaining())
+		except asyncio.TimeoutError:
+			logger.warning("Не все альбомы успели обработаться до остановки")
+
+		inflight = {task for task in self._inflight if task is not asyncio.current_task()}
+		if inflight:
+			logger.info(f"Ждем завершения {len(inflight)} запросов")
+			_, pending = await asyncio.wait(inflight, timeout=remaining())
+			if pending:
+				logger.warning(f"{len(pending)} запросов не уложились в {timeout:.0f} с и будут прерваны")
+				for task in pending:
+					task.cancel()
+				await asyncio.gather(*pending, return_exceptions=True)
+
+		# Запросов к моделям больше не будет: пул соединений SDK закрывается сразу после их завершения
+		try:
+			await self.groq_client.close()
+		except Exception as e:
+			logger.error(f"Не удалось закрыть клиент Groq: {e}")
+
+		await self.scheduler.stop_scheduler(timeout=remaining())
+		await self.loop_monitor.stop()
+		if self.metrics_server is not None:
+			self.metrics_server.close()
+			await self.metrics_server.wait_closed()
+
+		try:
+			# Незагруженную базу сохранять незачем, а загрузка только задержала бы остановку
+			if self.database.loaded:
+				self.database.flush()
+		except Exception as e:
+			logger.error(f"Не удалось сохранить базу при остановке: {e}")
+		self.database.close()
+		await self.bot.session.close()
+		tracing.shutdown()
+		logger.info("Бот остановлен")
 
 if __name__ == "__main__":
 	async def _main():
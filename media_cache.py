@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from config import MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_MAX_RESULTS
+
+_UNSAFE_KEY_CHARS = re.compile(r'[^A-Za-z0-9_-]')
+
+class MediaCache:
+	"""Кэш медиафайлов Telegram по file_unique_id: байты на диске (LRU) и результаты обработки"""
+
+	def __init__(
+		self,
+		cache_dir: str = MEDIA_CACHE_DIR,
+		max_bytes: int = MEDIA_CACHE_MAX_BYTES,
+		max_results: int = MEDIA_CACHE_MAX_RESULTS,
+	) -> None:
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.max_results = max_results
+		self.logger = logging.getLogger(__name__)
+		self._lock = threading.Lock()
+		self._files: OrderedDict[str, int] = OrderedDict()
+		self._total_bytes = 0
+		# Результаты — журнал JSON-строк: новый результат дописывается в конец файла, а целиком файл
+		# переписывается (сжимается) только когда журнал вдвое длиннее кэша
+		self._results_file = os.path.join(cache_dir, "results.jsonl")
+		self._legacy_results_file = os.path.join(cache_dir, "results.json")
+		self._results: OrderedDict[str, str] = OrderedDict()
+		self._journal_lines = 0
+		os.makedirs(os.path.join(cache_dir, "files"), exist_ok=True)
+		self._load_index()
+		self._load_results()
+
+	@staticmethod
+	def _safe_key(key: str) -> str:
+		return _UNSAFE_KEY_CHARS.sub('_', key)
+
+	def _file_path(self, key: str) -> str:
+		return os.path.join(self.cache_dir, "files", self._safe_key(key))
+
+	def _load_index(self) -> None:
+		"""Восстанавливает порядок LRU по времени последнего доступа к файлам"""
+		files_dir = os.path.join(self.cache_dir, "files")
+		entries = []
+		for name in os.listdir(files_dir):
+			path = os.path.join(files_dir, name)
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue
+			if name.endswith(".tmp"):
+				os.remove(path)
+				continue
+			entries.append((stat.st_mtime, name, stat.st_size))
+		for _, name, size in sorted(entries):
+			self._files[name] = size
+			self._total_bytes += size
+		self._evict()
+
+	def _remember(self, result_key: str, value: str) -> None:
+		self._results[result_key] = value
+		self._results.move_to_end(result_key)
+		while len(self._results) > self.max_results:
+			self._results.popitem(last=False)
+
+	def _load_results(self) -> None:
+		"""Восстанавливает результаты из журнала; прежний results.json переносится в журнал"""
+		legacy = os.path.exists(self._legacy_results_file)
+		if legacy:
+			try:
+				with open(self._legacy_results_file, 'r', encoding='utf-8') as f:
+					for result_key, value in json.load(f):
+						self._remember(result_key, value)
+			except Exception as e:
+				self.logger.warning(f"Не удалось загрузить кэш результатов: {e}")
+		torn = False
+		if os.path.exists(self._results_file):
+			with open(self._results_file, 'r', encoding='utf-8') as f:
+				for line in f:
+					self._journal_lines += 1
+					try:
+						result_key, value = json.loads(line)
+					except ValueError:
+						# Строка, недописанная при аварийной остановке; сжатие уберет ее, чтобы к ней не приклеилась следующая
+						torn = True
+						continue
+					self._remember(result_key, value)
+		if legacy or torn or self._journal_lines > 2 * self.max_results:
+			try:
+				self._compact_results()
+				if legacy:
+					os.remove(self._legacy_results_file)
+			except OSError as e:
+				self.logger.warning(f"Не удалось сжать кэш результатов: {e}")
+
+	def _compact_results(self) -> None:
+		"""Переписывает журнал текущим содержимым кэша"""
+		tmp_path = self._results_file + ".tmp"
+		with open(tmp_path, 'w', encoding='utf-8') as f:
+			for item in self._results.items():
+				f.write(json.dumps(item, ensure_ascii=False) + "\n")
+		os.replace(tmp_path, self._results_file)
+		self._journal_lines = len(self._results)
+
+	def _evict(self) -> None:
+		while self._total_bytes > self.max_bytes and self._files:
+			name, size = self._files.popitem(last=False)
+			self._total_bytes -= size
+			try:
+				os.remove(os.path.join(self.cache_dir, "files", name))
+			except OSError:
+				pass
+
+	def get_path(self, key: str) -> str | None:
+		"""Возвращает путь к закэшированному файлу и отмечает его как недавно использованный"""
+		name = self._safe_key(key)
+		with self._lock:
+			if name not in self._files:
+				return None
+			self._files.move_to_end(name)
+			path = self._file_path(key)
+			try:
+				os.utime(path)
+			except OSError:
+				self._total_bytes -= self._files.pop(name)
+				return None
+			return path
+
+	def get_bytes(self, key: str) -> bytes | None:
+		"""Возвращает содержимое файла из кэша"""
+		path = self.get_path(key)
+		if path is None:
+			return None
+		try:
+			with open(path, 'rb') as f:
+				return f.read()
+		except OSError:
+			return None
+
+	def temp_path(self, key: str) -> str:
+		"""Путь для временного файла внутри кэша (тот же диск, что и для os.replace)"""
+		return f"{self._file_path(key)}.{threading.get_ident()}.tmp"
+
+	def put_bytes(self, key: str, data: bytes) -> None:
+		"""Сохраняет содержимое файла в кэш"""
+		if len(data) > self.max_bytes:
+			return
+		tmp_path = self.temp_path(key)
+		with open(tmp_path, 'wb') as f:
+			f.write(data)
+		self.commit_file(key, tmp_path)
+
+	def commit_file(self, key: str, tmp_path: str) -> str | None:
+		"""Атомарно переносит готовый временный файл в кэш. Возвращает путь или None, если файл слишком велик"""
+		name = self._safe_key(key)
+		size = os.path.getsize(tmp_path)
+		if size > self.max_bytes:
+			return None
+		path = self._file_path(key)
+		with self._lock:
+			os.replace(tmp_path, path)
+			self._total_bytes += size - self._files.pop(name, 0)
+			self._files[name] = size
+			self._evict()
+		return path
+
+	def get_result(self, kind: str, key: str) -> str | None:
+		"""Возвращает сохраненный результат обработки (транскрипция, описание)"""
+		result_key = f"{kind}:{key}"
+		with self._lock:
+			value = self._results.get(result_key)
+			if value is not None:
+				self._results.move_to_end(result_key)
+			return value
+
+	def put_result(self, kind: str, key: str, value: str) -> None:
+		"""Сохраняет результат обработки медиафайла"""
+		result_key = f"{kind}:{key}"
+		with self._lock:
+			self._remember(result_key, value)
+			try:
+				with open(self._results_file, 'a', encoding='utf-8') as f:
+					f.write(json.dumps([result_key, value], ensure_ascii=False) + "\n")
+				self._journal_lines += 1
+				if self._journal_lines > 2 * self.max_results:
+					self._compact_results()
+			except OSError as e:
+				self.logger.warning(f"Не удалось сохранить кэш результатов: {e}")
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from config import MEDIA_GROUP_DEBOUNCE, MEDIA_GROUP_MAX_WAIT, MEDIA_GROUP_MAX_ITEMS
+
+FlushCallback = Callable[[str, list, Any], Awaitable[None]]
+
+class _PendingGroup:
+	__slots__ = ("items", "context", "started_at", "timer")
+
+	def __init__(self, started_at: float) -> None:
+		self.items: list = []
+		self.context: Any = None
+		self.started_at = started_at
+		self.timer: asyncio.TimerHandle | None = None
+
+class MediaGroupAggregator:
+	"""Собирает элементы альбома и отдает их одним пакетом на каждый media_group_id"""
+
+	def __init__(
+		self,
+		on_flush: FlushCallback,
+		debounce: float = MEDIA_GROUP_DEBOUNCE,
+		max_wait: float = MEDIA_GROUP_MAX_WAIT,
+		max_items: int = MEDIA_GROUP_MAX_ITEMS,
+		remember_flushed: int = 1024,
+	) -> None:
+		self.on_flush = on_flush
+		self.debounce = debounce
+		self.max_wait = max_wait
+		self.max_items = max_items
+		self.remember_flushed = remember_flushed
+		self.logger = logging.getLogger(__name__)
+		self._groups: dict[str, _PendingGroup] = {}
+		# Недавно обработанные группы: опоздавшие элементы не создают второй вызов модели
+		self._flushed: OrderedDict[str, None] = OrderedDict()
+		self._tasks: set[asyncio.Task] = set()
+
+	def __contains__(self, group_id: str) -> bool:
+		return group_id in self._groups
+
+	def add(self, group_id: str, item: Any, on_create: Callable[[], Any] | None = None) -> bool:
+		"""Добавляет элемент в группу и перезапускает таймер. Возвращает False, если элемент отброшен"""
+		if group_id in self._flushed:
+			self.logger.warning(f"Элемент медиа-группы {group_id} пришел после обработки альбома и пропущен")
+			return False
+
+		loop = asyncio.get_running_loop()
+		group = self._groups.get(group_id)
+		if group is None:
+			group = _PendingGroup(loop.time())
+			self._groups[group_id] = group
+			if on_create is not None:
+				group.context = on_create()
+
+		group.items.append(item)
+
+		if group.timer is not None:
+			group.timer.cancel()
+			group.timer = None
+
+		if len(group.items) >= self.max_items:
+			self._flush(group_id)
+			return True
+
+		# Таймер сбрасывается на каждый новый элемент, но не дольше max_wait от первого
+		deadline = group.started_at + self.max_wait
+		delay = min(self.debounce, max(0.0, deadline - loop.time()))
+		group.timer = loop.call_later(delay, self._flush, group_id)
+		return True
+
+	def _flush(self, group_id: str) -> None:
+		group = self._groups.pop(group_id, None)
+		if group is None:
+			return
+		if group.timer is not None:
+			group.timer.cancel()
+
+		self._flushed[group_id] = None
+		while len(self._flushed) > self.remember_flushed:
+			self._flushed.popitem(last=False)
+
+		task = asyncio.create_task(self._run_flush(group_id, group))
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+	async def _run_flush(self, group_id: str, group: _PendingGroup) -> None:
+		try:
+			await self.on_flush(group_id, group.items, group.context)
+		except Exception as e:
+			self.logger.error(f"Ошибка при обработке медиа-группы {group_id}: {e}")
+
+	async def flush_all(self) -> None:
+		"""Немедленно обрабатывает все ожидающие группы и дожидается завершения"""
+		for group_id in list(self._groups):
+			self._flush(group_id)
+		if self._tasks:
+			await asyncio.gather(*list(self._tasks), return_exceptions=True)
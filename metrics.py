@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable
+
+import tracing
+
+# Границы корзин гистограмм задержек, секунды: от быстрых обращений к БД до долгой генерации
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+	pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+	kind = "untyped"
+
+	def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> None:
+		self.name = name
+		self.help = help_text
+		self.labelnames = tuple(labelnames)
+		self._lock = threading.Lock()
+
+	def _key(self, labels: dict) -> tuple[str, ...]:
+		return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+	def render(self) -> list[str]:
+		return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+	kind = "counter"
+
+	def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> None:
+		super().__init__(name, help_text, labelnames)
+		self._values: dict[tuple[str, ...], float] = {}
+
+	def inc(self, amount: float = 1, **labels) -> None:
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def value(self, **labels) -> float:
+		return self._values.get(self._key(labels), 0)
+
+	def render(self) -> list[str]:
+		lines = super().render()
+		with self._lock:
+			for key, value in sorted(self._values.items()):
+				lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+		return lines
+
+class Gauge(Counter):
+	kind = "gauge"
+
+	def set(self, value: float, **labels) -> None:
+		with self._lock:
+			self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+	kind = "histogram"
+
+	def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+		super().__init__(name, help_text, labelnames)
+		self.buckets = tuple(sorted(buckets))
+		# Для каждого набора меток: счетчики корзин (не накопительные), сумма, количество
+		self._values: dict[tuple[str, ...], list] = {}
+
+	def observe(self, value: float, **labels) -> None:
+		key = self._key(labels)
+		with self._lock:
+			entry = self._values.get(key)
+			if entry is None:
+				entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					entry[0][i] += 1
+					break
+			entry[1] += value
+			entry[2] += 1
+
+	def render(self) -> list[str]:
+		lines = super().render()
+		with self._lock:
+			for key, (counts, total, count) in sorted(self._values.items()):
+				cumulative = 0
+				for bound, bucket_count in zip(self.buckets, counts):
+					cumulative += bucket_count
+					bucket_labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+					lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+				inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+				lines.append(f"{self.name}_bucket{inf_labels} {count}")
+				lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+				lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+		return lines
+
+class Registry:
+	def __init__(self) -> None:
+		self._metrics: dict[str, _Metric] = {}
+
+	def register(self, metric: _Metric) -> _Metric:
+		self._metrics[metric.name] = metric
+		return metric
+
+	def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+		return self.register(Counter(name, help_text, labelnames))
+
+	def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+		return self.register(Gauge(name, help_text, labelnames))
+
+	def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+		return self.register(Histogram(name, help_text, labelnames, buckets))
+
+	def render(self) -> str:
+		"""Все метрики в текстовом формате Prometheus"""
+		lines = []
+		for metric in self._metrics.values():
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+	"umabot_stage_seconds", "Длительность этапа обработки сообщения", ("stage", "type"),
+)
+MESSAGES = REGISTRY.counter(
+	"umabot_messages_total", "Обработанные сообщения по типу и исходу", ("type", "status"),
+)
+MODEL_LATENCY = REGISTRY.histogram(
+	"umabot_model_request_seconds", "Длительность запроса к модели Groq", ("model", "operation"),
+)
+MODEL_REQUESTS = REGISTRY.counter(
+	"umabot_model_requests_total", "Запросы к моделям Groq по исходу", ("model", "operation", "status"),
+)
+MODEL_TOKENS = REGISTRY.counter(
+	"umabot_model_tokens_total", "Токены моделей Groq: prompt, completion и cached", ("model", "kind"),
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+	"umabot_startup_seconds", "Длительность этапов запуска: import, init, warm_up, ready", ("phase",),
+)
+READY = REGISTRY.gauge(
+	"umabot_ready", "1, когда база загружена и бот обрабатывает апдейты",
+)
+
+@contextmanager
+def timed(stage: str, histogram: Histogram = STAGE_LATENCY, **labels):
+	"""Замеряет блок кода (в том числе с await внутри): пишет длительность в гистограмму
+	и оборачивает блок в span трассировки с теми же метками"""
+	start = time.perf_counter()
+	try:
+		with tracing.span(stage, **labels):
+			yield
+	finally:
+		histogram.observe(time.perf_counter() - start, stage=stage, **labels)
+
+async def _handle_http(ready: Callable[[], bool] | None, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+	try:
+		request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+		# Остаток заголовков не нужен, но его надо вычитать до ответа
+		while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+			pass
+		parts = request_line.decode("latin-1").split()
+		path = parts[1].split("?")[0] if len(parts) >= 2 and parts[0] == "GET" else None
+		if path == "/metrics":
+			status, body = "200 OK", REGISTRY.render().encode("utf-8")
+		elif path == "/ready" and ready is not None:
+			# Для readiness-проб оркестратора: пока база не загружена, реплика трафик не получает
+			status, body = ("200 OK", b"ready\n") if ready() else ("503 Service Unavailable", b"starting\n")
+		else:
+			status, body = "404 Not Found", b"not found\n"
+		writer.write(
+			f"HTTP/1.1 {status}\r\n"
+			f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+			f"Content-Length: {len(body)}\r\n"
+			f"Connection: close\r\n\r\n".encode("latin-1") + body
+		)
+		await writer.drain()
+	except Exception as e:
+		logging.getLogger(__name__).debug(f"Ошибка запроса метрик: {e}")
+	finally:
+		writer.close()
+
+async def start_metrics_server(host: str, port: int, ready: Callable[[], bool] | None = None) -> asyncio.AbstractServer:
+	"""HTTP-эндпоинт /metrics для Prometheus на event loop бота; с ready — еще и /ready"""
+	server = await asyncio.start_server(partial(_handle_http, ready), host, port)
+	logging.getLogger(__name__).info(f"Метрики доступны на http://{host}:{port}/metrics")
+	return server
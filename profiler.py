@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+
+from config import PROFILER_DURATION, PROFILER_INTERVAL
+
+class SamplingProfiler:
+	"""Семплирующий профайлер работающего процесса: отдельный поток раз в interval снимает стеки всех
+	потоков через sys._current_frames. Трассировка не включается, поэтому накладные расходы малы.
+	Результат — collapsed stacks ("кадр;кадр;кадр количество"), который понимают flamegraph.pl и speedscope"""
+
+	def __init__(self, interval: float = PROFILER_INTERVAL) -> None:
+		self.interval = interval
+		self.samples: Counter[str] = Counter()
+		self.sample_count = 0
+		self._stop = threading.Event()
+		self._thread: threading.Thread | None = None
+
+	@staticmethod
+	def _frame_label(frame) -> str:
+		code = frame.f_code
+		return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+	def _collapse(self, thread_name: str, frame) -> str:
+		labels = []
+		while frame is not None:
+			labels.append(self._frame_label(frame))
+			frame = frame.f_back
+		labels.append(thread_name)
+		# Корень стека — первым; ';' внутри имен ломает формат
+		return ";".join(label.replace(";", ":") for label in reversed(labels))
+
+	def _run(self) -> None:
+		own_id = threading.get_ident()
+		while not self._stop.wait(self.interval):
+			names = {thread.ident: thread.name for thread in threading.enumerate()}
+			for thread_id, frame in sys._current_frames().items():
+				if thread_id == own_id:
+					continue
+				self.samples[self._collapse(names.get(thread_id, f"thread-{thread_id}"), frame)] += 1
+			self.sample_count += 1
+
+	def start(self) -> None:
+		self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join()
+
+	def collapsed(self) -> str:
+		return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+_profile_lock = asyncio.Lock()
+
+def profile_running() -> bool:
+	return _profile_lock.locked()
+
+async def profile(duration: float = PROFILER_DURATION, interval: float = PROFILER_INTERVAL) -> tuple[bytes, int]:
+	"""Профилирует процесс duration секунд, не останавливая бота. Возвращает (collapsed stacks, число снимков).
+	Одновременно идет только один профиль"""
+	async with _profile_lock:
+		profiler = SamplingProfiler(interval)
+		profiler.start()
+		try:
+			await asyncio.sleep(duration)
+		finally:
+			await asyncio.to_thread(profiler.stop)
+		return profiler.collapsed().encode("utf-8"), profiler.sample_count
@@ -0,0 +1,227 @@
+"""Компактное представление базы в памяти.
+
+В database.json каждая запись диалога — вложенные словари с повторяющимися строковыми ключами и двумя ISO-строками
+времени. В памяти те же данные хранятся записями со __slots__: тип сообщения — IntEnum, время — целые секунды
+эпохи, ключи пользователей — int. Store.from_legacy / Store.to_legacy переводят между форматами без потери полей
+(время — с точностью до секунды). Store.from_rows / Store.to_rows — плоские списки полей для снимков (snapshot.py).
+"""
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import Any
+
+class MessageType(IntEnum):
+	TEXT = 0
+	IMAGE = 1
+	IMAGES = 2
+	AUDIO = 3
+	OTHER = 255  # неизвестный тип: исходная строка остается в extra["type"]
+
+# Строковые типы старого формата
+_LABELS = {member: member.name.lower() for member in MessageType if member is not MessageType.OTHER}
+_TYPES_BY_LABEL = {label: member for member, label in _LABELS.items()}
+_TYPES_BY_VALUE = {member.value: member for member in MessageType}
+
+# Ключ ссылки на файл зависит от типа сообщения
+_URL_KEYS = {MessageType.IMAGE: "image_url", MessageType.IMAGES: "image_urls", MessageType.AUDIO: "audio_url"}
+
+def _known_keys(message_type: MessageType) -> frozenset[str]:
+	"""Ключи сообщения, которые раскладываются по полям записи; остальные попадают в extra"""
+	keys = {"type", "timestamp", "text", "caption", "file_unique_ids" if message_type is MessageType.IMAGES else "file_unique_id"}
+	if message_type in _URL_KEYS:
+		keys.add(_URL_KEYS[message_type])
+	return frozenset(keys)
+
+_KNOWN_KEYS = {member: _known_keys(member) for member in MessageType}
+
+def to_epoch(value: str | None) -> int | None:
+	"""ISO-время из старого формата в секунды эпохи; время без зоны считается локальным, как его писал datetime.now()"""
+	if not value:
+		return None
+	return int(datetime.fromisoformat(value).timestamp())
+
+def local_iso(epoch: int | None) -> str | None:
+	return datetime.fromtimestamp(epoch).isoformat() if epoch is not None else None
+
+def utc_iso(epoch: int | None) -> str | None:
+	return datetime.fromtimestamp(epoch, timezone.utc).isoformat() if epoch is not None else None
+
+def _freeze(value):
+	return tuple(value) if isinstance(value, list) else value
+
+def _thaw(value):
+	return list(value) if isinstance(value, tuple) else value
+
+class UserRecord:
+	__slots__ = ("username", "first_name", "registered", "last_activity", "is_active", "extra")
+
+	def __init__(self, username: str | None = None, first_name: str | None = None, registered: int | None = None,
+				 last_activity: int | None = None, is_active: bool = True, extra: dict | None = None) -> None:
+		self.username = username
+		self.first_name = first_name
+		self.registered = registered
+		self.last_activity = last_activity
+		self.is_active = is_active
+		self.extra = extra
+
+	@classmethod
+	def from_legacy(cls, data: dict) -> "UserRecord":
+		data = dict(data)
+		return cls(
+			username=data.pop("username", None),
+			first_name=data.pop("first_name", None),
+			registered=to_epoch(data.pop("registration_date", None)),
+			last_activity=to_epoch(data.pop("last_activity", None)),
+			is_active=data.pop("is_active", True),
+			extra=data or None,
+		)
+
+	def to_row(self) -> list:
+		return [self.username, self.first_name, self.registered, self.last_activity, self.is_active, self.extra]
+
+	def to_legacy(self) -> dict:
+		data = {
+			"username": self.username,
+			"first_name": self.first_name,
+			"registration_date": local_iso(self.registered),
+			"last_activity": local_iso(self.last_activity),
+		}
+		if not self.is_active:
+			data["is_active"] = False
+		if self.extra:
+			data.update(self.extra)
+		return data
+
+class ConversationEntry:
+	"""Ход диалога: сообщение пользователя и ответ бота.
+	created — когда ход записан (локальное время в старом формате), sent — время сообщения в Telegram (UTC)"""
+	__slots__ = ("created", "type", "sent", "text", "caption", "media", "urls", "response", "extra")
+
+	def __init__(self, type: MessageType, response: str, created: int | None = None, sent: int | None = None,
+				 text: str | None = None, caption: str | None = None, media: str | tuple[str, ...] | None = None,
+				 urls: str | tuple[str, ...] | None = None, extra: dict | None = None) -> None:
+		self.created = created
+		self.type = type
+		self.sent = sent
+		self.text = text
+		self.caption = caption
+		self.media = media
+		self.urls = urls
+		self.response = response
+		self.extra = extra
+
+	@classmethod
+	def from_message(cls, message: dict, response: str, created: int | None = None) -> "ConversationEntry":
+		"""Из словаря сообщения, который собирают обработчики (и который хранился в старом формате)"""
+		label = message.get("type")
+		message_type = _TYPES_BY_LABEL.get(label, MessageType.OTHER)
+		media_key = "file_unique_ids" if message_type is MessageType.IMAGES else "file_unique_id"
+		url_key = _URL_KEYS.get(message_type)
+		known = _KNOWN_KEYS[message_type]
+		extra = None
+		if not message.keys() <= known:
+			extra = {key: value for key, value in message.items() if key not in known}
+		if message_type is MessageType.OTHER and label is not None:
+			extra = {**(extra or {}), "type": label}
+		return cls(
+			type=message_type,
+			response=response,
+			created=created,
+			sent=to_epoch(message.get("timestamp")),
+			text=message.get("text"),
+			caption=message.get("caption"),
+			media=_freeze(message.get(media_key)),
+			urls=_freeze(message.get(url_key)) if url_key else None,
+			extra=extra,
+		)
+
+	@classmethod
+	def from_legacy(cls, data: dict) -> "ConversationEntry":
+		return cls.from_message(data.get("message", {}), data.get("response", ""), to_epoch(data.get("timestamp")))
+
+	def message(self) -> dict:
+		message: dict[str, Any] = {}
+		if self.text is not None:
+			message["text"] = self.text
+		if self.caption is not None:
+			message["caption"] = self.caption
+		if self.media is not None:
+			message["file_unique_ids" if self.type is MessageType.IMAGES else "file_unique_id"] = _thaw(self.media)
+		if self.urls is not None:
+			message[_URL_KEYS[self.type]] = _thaw(self.urls)
+		if self.type is not MessageType.OTHER:
+			message["type"] = _LABELS[self.type]
+		if self.extra:
+			message.update(self.extra)
+		if self.sent is not None:
+			message["timestamp"] = utc_iso(self.sent)
+		return message
+
+	def to_legacy(self) -> dict:
+		return {"timestamp": local_iso(self.created), "message": self.message(), "response": self.response}
+
+	@classmethod
+	def from_row(cls, row: list) -> "ConversationEntry":
+		message_type, response, created, sent, text, caption, media, urls, extra = row
+		return cls(_TYPES_BY_VALUE[message_type], response, created, sent, text, caption, _freeze(media), _freeze(urls), extra)
+
+	def to_row(self) -> list:
+		# Порядок полей — как у __init__; кодеки сами превращают кортежи в списки
+		return [int(self.type), self.response, self.created, self.sent, self.text, self.caption, self.media, self.urls, self.extra]
+
+class Store:
+	"""Данные снимка: пользователи по int user_id и рассылки. Диалоги и расход токенов заполнены только
+	у снимков до версии 3 — при загрузке они переносятся в history_store"""
+	__slots__ = ("users", "conversations", "broadcasts", "usage")
+
+	def __init__(self) -> None:
+		self.users: dict[int, UserRecord] = {}
+		self.conversations: dict[int, list[ConversationEntry]] = {}
+		self.broadcasts: list[dict] = []
+		# user_id -> день (ISO) -> модель -> счетчики
+		self.usage: dict[int, dict[str, dict[str, dict[str, int]]]] = {}
+
+	@classmethod
+	def from_legacy(cls, data: dict) -> "Store":
+		store = cls()
+		store.users = {int(key): UserRecord.from_legacy(user) for key, user in data.get("users", {}).items()}
+		store.conversations = {
+			int(key): [ConversationEntry.from_legacy(entry) for entry in conversation]
+			for key, conversation in data.get("conversations", {}).items()
+		}
+		store.broadcasts = data.get("broadcasts", [])
+		store.usage = {int(key): days for key, days in data.get("usage", {}).items()}
+		return store
+
+	def to_legacy(self) -> dict:
+		data = {
+			"users": {str(key): user.to_legacy() for key, user in self.users.items()},
+			"conversations": {
+				str(key): [entry.to_legacy() for entry in conversation] for key, conversation in self.conversations.items()
+			},
+			"broadcasts": self.broadcasts,
+		}
+		if self.usage:
+			data["usage"] = {str(key): days for key, days in self.usage.items()}
+		return data
+
+	@classmethod
+	def from_rows(cls, data: dict) -> "Store":
+		store = cls()
+		store.users = {user_id: UserRecord(*row) for user_id, *row in data["users"]}
+		store.conversations = {
+			user_id: [ConversationEntry.from_row(row) for row in rows] for user_id, rows in data["conversations"]
+		}
+		store.broadcasts = data["broadcasts"]
+		store.usage = {user_id: days for user_id, days in data["usage"]}
+		return store
+
+	def to_rows(self) -> dict:
+		"""Пары [user_id, ...] вместо словарей: ключи остаются int в любом кодеке"""
+		return {
+			"users": [[user_id, *user.to_row()] for user_id, user in self.users.items()],
+			"conversations": [
+				[user_id, [entry.to_row() for entry in conversation]] for user_id, conversation in self.conversations.items()
+			],
+			"broadcasts": self.broadcasts,
+			"usage": [[user_id, days] for user_id, days in self.usage.items()],
+		}
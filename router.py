@@ -0,0 +1,89 @@
+import logging
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from config import TEXT_MODEL, FAST_TEXT_MODEL, ROUTER_SIMPLE_MAX_CHARS
+from intents import INTENTS
+
+GENERATION_TEMPLATES = {
+	"image": 'Здесь в телеграме я не могу помочь с генерацией, НО вы можете нажать на кнопку "Uma Ai" в левом нижнем углу или перейти на сайт umaai.site в раздел <b>Изображения</b> и там творить! Там множество моделей с описаниями и примерами.',
+	"video": 'Здесь в телеграме я не могу помочь с генерацией, НО вы можете нажать на кнопку "Uma Ai" в левом нижнем углу или перейти на сайт umaai.site в раздел <b>Видео</b> и там творить! Там множество моделей с описаниями и примерами.',
+	"speech": 'Здесь в телеграме я не могу помочь с генерацией, НО вы можете нажать на кнопку "Uma Ai" в левом нижнем углу или перейти на сайт umaai.site в раздел <b>Речь</b> и там творить! Там множество моделей с описаниями и примерами.',
+}
+
+CANNED_TEMPLATES = {
+	"greeting": "Привет! 👋 Я <b>Uma AI</b> — ваш ИИ-ассистент. Чем могу помочь?",
+	"thanks": "Пожалуйста! 😊 Обращайтесь, если понадобится помощь.",
+	**{f"generate_{kind}": text for kind, text in GENERATION_TEMPLATES.items()},
+}
+
+# Несловесные признаки кода и вычислений; словесные признаки — интент "complex"
+_CODE_MARKERS = re.compile(r'```|<code>|[{};]|\d+\s*[-+*/^]\s*\d+')
+
+class RouteDecision(NamedTuple):
+	route: str  # template / fast / full
+	model: str | None
+	reply: str | None
+	reason: str
+
+class MessageRouter:
+	"""Выбирает для текстового сообщения шаблонный ответ, быструю модель или основную"""
+
+	def __init__(self, fast_model: str = FAST_TEXT_MODEL, full_model: str = TEXT_MODEL) -> None:
+		self.fast_model = fast_model
+		self.full_model = full_model
+		self.logger = logging.getLogger(__name__)
+		self.stats: Counter[str] = Counter()
+
+	@staticmethod
+	def _detect_generation(text: str) -> str | None:
+		"""Просьба о генерации — глагол, сразу за которым идет объект: "нарисуй картинку", "сгенерируй музыку".
+		Слова порознь ("сделай код для загрузки фото") просьбой о генерации не считаются"""
+		if len(text.split()) > 12:
+			return None
+		matches = INTENTS.find_all(text)
+		for i, (found, start, end) in enumerate(matches):
+			if "generate_verb" not in found:
+				continue
+			# Объект — термин сразу после глагола; "озвучь" — сразу и глагол, и объект
+			phrase = set(found)
+			if i + 1 < len(matches) and not text[end:matches[i + 1][1]].strip():
+				phrase |= matches[i + 1][0]
+			for kind in ("video", "speech", "image"):
+				if f"generate_{kind}" in phrase:
+					return f"generate_{kind}"
+		return None
+
+	@classmethod
+	def _detect_canned(cls, text: str, intents: set[str]) -> str | None:
+		# Шаблон — только если сообщение целиком состоит из приветствия или благодарности
+		if "greeting" in intents and INTENTS.covers(text, ("greeting",)):
+			return "greeting"
+		if "thanks" in intents and INTENTS.covers(text, ("thanks", "greeting")):
+			return "thanks"
+		if "generate_verb" in intents:
+			return cls._detect_generation(text)
+		return None
+
+	def route(self, text: str, use_browser_search: bool = False) -> RouteDecision:
+		"""Определяет маршрут сообщения и пишет решение в лог"""
+		intents = INTENTS.match(text)
+		# Код и сложные просьбы проверяются до шаблонов: "сделай код для загрузки фото" — не просьба о картинке
+		is_complex = "complex" in intents or bool(_CODE_MARKERS.search(text))
+		intent = None if is_complex else self._detect_canned(text, intents)
+
+		if intent:
+			decision = RouteDecision("template", None, CANNED_TEMPLATES[intent], intent)
+		elif use_browser_search:
+			decision = RouteDecision("full", self.full_model, None, "search")
+		elif len(text) > ROUTER_SIMPLE_MAX_CHARS:
+			decision = RouteDecision("full", self.full_model, None, "long")
+		elif is_complex:
+			decision = RouteDecision("full", self.full_model, None, "complex")
+		else:
+			decision = RouteDecision("fast", self.fast_model, None, "simple")
+
+		self.stats[decision.route] += 1
+		self.logger.info(f"Маршрут: {decision.route} ({decision.reason}), модель: {decision.model or '-'}")
+		return decision
@@ -4,26 +4,26 @@ Uma Bot - Запуск
 Простой скрипт для запуска Telegram-бота Uma Bot
 """
 
+import asyncio
+import importlib.util
 import sys
 import os
 import subprocess
 
 def check_dependencies():
-    """Проверяет наличие необходимых зависимостей"""
-    required_packages = [
-        'telegram',
-        'groq',
-        'python-dotenv',
-        'requests',
-        'Pillow'
-    ]
+    """Проверяет наличие необходимых зависимостей.
+    Пакеты только ищутся, но не импортируются: импорт SDK здесь лишь замедлил бы запуск"""
+    required_packages = {
+        'aiogram': 'aiogram',
+        'groq': 'groq',
+        'python-dotenv': 'dotenv',
+        'requests': 'requests',
+    }
     
     missing_packages = []
     
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
-        except ImportError:
+    for package, module in required_packages.items():
+        if importlib.util.find_spec(module) is None:
             missing_packages.append(package)
     
     if missing_packages:
@@ -70,7 +70,7 @@ def main():
     try:
         from main import UmaBot
         bot = UmaBot()
-        bot.run()
+        asyncio.run(bot.run())
     except KeyboardInterrupt:
         print("\n⏹️ Бот остановлен пользователем")
     except Exception as e:
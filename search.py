@@ -0,0 +1,204 @@
+import asyncio
+import html
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+from config import (
+	SEARCH_BACKEND, SEARCH_MAX_RESULTS, SEARCH_FETCH_PAGES, SEARCH_PAGE_TIMEOUT,
+	SEARCH_CACHE_TTL, SEARCH_CACHE_SIZE,
+)
+from intents import INTENTS
+from metrics import timed
+
+_TAG = re.compile(r'<[^>]+>')
+_SCRIPT = re.compile(r'<(script|style|noscript)[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+_SPACES = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+
+class SearchResult(NamedTuple):
+	title: str
+	url: str
+	snippet: str
+
+def _strip_html(text: str) -> str:
+	text = _SCRIPT.sub(' ', text)
+	text = _TAG.sub(' ', text)
+	return _SPACES.sub(' ', html.unescape(text)).strip()
+
+class SearchBackend:
+	"""Интерфейс поискового бэкенда. search вызывается в отдельном потоке"""
+
+	name = "base"
+
+	def search(self, query: str, limit: int) -> list[SearchResult]:
+		raise NotImplementedError
+
+class StubSearchBackend(SearchBackend):
+	"""Локальный бэкенд без сети: отдает заранее заданные результаты (для тестов и офлайн-запуска)"""
+
+	name = "stub"
+
+	def __init__(self, results: dict[str, list[SearchResult]] | None = None) -> None:
+		self.results = results or {}
+		self.calls = 0
+
+	def search(self, query: str, limit: int) -> list[SearchResult]:
+		self.calls += 1
+		for key, results in self.results.items():
+			if key in query.lower():
+				return results[:limit]
+		return []
+
+class DuckDuckGoBackend(SearchBackend):
+	"""Поиск через HTML-версию DuckDuckGo, без API-ключа"""
+
+	name = "duckduckgo"
+	URL = "https://html.duckduckgo.com/html/"
+	_RESULT = re.compile(
+		r'<a[^>]+class="result__a"[^>]+href="(?P<url>[^"]+)"[^>]*>(?P<title>.*?)</a>.*?'
+		r'class="result__snippet"[^>]*>(?P<snippet>.*?)</a>',
+		re.DOTALL,
+	)
+
+	def search(self, query: str, limit: int) -> list[SearchResult]:
+		import requests
+		response = requests.post(
+			self.URL,
+			data={"q": query, "kl": "ru-ru"},
+			headers={"User-Agent": "Mozilla/5.0 (UmaBot)"},
+			timeout=SEARCH_PAGE_TIMEOUT,
+		)
+		response.raise_for_status()
+		results = []
+		for match in self._RESULT.finditer(response.text):
+			results.append(SearchResult(
+				title=_strip_html(match.group("title")),
+				url=self._resolve_url(html.unescape(match.group("url"))),
+				snippet=_strip_html(match.group("snippet")),
+			))
+			if len(results) >= limit:
+				break
+		return results
+
+	@staticmethod
+	def _resolve_url(url: str) -> str:
+		"""Ссылки выдачи ведут через редирект вида //duckduckgo.com/l/?uddg=<url>"""
+		target = parse_qs(urlparse(url).query).get("uddg")
+		return target[0] if target else url
+
+def create_backend(name: str = SEARCH_BACKEND) -> SearchBackend:
+	if name == "stub":
+		return StubSearchBackend()
+	return DuckDuckGoBackend()
+
+class SearchService:
+	"""Поиск с кэшем по классу запроса и параллельной загрузкой страниц результатов"""
+
+	# Класс запроса -> интенты; первый подошедший класс задает срок жизни в кэше (SEARCH_CACHE_TTL).
+	# Дата, время и запросы "сейчас/сегодня" без другого класса устаревают за секунды и не кэшируются
+	QUERY_CLASSES = {
+		"rates": ("rates",),
+		"weather": ("weather",),
+		"news": ("news",),
+		"datetime": ("datetime", "now"),
+	}
+
+	def __init__(self, backend: SearchBackend | None = None) -> None:
+		self.backend = backend or create_backend()
+		self.logger = logging.getLogger(__name__)
+		self._cache: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+		self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+	@staticmethod
+	def normalize_query(query: str) -> str:
+		return " ".join(_PUNCTUATION.sub(' ', query.lower().replace('ё', 'е')).split())
+
+	def classify(self, query: str) -> str:
+		"""Класс запроса определяет срок жизни результата в кэше"""
+		intents = INTENTS.match(query)
+		for query_class, class_intents in self.QUERY_CLASSES.items():
+			if intents.intersection(class_intents):
+				return query_class
+		return "general"
+
+	async def get_context(self, query: str) -> str:
+		"""Возвращает блок с результатами поиска для подстановки в промпт (пустой, если ничего не найдено)"""
+		normalized = self.normalize_query(query)
+		query_class = self.classify(normalized)
+		key = (query_class, normalized)
+
+		cached = self._cache.get(key)
+		if cached and cached[0] > time.monotonic():
+			self._cache.move_to_end(key)
+			self.logger.info(f"Поиск из кэша ({query_class}): {normalized}")
+			return cached[1]
+
+		# Одинаковые одновременные запросы ждут один общий поиск
+		while key in self._inflight:
+			shared = self._inflight[key]
+			try:
+				return await asyncio.shield(shared)
+			except asyncio.CancelledError:
+				# Отменен сам общий поиск (например, запрос-владелец при остановке), а не этот запрос: ищем заново
+				if not shared.cancelled():
+					raise
+
+		future = asyncio.get_running_loop().create_future()
+		self._inflight[key] = future
+		try:
+			with timed("search", type=query_class):
+				context = await self._search(query)
+			ttl = SEARCH_CACHE_TTL.get(query_class, SEARCH_CACHE_TTL["general"])
+			if context and ttl > 0:
+				self._cache[key] = (time.monotonic() + ttl, context)
+				self._cache.move_to_end(key)
+				while len(self._cache) > SEARCH_CACHE_SIZE:
+					self._cache.popitem(last=False)
+			future.set_result(context)
+			return context
+		except Exception as e:
+			self.logger.error(f"Ошибка поиска ({self.backend.name}): {e}")
+			future.set_result("")
+			return ""
+		finally:
+			# Отмена владельца не должна оставлять ожидающих на неразрешенном future
+			if not future.done():
+				future.cancel()
+			del self._inflight[key]
+
+	async def _search(self, query: str) -> str:
+		results = await asyncio.to_thread(self.backend.search, query, SEARCH_MAX_RESULTS)
+		if not results:
+			return ""
+
+		# Тексты верхних страниц загружаются одновременно; медленная страница не задерживает остальные
+		pages = await asyncio.gather(
+			*(asyncio.to_thread(self._fetch_page_text, result.url) for result in results[:SEARCH_FETCH_PAGES]),
+			return_exceptions=True,
+		)
+		return self._format_context(results, pages)
+
+	def _fetch_page_text(self, url: str, max_chars: int = 800) -> str:
+		if not url.startswith(("http://", "https://")):
+			return ""
+		import requests
+		response = requests.get(url, timeout=SEARCH_PAGE_TIMEOUT, headers={"User-Agent": "Mozilla/5.0 (UmaBot)"})
+		response.raise_for_status()
+		return _strip_html(response.text[:200_000])[:max_chars]
+
+	@staticmethod
+	def _format_context(results: list[SearchResult], pages: list) -> str:
+		lines = [f"Результаты веб-поиска на {datetime.now().strftime('%d.%m.%Y %H:%M')}:"]
+		for i, result in enumerate(results, 1):
+			lines.append(f"{i}. {result.title} — {result.url}")
+			if result.snippet:
+				lines.append(f"   {result.snippet}")
+			page = pages[i - 1] if i <= len(pages) else None
+			if isinstance(page, str) and page:
+				lines.append(f"   Фрагмент страницы: {page}")
+		return "\n".join(lines)
@@ -0,0 +1,175 @@
+"""Снимки базы на диске: заголовок с версией формата и кодеком, затем данные records.Store в виде плоских списков.
+
+	UMADB/2 orjson\\n<данные>
+
+Версия 1 — прежний database.json (один JSON-объект без заголовка), версия 2 — снимок вместе с историями диалогов.
+С версии 3 истории и расход токенов живут в history_store (SQLite), а в снимке остаются пользователи и рассылки.
+Старые версии читаются прозрачно и при первом сохранении переписываются в текущем формате; исходный файл остается
+рядом с суффиксом .v<версия>.bak.
+
+Кодек выбирается настройкой DB_CODEC: json (стандартная библиотека), orjson и msgpack (если установлены)
+или auto — orjson при наличии, иначе json. Для отладки и отката снимок можно выгрузить в прежний формат;
+истории и расход токенов снимка v3 берутся из базы историй рядом с ним (или указанной в --history):
+
+	python snapshot.py database.json --legacy database.v1.json
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+
+from config import DB_CODEC
+from records import Store
+
+try:
+	import orjson
+except ImportError:  # необязательная зависимость
+	orjson = None
+
+try:
+	import msgpack
+except ImportError:  # необязательная зависимость
+	msgpack = None
+
+MAGIC = b"UMADB/"
+SNAPSHOT_VERSION = 3
+LEGACY_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+class SnapshotError(Exception):
+	"""Снимок нельзя прочитать этой версией бота"""
+
+class JsonCodec:
+	name = "json"
+
+	@staticmethod
+	def dumps(obj) -> bytes:
+		return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+	@staticmethod
+	def loads(data: bytes):
+		return json.loads(data)
+
+class OrjsonCodec:
+	name = "orjson"
+
+	@staticmethod
+	def dumps(obj) -> bytes:
+		return orjson.dumps(obj)
+
+	@staticmethod
+	def loads(data: bytes):
+		return orjson.loads(data)
+
+class MsgpackCodec:
+	name = "msgpack"
+
+	@staticmethod
+	def dumps(obj) -> bytes:
+		return msgpack.packb(obj, use_bin_type=True)
+
+	@staticmethod
+	def loads(data: bytes):
+		return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+CODECS = {"json": JsonCodec, "orjson": OrjsonCodec, "msgpack": MsgpackCodec}
+_MODULES = {"json": json, "orjson": orjson, "msgpack": msgpack}
+
+def available_codecs() -> list[str]:
+	return [name for name in CODECS if _MODULES[name] is not None]
+
+def get_codec(name: str = DB_CODEC):
+	"""Кодек по имени; auto — orjson, если установлен, иначе стандартный json"""
+	if name == "auto":
+		name = "orjson" if orjson is not None else "json"
+	if name not in CODECS:
+		raise ValueError(f"Неизвестный кодек базы: {name} (доступны: {', '.join(available_codecs())})")
+	if _MODULES[name] is None:
+		raise SnapshotError(f"Кодек {name} не установлен: pip install {name}")
+	return CODECS[name]
+
+@contextmanager
+def _gc_paused():
+	"""Сотни тысяч новых объектов раз за разом запускают сборщик циклов, и каждый проход обходит растущую базу;
+	на время загрузки он выключается (в ней нет циклических ссылок)"""
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if enabled:
+			gc.enable()
+
+def read(path: str) -> tuple[Store, int]:
+	"""Читает снимок или прежний database.json. Возвращает данные и версию формата файла"""
+	with open(path, "rb") as f:
+		raw = f.read()
+	if not raw.startswith(MAGIC):
+		with _gc_paused():
+			return Store.from_legacy(json.loads(raw)), LEGACY_VERSION
+	header, _, payload = raw.partition(b"\n")
+	try:
+		version_text, codec_name = header[len(MAGIC):].decode("ascii").split(" ", 1)
+		version = int(version_text)
+	except ValueError:
+		raise SnapshotError(f"Поврежденный заголовок снимка: {header[:64]!r}")
+	if version > SNAPSHOT_VERSION:
+		raise SnapshotError(f"Снимок версии {version} новее поддерживаемой ({SNAPSHOT_VERSION}); обновите бота")
+	codec = get_codec(codec_name)
+	with _gc_paused():
+		return Store.from_rows(codec.loads(payload)), version
+
+def write(path: str, store: Store, codec=None) -> None:
+	"""Атомарно записывает снимок: временный файл и os.replace, поэтому сбой посреди записи не портит базу"""
+	codec = codec or get_codec()
+	header = MAGIC + f"{SNAPSHOT_VERSION} {codec.name}\n".encode("ascii")
+	tmp_path = path + ".tmp"
+	with open(tmp_path, "wb") as f:
+		f.write(header)
+		f.write(codec.dumps(store.to_rows()))
+	os.replace(tmp_path, path)
+
+def backup_legacy(path: str, version: int = LEGACY_VERSION) -> str:
+	"""Сохраняет копию файла прежнего формата до того, как его перезапишет снимок"""
+	backup_path = path + f".v{version}.bak"
+	if not os.path.exists(backup_path):
+		shutil.copy2(path, backup_path)
+		logger.info(f"База {path} будет переведена в формат снимка v{SNAPSHOT_VERSION}; копия прежнего файла — {backup_path}")
+	return backup_path
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Просмотр и выгрузка снимков базы Uma Bot")
+	parser.add_argument("path", help="файл базы (снимок или прежний database.json)")
+	parser.add_argument("--legacy", metavar="OUT", help="выгрузить в прежний формат database.json")
+	parser.add_argument("--codec", choices=sorted(CODECS), help="перезаписать снимок другим кодеком")
+	parser.add_argument("--history", help="база историй для --legacy (по умолчанию — рядом со снимком)")
+	args = parser.parse_args()
+
+	store, version = read(args.path)
+	print(f"{args.path}: формат v{version}, пользователей {len(store.users)}, диалогов {len(store.conversations)}")
+	if args.legacy:
+		if version >= SNAPSHOT_VERSION:
+			# С версии 3 истории не в снимке: без базы историй выгрузка молча потеряла бы их
+			import history_store
+			history_path = args.history or history_store.default_path(args.path)
+			if not os.path.exists(history_path):
+				parser.error(f"не найдена база историй {history_path}; укажите ее через --history")
+			history = history_store.HistoryStore(history_path)
+			try:
+				store.conversations, store.usage = history.export()
+			finally:
+				history.close()
+			print(f"{history_path}: диалогов {len(store.conversations)}, пользователей с расходом токенов {len(store.usage)}")
+		with open(args.legacy, "w", encoding="utf-8") as f:
+			json.dump(store.to_legacy(), f, ensure_ascii=False, indent=2)
+	if args.codec:
+		if version < SNAPSHOT_VERSION:
+			backup_legacy(args.path, version)
+		write(args.path, store, get_codec(args.codec))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,53 @@
+import pytest
+
+from audio_chunking import SEGMENT_PLACEHOLDER, plan_segments, stitch_transcripts
+
+@pytest.mark.parametrize("duration, expected", [
+	# Не длиннее отрезка — один отрезок на всю длительность
+	(30.0, [(0.0, 30.0)]),
+	(599.9, [(0.0, 599.9)]),
+	(600.0, [(0.0, 600.0)]),
+	# Чуть длиннее — второй отрезок начинается за перекрытие до конца первого
+	(600.5, [(0.0, 600.0), (595.0, 5.5)]),
+	(1195.0, [(0.0, 600.0), (595.0, 600.0)]),
+	(1195.1, [(0.0, 600.0), (595.0, 600.0), (1190.0, 5.1)]),
+	(1800.0, [(0.0, 600.0), (595.0, 600.0), (1190.0, 600.0), (1785.0, 15.0)]),
+])
+def test_plan_segments(duration, expected):
+	segments = plan_segments(duration, segment_seconds=600, overlap_seconds=5)
+	assert segments == [pytest.approx(segment) for segment in expected]
+	# Отрезки покрывают всю длительность, соседние перекрываются ровно на overlap
+	assert segments[0][0] == 0
+	assert segments[-1][0] + segments[-1][1] == pytest.approx(duration)
+	for (start, length), (next_start, _) in zip(segments, segments[1:]):
+		assert start + length - next_start == pytest.approx(5)
+
+@pytest.mark.parametrize("parts, expected", [
+	(["один два три"], "один два три"),
+	# Повтор на стыке убирается без учета регистра и пунктуации
+	(["раз два три четыре", "три четыре пять шесть"], "раз два три четыре пять шесть"),
+	(["Это было вчера.", "вчера, и сегодня"], "Это было вчера. и сегодня"),
+	# Без повтора — простая склейка
+	(["раз два", "три четыре"], "раз два три четыре"),
+	# Повтор ищется только в пределах max_overlap_words
+	(["a " * 50 + "b", "b c"], " ".join(["a"] * 50 + ["b", "c"])),
+	# Пустые отрезки (тишина) пропускаются
+	(["раз два", "", "два три"], "раз два три"),
+	([], ""),
+])
+def test_stitch_removes_seam_repeats(parts, expected):
+	assert stitch_transcripts(parts) == expected
+
+@pytest.mark.parametrize("parts, expected", [
+	(["раз два", None, "пять шесть"], f"раз два {SEGMENT_PLACEHOLDER} пять шесть"),
+	([None, "три четыре"], f"{SEGMENT_PLACEHOLDER} три четыре"),
+	(["раз два", None], f"раз два {SEGMENT_PLACEHOLDER}"),
+	# Несколько нераспознанных отрезков подряд — один пропуск
+	(["раз", None, None, "шесть"], f"раз {SEGMENT_PLACEHOLDER} шесть"),
+	# Метка не теряется рядом с пунктуацией: у нее нет слов, которые совпали бы на стыке
+	(["привет –", None, "– мир"], f"привет – {SEGMENT_PLACEHOLDER} – мир"),
+	# После пропуска повтор не ищется: начало отрезка перекрывается с потерянным отрезком
+	(["раз два", None, "два три"], f"раз два {SEGMENT_PLACEHOLDER} два три"),
+])
+def test_stitch_marks_failed_segments(parts, expected):
+	assert stitch_transcripts(parts) == expected
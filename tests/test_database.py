@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+import database
+from database import Database
+
+class _Clock:
+	day = datetime(2026, 1, 5, 12, 0)
+
+	@classmethod
+	def now(cls):
+		return cls.day
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+	_Clock.day = datetime(2026, 1, 5, 12, 0)
+	monkeypatch.setattr(database, "datetime", _Clock)
+	db = Database(str(tmp_path / "database.json"))
+	yield db
+	db.close()
+
+def test_usage_is_saved_on_record(db):
+	db.record_usage(1, "m", 100, 20, 10)
+	db.record_usage(1, "m", 5, 5)
+	reopened = Database(db.db_file)
+	try:
+		assert reopened.get_user_tokens_today(1) == 130
+	finally:
+		reopened.close()
+
+def test_only_current_day_is_kept_in_memory(db):
+	db.record_usage(1, "m", 100, 20)
+	db.record_usage(2, "m", 50, 5)
+	_Clock.day = datetime(2026, 1, 6, 0, 1)
+	assert db.get_user_tokens_today(1) == 0
+	assert db.usage == {}
+	db.record_usage(1, "m", 7, 3)
+	assert db.usage == {1: {"2026-01-06": {"m": {
+		"requests": 1, "prompt_tokens": 7, "completion_tokens": 3, "cached_tokens": 0,
+	}}}}
+	assert db.get_usage_statistics()["top_users"] == [(1, 10)]
+	# Прошлые дни остаются на диске
+	db.flush()
+	_, usage = db.history.export()
+	assert {user_id: sorted(days) for user_id, days in usage.items()} == {
+		1: ["2026-01-05", "2026-01-06"],
+		2: ["2026-01-05"],
+	}
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from delivery import ResponseDelivery
+
+class FakeBot:
+	"""Заглушка aiogram.Bot: записывает отправленные сообщения; send_message ждет gate и может падать"""
+
+	def __init__(self, fail: bool = False) -> None:
+		self.sent: list[tuple[int, str]] = []
+		self.gate = asyncio.Event()
+		self.gate.set()
+		self.fail = fail
+
+	async def send_chat_action(self, chat_id, action) -> None:
+		pass
+
+	async def send_message(self, chat_id, text, reply_markup=None) -> None:
+		await self.gate.wait()
+		if self.fail:
+			raise RuntimeError("Telegram недоступен")
+		self.sent.append((chat_id, text))
+
+async def _no_placeholder():
+	return None
+
+def _respond(delivery, user_id, response, persisted, message_type="text"):
+	async def generate():
+		return response
+	return delivery.respond(
+		user_id, user_id, "typing", placeholder=_no_placeholder(), generate=generate,
+		persist=persisted.append, message_type=message_type,
+	)
+
+def test_persist_after_send():
+	async def scenario():
+		bot = FakeBot()
+		bot.gate.clear()
+		delivery = ResponseDelivery(bot)
+		persisted = []
+		task = asyncio.create_task(_respond(delivery, 1, "ответ", persisted))
+		for _ in range(5):
+			await asyncio.sleep(0)
+		# Ответ готов, но еще не отправлен: ход не сохранен, следующий запрос его ждет
+		assert persisted == [] and 1 in delivery._pending_persist
+		waiter = asyncio.create_task(delivery.wait_persisted(1))
+		await asyncio.sleep(0)
+		assert not waiter.done()
+		bot.gate.set()
+		await task
+		await asyncio.wait_for(waiter, timeout=1)
+		return bot, delivery, persisted
+
+	bot, delivery, persisted = asyncio.run(scenario())
+	assert bot.sent == [(1, "ответ")]
+	assert persisted == ["ответ"]
+	assert delivery._pending_persist == {}
+
+def test_persist_when_send_fails():
+	async def scenario():
+		delivery = ResponseDelivery(FakeBot(fail=True))
+		persisted = []
+		with pytest.raises(RuntimeError):
+			await _respond(delivery, 1, "ответ", persisted)
+		await asyncio.wait_for(delivery.wait_persisted(1), timeout=1)
+		return delivery, persisted
+
+	delivery, persisted = asyncio.run(scenario())
+	assert persisted == ["ответ"]
+	assert delivery._pending_persist == {}
+
+def test_generation_error_is_not_persisted():
+	async def scenario():
+		delivery = ResponseDelivery(FakeBot())
+		persisted = []
+
+		async def generate():
+			raise ValueError("модель недоступна")
+
+		with pytest.raises(ValueError):
+			await delivery.respond(1, 1, "typing", _no_placeholder(), generate, persisted.append)
+		await asyncio.wait_for(delivery.wait_persisted(1), timeout=1)
+		return persisted
+
+	assert asyncio.run(scenario()) == []
+
+def test_long_reply_parts_are_sent_in_order():
+	async def scenario():
+		bot = FakeBot()
+		delivery = ResponseDelivery(bot)
+		response = "\n\n".join(f"абзац {i} " + "слово " * 500 for i in range(3))
+		await _respond(delivery, 1, response, [])
+		return bot
+
+	bot = asyncio.run(scenario())
+	assert [text.split()[:2] for _, text in bot.sent] == [["абзац", str(i)] for i in range(3)]
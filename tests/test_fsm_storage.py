@@ -0,0 +1,86 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import fsm_storage
+from fsm_storage import StateStorage
+
+@pytest.fixture
+def path(tmp_path):
+	return str(tmp_path / "fsm_states.json")
+
+def test_state_survives_restart(path):
+	async def scenario():
+		await StateStorage(path).set_state(1, "waiting_broadcast_message")
+		return await StateStorage(path).get_state(1)
+
+	assert asyncio.run(scenario()) == "waiting_broadcast_message"
+
+def test_state_expires(path):
+	async def scenario():
+		storage = StateStorage(path, ttl=60)
+		await storage.set_state(1, "short", ttl=0.05)
+		await storage.set_state(2, "long")
+		assert await storage.get_state(1) == "short"
+		await asyncio.sleep(0.1)
+		return storage, await storage.get_state(1), await storage.get_state(2)
+
+	storage, expired, kept = asyncio.run(scenario())
+	assert (expired, kept) == (None, "long")
+	# Просроченное состояние удалено и из файла
+	with open(path, encoding="utf-8") as f:
+		assert list(json.load(f)) == ["2"]
+
+def test_expired_state_in_file_is_ignored(path):
+	with open(path, "w", encoding="utf-8") as f:
+		json.dump({"1": ["old", time.time() - 1]}, f)
+	assert asyncio.run(StateStorage(path).get_state(1)) is None
+
+def test_reload_after_other_writer(path):
+	async def scenario():
+		first = StateStorage(path, reload_interval=0)
+		second = StateStorage(path, reload_interval=0)
+		await second.set_state(1, "waiting_schedule_time")
+		seen = [await first.get_state(1)]
+		await second.clear_state(1)
+		seen.append(await first.get_state(1))
+		# Запись одного процесса не затирает состояние, заданное другим
+		await first.set_state(2, "waiting_broadcast_message")
+		await second.set_state(3, "waiting_schedule_time")
+		seen.append((await second.get_state(2), await first.get_state(3)))
+		return seen
+
+	assert asyncio.run(scenario()) == [
+		"waiting_schedule_time", None, ("waiting_broadcast_message", "waiting_schedule_time"),
+	]
+
+def test_reload_is_throttled(path):
+	async def scenario():
+		first = StateStorage(path, reload_interval=60)
+		await first.get_state(1)  # следующая проверка файла — через минуту
+		await StateStorage(path).set_state(1, "new")
+		return await first.get_state(1)
+
+	assert asyncio.run(scenario()) is None
+
+@pytest.mark.skipif(fsm_storage.fcntl is None, reason="flock недоступен")
+def test_file_lock_does_not_block_event_loop(path):
+	storage = StateStorage(path)
+
+	async def scenario():
+		with open(path + ".lock", "a") as lock_file:
+			# Блокировку держит "другой процесс"
+			fsm_storage.fcntl.flock(lock_file, fsm_storage.fcntl.LOCK_EX)
+			write = asyncio.create_task(storage.set_state(1, "state"))
+			ticks = 0
+			for _ in range(5):
+				await asyncio.sleep(0.01)
+				ticks += 1
+			assert not write.done()
+			fsm_storage.fcntl.flock(lock_file, fsm_storage.fcntl.LOCK_UN)
+		await asyncio.wait_for(write, timeout=1)
+		return ticks, await storage.get_state(1)
+
+	assert asyncio.run(scenario()) == (5, "state")
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from groq_client import GroqClient
+from media_cache import MediaCache
+
+def _history(text: str) -> list:
+	return [{"message": {"text": text, "type": "text"}, "response": f"ответ на {text}"}]
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	client = GroqClient()
+	client.media_cache = MediaCache(str(tmp_path / "cache"))
+	client.prompts = []
+
+	async def fetch_file(url, file_unique_id=None):
+		return b"jpeg"
+
+	async def complete(operation, model, messages, user_id=None, **params):
+		client.prompts.append(messages)
+		reply = f"ответ {len(client.prompts)} для {user_id}"
+		return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+	monkeypatch.setattr(client, "_fetch_file", fetch_file)
+	monkeypatch.setattr(client, "_complete", complete)
+	return client
+
+def test_same_image_from_two_users_is_not_shared(client):
+	first = asyncio.run(client.process_image_message(
+		"https://x/1.jpg", "что это?", _history("секрет первого"), file_unique_id="AQAD1", user_id=1,
+	))
+	second = asyncio.run(client.process_image_message(
+		"https://x/1.jpg", "что это?", _history("вопрос второго"), file_unique_id="AQAD1", user_id=2,
+	))
+	assert first != second
+	assert len(client.prompts) == 2
+	second_prompt = str(client.prompts[1])
+	assert "вопрос второго" in second_prompt and "секрет первого" not in second_prompt
+
+def test_same_image_and_history_is_cached(client):
+	for _ in range(2):
+		reply = asyncio.run(client.process_image_message(
+			"https://x/1.jpg", "", _history("привет"), file_unique_id="AQAD1", user_id=1,
+		))
+	assert reply == "ответ 1 для 1"
+	assert len(client.prompts) == 1
+
+def test_album_result_depends_on_history(client):
+	urls, ids = ["https://x/1.jpg", "https://x/2.jpg"], ["AQAD1", "AQAD2"]
+	asyncio.run(client.process_multiple_images_message(urls, "", _history("раз"), file_unique_ids=ids, user_id=1))
+	asyncio.run(client.process_multiple_images_message(urls, "", _history("два"), file_unique_ids=ids, user_id=1))
+	asyncio.run(client.process_multiple_images_message(urls, "", _history("два"), file_unique_ids=ids, user_id=2))
+	assert len(client.prompts) == 3
@@ -0,0 +1,81 @@
+import pytest
+
+from history_store import HistoryStore
+from records import ConversationEntry
+
+def _entry(text: str) -> ConversationEntry:
+	return ConversationEntry.from_message({"text": text, "type": "text"}, f"ответ {text}")
+
+@pytest.fixture
+def store(tmp_path):
+	store = HistoryStore(str(tmp_path / "history.sqlite3"), max_users=1, max_entries=4)
+	yield store
+	store.close()
+
+def _texts(entries) -> list[str]:
+	return [entry.message()["text"] for entry in entries]
+
+def test_evicted_user_is_read_back_from_disk(store):
+	for i in range(3):
+		store.append(1, _entry(f"a{i}"))
+	store.append(2, _entry("b0"))  # max_users=1: пользователь 1 вытеснен из кэша
+	assert list(store._cache) == [2]
+	assert _texts(store.get(1)) == ["a0", "a1", "a2"]
+	assert store.last(1)[0] == 3
+
+def test_history_is_trimmed_on_disk(store):
+	for i in range(6):
+		store.append(1, _entry(f"a{i}"))
+	store.close()
+	reopened = HistoryStore(store.path, max_entries=4)
+	try:
+		assert _texts(reopened.get(1)) == ["a2", "a3", "a4", "a5"]
+		assert reopened.last(1)[0] == 6
+	finally:
+		reopened.close()
+
+@pytest.mark.parametrize("before, limit, expected", [
+	(None, None, ["a2", "a3", "a4", "a5"]),
+	(None, 2, ["a4", "a5"]),
+	(6, None, ["a2", "a3", "a4"]),
+	(5, 1, ["a3"]),
+	(3, None, []),
+	(1, None, []),
+])
+def test_get_before(store, before, limit, expected):
+	for i in range(6):
+		store.append(1, _entry(f"a{i}"))
+	assert _texts(store.get(1, limit=limit, before=before)) == expected
+
+def test_replace_response_by_seq(store):
+	for i in range(3):
+		store.append(1, _entry(f"a{i}"))
+	store.append(2, _entry("b0"))
+	assert store.replace_response(1, 2, "новый")
+	assert [entry.response for entry in store.get(1)] == ["ответ a0", "новый", "ответ a2"]
+	assert not store.replace_response(1, 4, "нет такой записи")
+
+def test_numbering_continues_after_clear_and_eviction(store):
+	for i in range(5):
+		store.append(1, _entry(f"a{i}"))
+	assert store.clear(1)
+	store.append(2, _entry("b0"))  # вытесняет пользователя 1 вместе с номером в кэше
+	store.append(1, _entry("new"))
+	assert store.last(1)[0] == 6
+	# Устаревший номер хода до очистки не затирает новый ход
+	assert not store.replace_response(1, 5, "устаревший")
+	assert not store.replace_response(1, 1, "устаревший")
+	assert [entry.response for entry in store.get(1)] == ["ответ new"]
+
+def test_numbering_continues_after_clear_and_restart(store):
+	for i in range(5):
+		store.append(1, _entry(f"a{i}"))
+	store.clear(1)
+	store.close()
+	reopened = HistoryStore(store.path)
+	try:
+		assert reopened.get(1) == []
+		reopened.append(1, _entry("new"))
+		assert reopened.last(1)[0] == 6
+	finally:
+		reopened.close()
@@ -0,0 +1,85 @@
+import pytest
+
+from html_sanitizer import TELEGRAM_MESSAGE_LIMIT, sanitize_html, split_html_message, utf16_len
+
+@pytest.mark.parametrize("text, expected", [
+	# Незакрытые и лишние закрывающие теги
+	("<b>open", "<b>open</b>"),
+	("text</i> end", "text end"),
+	("<b><i>both</b>", "<b><i>both</i></b>"),
+	# Перепутанная вложенность: лишние теги закрываются и открываются снова
+	("<b>bold <i>both</b> italic</i>", "<b>bold <i>both</i></b><i> italic</i>"),
+	# Одиночные спецсимволы экранируются
+	("a < b && c > d", "a &lt; b &amp;&amp; c &gt; d"),
+	# Неподдерживаемые теги и небезопасные ссылки отбрасываются, текст остается
+	("<script>x</script><div>y</div>", "xy"),
+	('<a href="javascript:alert(1)">bad</a>', "bad"),
+	('<a href="https://umaai.site" target="_blank">ok</a>', '<a href="https://umaai.site">ok</a>'),
+	("<h2>Title</h2>", "<b>Title</b>"),
+	('<span class="tg-spoiler">s</span>', "<tg-spoiler>s</tg-spoiler>"),
+	("line<br>next", "line\nnext"),
+	# Внутри кода теги — это текст
+	('<pre><code class="language-py">x = <b>1</b></code></pre>', '<pre><code class="language-py">x = &lt;b&gt;1&lt;/b&gt;</code></pre>'),
+	("<code>a<code>b</code>", "<code>a&lt;code&gt;b</code>"),
+	# Сущности: поддерживаемые Telegram остаются, остальные раскрываются
+	("&amp;&lt;&#39;&nbsp;", "&amp;&lt;&#39;\xa0"),
+])
+def test_sanitize(text, expected):
+	assert sanitize_html(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+	("Hello <b", "Hello "),
+	("Hello </blockq", "Hello "),
+	("Hello <b>world</b> &am", "Hello <b>world</b> "),
+	("Hello <b>wor", "Hello <b>wor</b>"),
+	("a < b", "a &lt; b"),
+])
+def test_sanitize_partial(text, expected):
+	assert sanitize_html(text, partial=True) == expected
+
+def test_sanitize_keeps_incomplete_tail_without_partial():
+	assert sanitize_html("Hello <b") == "Hello &lt;b"
+
+def test_sanitize_is_idempotent():
+	text = '<b>bold <i>both</b> <a href="https://x.y">link</a> <pre><code>1 < 2</code></pre> & <unknown>'
+	once = sanitize_html(text)
+	assert sanitize_html(once) == once
+
+def test_split_short_text_is_single_part():
+	assert split_html_message("<b>short</b>") == ["<b>short</b>"]
+
+def test_split_keeps_tags_balanced():
+	text = "<b>" + " ".join(f"слово{i}" for i in range(2000)) + "</b>"
+	parts = split_html_message(text)
+	assert len(parts) > 1
+	for part in parts:
+		assert utf16_len(part) <= TELEGRAM_MESSAGE_LIMIT + len("<b></b>")
+		assert part.startswith("<b>") and part.endswith("</b>")
+		assert sanitize_html(part) == part
+
+def test_split_pre_across_boundary():
+	text = "Код:\n<pre>" + "line\n" * 30 + "</pre>\nКонец"
+	parts = split_html_message(text, limit=40)
+	assert len(parts) > 2
+	code_parts = [part for part in parts if "line" in part]
+	for part in code_parts:
+		assert part.count("<pre>") == part.count("</pre>") == 1
+		assert sanitize_html(part) == part
+	assert sum(part.count("line") for part in parts) == 30
+
+def test_split_prefers_paragraph_breaks():
+	first = "а" * 3000
+	second = "б" * 3000
+	assert split_html_message(f"{first}\n\n{second}") == [first, second]
+
+def test_split_counts_utf16_and_keeps_surrogate_pairs():
+	# Каждый эмодзи — две единицы UTF-16: 3000 эмодзи не влезают в одно сообщение
+	text = "😀" * 3000
+	parts = split_html_message(text)
+	assert [utf16_len(part) for part in parts] == [TELEGRAM_MESSAGE_LIMIT, 6000 - TELEGRAM_MESSAGE_LIMIT]
+	assert "".join(parts) == text
+
+def test_split_counts_entities_as_visible_characters():
+	text = "&amp;" * 5000
+	parts = split_html_message(text)
+	assert [part.count("&amp;") for part in parts] == [TELEGRAM_MESSAGE_LIMIT, 5000 - TELEGRAM_MESSAGE_LIMIT]
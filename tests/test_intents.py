@@ -0,0 +1,56 @@
+import pytest
+
+from intents import INTENTS, IntentMatcher
+from search import SearchService, StubSearchBackend
+
+@pytest.mark.parametrize("text, expected", [
+	("Какая погода в Москве?", {"weather"}),
+	("курс доллара к рублю", {"rates"}),
+	# Фраза выигрывает у своих слов: "последние новости" — только новости
+	("последние новости", {"news"}),
+	("который час", {"datetime"}),
+	("какое сегодня число", {"search", "now"}),
+	("ПРИВЕТ", {"greeting"}),
+	("Ёжик", set()),
+	# Слово целиком: "арт" не находится в "артерия", "код" — в "кодекс"
+	("артерия и кодекс", set()),
+	("нарисуй логотип", {"generate_verb", "generate_image"}),
+	("упомяни Stable Diffusion", {"moderation_competitor"}),
+])
+def test_match(text, expected):
+	assert INTENTS.match(text) == expected
+
+def test_term_syntax():
+	matcher = IntentMatcher({"exact": ("кот",), "ending": ("погод~",), "prefix": ("новост*",), "phrase": ("добр~ утро",)})
+	assert matcher.match("кота") == set()
+	assert matcher.match("погодой") == {"ending"}
+	assert matcher.match("новостной") == {"prefix"}
+	assert matcher.match("доброе-утро") == {"phrase"}
+
+def test_find_all_positions():
+	text = "нарисуй картинку"
+	assert [(set(found), text[start:end]) for found, start, end in INTENTS.find_all(text)] == [
+		({"generate_verb"}, "нарисуй"),
+		({"generate_image"}, "картинку"),
+	]
+
+@pytest.mark.parametrize("text, expected", [
+	("Привет", True),
+	("привет, добрый день!", True),
+	("привет, как дела?", False),
+	("", False),
+])
+def test_covers(text, expected):
+	assert INTENTS.covers(text, ("greeting",)) is expected
+
+@pytest.mark.parametrize("query, query_class", [
+	("курс евро", "rates"),
+	("погода завтра", "weather"),
+	("новости спорта", "news"),
+	("который час", "datetime"),
+	("какое сегодня число", "datetime"),
+	("что сейчас в кино", "datetime"),
+	("рецепт борща", "general"),
+])
+def test_search_classify(query, query_class):
+	assert SearchService(StubSearchBackend()).classify(query) == query_class
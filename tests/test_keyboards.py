@@ -0,0 +1,24 @@
+import pytest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import keyboards
+
+KEYBOARDS = [getattr(keyboards, name) for name in dir(keyboards) if name.endswith("_KEYBOARD")]
+
+@pytest.mark.parametrize("keyboard", KEYBOARDS)
+def test_shared_keyboard_cannot_be_changed(keyboard):
+	with pytest.raises(Exception):
+		keyboard.inline_keyboard = []
+	with pytest.raises(AttributeError):
+		keyboard.inline_keyboard.append(())
+	with pytest.raises(AttributeError):
+		keyboard.inline_keyboard[0].append(None)
+	with pytest.raises(Exception):
+		keyboard.inline_keyboard[0][0].text = "changed"
+
+def test_frozen_keyboard_serializes_like_regular():
+	frozen = keyboards.get_chat_keyboard()
+	regular = InlineKeyboardMarkup(inline_keyboard=[
+		[InlineKeyboardButton(**button.model_dump()) for button in row] for row in frozen.inline_keyboard
+	])
+	assert frozen.model_dump_json(exclude_none=True) == regular.model_dump_json(exclude_none=True)
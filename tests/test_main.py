@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+import main
+from test_delivery import FakeBot
+
+class _ClosableClient:
+	def __init__(self) -> None:
+		self.closed = 0
+
+	def close(self) -> None:
+		self.closed += 1
+
+@pytest.fixture
+def make_bot(tmp_path, monkeypatch):
+	"""UmaBot с файлами во временном каталоге; создается внутри event loop теста"""
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setattr(main, "TELEGRAM_BOT_TOKEN", "1:test")
+	return main.UmaBot
+
+def test_shutdown_closes_groq_client(make_bot):
+	async def scenario():
+		bot = make_bot()
+		sdk = _ClosableClient()
+		bot.groq_client._client = sdk
+		await bot.shutdown(timeout=1)
+		return bot, sdk
+
+	bot, sdk = asyncio.run(scenario())
+	assert sdk.closed == 1
+	assert bot.groq_client._client is None
+
+def test_groq_close_without_client_is_noop(make_bot):
+	async def scenario():
+		bot = make_bot()
+		await bot.groq_client.close()
+		await bot.shutdown(timeout=1)
+
+	asyncio.run(scenario())
+
+def _stub_text_model(bot) -> list:
+	"""Модель отвечает "ответ N" и запоминает, какую историю видел каждый ход"""
+	seen = []
+
+	async def answer_text(text, conversation_history=None, use_browser_search=False, user_id=None):
+		seen.append([entry["message"]["text"] for entry in conversation_history])
+		return f"ответ {len(seen)}"
+
+	bot.groq_client.answer_text = answer_text
+	return seen
+
+def _text_turn(bot, text: str):
+	async def no_placeholder():
+		return None
+	return bot.delivery.respond(
+		1, 1, "typing", placeholder=no_placeholder(),
+		generate=lambda: bot._process_user_message(1, "text", text=text),
+		persist=bot._persist_turn(1, {"text": text, "type": "text"}),
+	)
+
+def test_next_turn_waits_for_previous_reply_to_be_persisted(make_bot):
+	async def scenario():
+		bot = make_bot()
+		seen = _stub_text_model(bot)
+		fake = FakeBot()
+		fake.gate.clear()  # отправка первого ответа задерживается
+		bot.delivery.bot = fake
+		first = asyncio.create_task(_text_turn(bot, "раз"))
+		second = asyncio.create_task(_text_turn(bot, "два"))
+		for _ in range(10):
+			await asyncio.sleep(0)
+		# Блокировка первого хода уже отпущена, но второй ждет, пока первый ответ не отправлен и не сохранен
+		assert len(seen) == 1 and not second.done()
+		fake.gate.set()
+		await asyncio.gather(first, second)
+		history = bot.database.get_conversation_history(1)
+		await bot.shutdown(timeout=1)
+		return seen, fake, history
+
+	seen, fake, history = asyncio.run(scenario())
+	assert seen == [[], ["раз"]]
+	assert [text for _, text in fake.sent] == ["ответ 1", "ответ 2"]
+	assert [(entry["message"]["text"], entry["response"]) for entry in history] == [("раз", "ответ 1"), ("два", "ответ 2")]
+
+def test_turn_is_persisted_when_sending_fails(make_bot):
+	async def scenario():
+		bot = make_bot()
+		seen = _stub_text_model(bot)
+		bot.delivery.bot = FakeBot(fail=True)
+		with pytest.raises(RuntimeError):
+			await _text_turn(bot, "раз")
+		bot.delivery.bot = FakeBot()
+		await _text_turn(bot, "два")
+		await bot.shutdown(timeout=1)
+		return seen
+
+	assert asyncio.run(scenario()) == [[], ["раз"]]
+
+def test_quota_blocks_turn_and_is_not_persisted(make_bot, monkeypatch):
+	monkeypatch.setattr(main, "USER_DAILY_TOKEN_QUOTA", 100)
+	monkeypatch.setattr(main, "ADMIN_USER_ID", 99)
+
+	async def scenario():
+		bot = make_bot()
+		seen = _stub_text_model(bot)
+		bot.delivery.bot = FakeBot()
+		bot.database.record_usage(1, "m", 80, 20)
+		response = await _text_turn(bot, "раз")
+		history = bot.database.get_conversation_history(1)
+		await bot.shutdown(timeout=1)
+		return seen, response, history
+
+	seen, response, history = asyncio.run(scenario())
+	assert response is main.QUOTA_EXCEEDED_TEXT
+	assert seen == []  # модель не вызывалась
+	assert history == []
+
+def test_quota_does_not_apply_to_admin(make_bot, monkeypatch):
+	monkeypatch.setattr(main, "USER_DAILY_TOKEN_QUOTA", 100)
+	monkeypatch.setattr(main, "ADMIN_USER_ID", 1)
+
+	async def scenario():
+		bot = make_bot()
+		seen = _stub_text_model(bot)
+		bot.delivery.bot = FakeBot()
+		bot.database.record_usage(1, "m", 500, 0)
+		await _text_turn(bot, "раз")
+		await bot.shutdown(timeout=1)
+		return seen
+
+	assert len(asyncio.run(scenario())) == 1
+
+def test_persist_turn_skips_quota_text(make_bot):
+	async def scenario():
+		bot = make_bot()
+		bot._persist_turn(1, {"text": "раз", "type": "text"})(main.QUOTA_EXCEEDED_TEXT)
+		bot._persist_turn(1, {"text": "два", "type": "text"})("ответ")
+		history = bot.database.get_conversation_history(1)
+		await bot.shutdown(timeout=1)
+		return history
+
+	assert [entry["message"]["text"] for entry in asyncio.run(scenario())] == ["два"]
@@ -0,0 +1,136 @@
+import asyncio
+
+from media_groups import MediaGroupAggregator
+
+DEBOUNCE = 0.05
+
+class _Recorder:
+	def __init__(self) -> None:
+		self.flushes: list[tuple[str, list, object, float]] = []
+
+	async def __call__(self, group_id, items, context) -> None:
+		self.flushes.append((group_id, list(items), context, asyncio.get_running_loop().time()))
+
+def _aggregator(recorder, **kwargs) -> MediaGroupAggregator:
+	kwargs.setdefault("debounce", DEBOUNCE)
+	kwargs.setdefault("max_wait", 1.0)
+	return MediaGroupAggregator(recorder, **kwargs)
+
+def test_one_flush_per_group():
+	async def scenario():
+		recorder = _Recorder()
+		groups = _aggregator(recorder)
+		created = []
+		for i in range(3):
+			groups.add("g1", i, on_create=lambda: created.append("g1") or "placeholder")
+			groups.add("g2", i)
+		assert "g1" in groups
+		await asyncio.sleep(DEBOUNCE * 4)
+		return recorder, created, groups
+
+	recorder, created, groups = asyncio.run(scenario())
+	assert sorted((group_id, items, context) for group_id, items, context, _ in recorder.flushes) == [
+		("g1", [0, 1, 2], "placeholder"),
+		("g2", [0, 1, 2], None),
+	]
+	assert created == ["g1"]
+	assert "g1" not in groups
+
+def test_each_item_resets_debounce():
+	async def scenario():
+		recorder = _Recorder()
+		groups = _aggregator(recorder)
+		loop = asyncio.get_running_loop()
+		for i in range(4):
+			groups.add("g", i)
+			last_added = loop.time()
+			await asyncio.sleep(DEBOUNCE / 2)
+			assert recorder.flushes == []
+		await asyncio.sleep(DEBOUNCE * 2)
+		return recorder, last_added
+
+	recorder, last_added = asyncio.run(scenario())
+	assert len(recorder.flushes) == 1
+	assert recorder.flushes[0][1] == [0, 1, 2, 3]
+	assert recorder.flushes[0][3] >= last_added + DEBOUNCE
+
+def test_max_wait_caps_debounce():
+	async def scenario():
+		recorder = _Recorder()
+		groups = _aggregator(recorder, max_wait=DEBOUNCE * 3)
+		loop = asyncio.get_running_loop()
+		started = loop.time()
+		i = 0
+		while not recorder.flushes and loop.time() - started < 1:
+			groups.add("g", i)
+			i += 1
+			await asyncio.sleep(DEBOUNCE / 2)
+		return recorder, started
+
+	recorder, started = asyncio.run(scenario())
+	assert len(recorder.flushes) == 1
+	# Элементы приходят чаще debounce, но группа отдается по max_wait от первого элемента
+	assert recorder.flushes[0][3] - started < DEBOUNCE * 5
+
+def test_max_items_flushes_immediately():
+	async def scenario():
+		recorder = _Recorder()
+		groups = _aggregator(recorder, max_items=3)
+		for i in range(3):
+			groups.add("g", i)
+		assert "g" not in groups
+		await asyncio.sleep(0)
+		return recorder
+
+	recorder = asyncio.run(scenario())
+	assert [items for _, items, _, _ in recorder.flushes] == [[0, 1, 2]]
+
+def test_late_item_after_flush_is_dropped():
+	async def scenario():
+		recorder = _Recorder()
+		groups = _aggregator(recorder)
+		groups.add("g", 0)
+		await asyncio.sleep(DEBOUNCE * 3)
+		accepted = groups.add("g", 1)
+		await asyncio.sleep(DEBOUNCE * 3)
+		return recorder, accepted, groups
+
+	recorder, accepted, groups = asyncio.run(scenario())
+	assert accepted is False
+	assert "g" not in groups
+	assert [items for _, items, _, _ in recorder.flushes] == [[0]]
+
+def test_flush_all_processes_pending_groups_and_waits():
+	async def scenario():
+		done = []
+
+		async def on_flush(group_id, items, context):
+			await asyncio.sleep(DEBOUNCE)
+			done.append((group_id, items))
+
+		groups = MediaGroupAggregator(on_flush, debounce=10, max_wait=10)
+		groups.add("a", 1)
+		groups.add("b", 2)
+		await groups.flush_all()
+		return done
+
+	assert sorted(asyncio.run(scenario())) == [("a", [1]), ("b", [2])]
+
+def test_failing_flush_does_not_break_other_groups():
+	async def scenario():
+		done = []
+
+		async def on_flush(group_id, items, context):
+			if group_id == "bad":
+				raise RuntimeError("boom")
+			done.append(group_id)
+
+		groups = MediaGroupAggregator(on_flush, debounce=DEBOUNCE, max_wait=1.0)
+		groups.add("bad", 1)
+		groups.add("good", 2)
+		await groups.flush_all()
+		groups.add("next", 3)
+		await groups.flush_all()
+		return done
+
+	assert asyncio.run(scenario()) == ["good", "next"]
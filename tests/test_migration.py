@@ -0,0 +1,50 @@
+import json
+import sys
+
+import snapshot
+from database import Database
+from test_records import LEGACY
+
+def _legacy_database(tmp_path):
+	path = tmp_path / "database.json"
+	path.write_text(json.dumps(LEGACY, ensure_ascii=False), encoding="utf-8")
+	return path
+
+def test_legacy_database_moves_histories_and_usage(tmp_path):
+	path = _legacy_database(tmp_path)
+	original = path.read_bytes()
+
+	database = Database(str(path))
+	try:
+		conversations, usage = database.history.export()
+		assert {
+			str(user_id): [entry.to_legacy() for entry in entries] for user_id, entries in conversations.items()
+		} == LEGACY["conversations"]
+		assert usage == {int(user_id): days for user_id, days in LEGACY["usage"].items()}
+		assert database.get_conversation_history(101, limit=2) == LEGACY["conversations"]["101"][-2:]
+	finally:
+		database.close()
+
+	# Исходный файл сохранен как есть, снимок переписан в текущем формате уже без историй
+	assert (tmp_path / "database.json.v1.bak").read_bytes() == original
+	store, version = snapshot.read(str(path))
+	assert version == snapshot.SNAPSHOT_VERSION
+	assert store.conversations == {} and store.usage == {}
+	assert set(store.users) == {101, 102}
+
+def test_reopening_migrated_database_keeps_histories(tmp_path):
+	path = _legacy_database(tmp_path)
+	Database(str(path)).close()
+	database = Database(str(path))
+	try:
+		assert len(database.get_conversation_history(101, limit=50)) == len(LEGACY["conversations"]["101"])
+	finally:
+		database.close()
+
+def test_legacy_export_includes_history_store(tmp_path, monkeypatch):
+	path = _legacy_database(tmp_path)
+	Database(str(path)).close()
+	out = tmp_path / "database.v1.json"
+	monkeypatch.setattr(sys, "argv", ["snapshot.py", str(path), "--legacy", str(out)])
+	snapshot.main()
+	assert json.loads(out.read_text(encoding="utf-8")) == LEGACY
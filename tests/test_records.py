@@ -0,0 +1,100 @@
+import copy
+
+from records import ConversationEntry, MessageType, Store
+
+LEGACY = {
+	"users": {
+		"101": {
+			"username": "alice",
+			"first_name": "Alice",
+			"registration_date": "2026-01-01T10:00:00",
+			"last_activity": "2026-01-05T18:30:15",
+		},
+		"102": {
+			"username": None,
+			"first_name": "Bob",
+			"registration_date": "2026-01-02T09:00:00",
+			"last_activity": "2026-01-02T09:00:00",
+			"is_active": False,
+			"language": "ru",  # поле, о котором records не знает
+		},
+	},
+	"conversations": {
+		"101": [
+			{
+				"timestamp": "2026-01-05T18:00:00",
+				"message": {"text": "Привет", "type": "text", "timestamp": "2026-01-05T15:00:00+00:00"},
+				"response": "Здравствуйте!",
+			},
+			{
+				"timestamp": "2026-01-05T18:10:00",
+				"message": {
+					"image_url": "https://api.telegram.org/file/bot1/photo.jpg", "file_unique_id": "AQAD1",
+					"caption": "Что это?", "type": "image", "timestamp": "2026-01-05T15:10:00+00:00",
+				},
+				"response": "Кот",
+			},
+			{
+				"timestamp": "2026-01-05T18:20:00",
+				"message": {
+					"image_urls": ["https://x/1.jpg", "https://x/2.jpg"], "file_unique_ids": ["AQAD2", "AQAD3"],
+					"caption": "", "type": "images", "timestamp": "2026-01-05T15:20:00+00:00",
+				},
+				"response": "Два кота",
+			},
+			{
+				"timestamp": "2026-01-05T18:30:00",
+				"message": {
+					"audio_url": "https://x/v.ogg", "file_unique_id": "AwAD4", "type": "audio",
+					"timestamp": "2026-01-05T15:30:00+00:00",
+				},
+				"response": "Расшифровка",
+			},
+		],
+		"102": [
+			{
+				"timestamp": "2026-01-02T09:00:00",
+				"message": {"type": "sticker", "emoji": "👍", "timestamp": "2026-01-02T06:00:00+00:00"},
+				"response": "",
+			},
+		],
+	},
+	"broadcasts": [
+		{"id": 1, "message": "Новости", "scheduled_time": None, "sent": True, "created_at": "2026-01-03T12:00:00",
+		 "sent_at": "2026-01-03T12:00:05"},
+	],
+	"usage": {
+		"101": {"2026-01-05": {"openai/gpt-oss-120b": {
+			"requests": 2, "prompt_tokens": 300, "completion_tokens": 120, "cached_tokens": 64,
+		}}},
+	},
+}
+
+def test_legacy_round_trip():
+	original = copy.deepcopy(LEGACY)
+	store = Store.from_legacy(LEGACY)
+	assert store.to_legacy() == original
+	assert LEGACY == original  # исходный словарь не изменен
+
+def test_from_legacy_uses_compact_fields():
+	store = Store.from_legacy(LEGACY)
+	assert set(store.users) == {101, 102}
+	assert store.users[102].is_active is False
+	assert store.users[102].extra == {"language": "ru"}
+	entries = store.conversations[101]
+	assert [entry.type for entry in entries] == [MessageType.TEXT, MessageType.IMAGE, MessageType.IMAGES, MessageType.AUDIO]
+	assert isinstance(entries[0].created, int) and isinstance(entries[0].sent, int)
+	assert entries[2].media == ("AQAD2", "AQAD3")
+	sticker = store.conversations[102][0]
+	assert sticker.type is MessageType.OTHER
+	assert sticker.extra == {"emoji": "👍", "type": "sticker"}
+
+def test_rows_round_trip():
+	store = Store.from_legacy(LEGACY)
+	assert Store.from_rows(store.to_rows()).to_legacy() == LEGACY
+
+def test_entry_from_message_keeps_unknown_keys():
+	message = {"text": "hi", "type": "text", "reply_to": 5}
+	entry = ConversationEntry.from_message(message, "ok", created=1_700_000_000)
+	assert entry.extra == {"reply_to": 5}
+	assert entry.message() == message
@@ -0,0 +1,56 @@
+import pytest
+
+from config import ROUTER_SIMPLE_MAX_CHARS
+from router import CANNED_TEMPLATES, MessageRouter
+
+@pytest.mark.parametrize("text, route, reason", [
+	# Шаблоны: сообщение целиком — приветствие, благодарность или просьба о генерации
+	("Привет!", "template", "greeting"),
+	("добрый вечер", "template", "greeting"),
+	("Спасибо большое", "template", "thanks"),
+	("привет, спасибо", "template", "thanks"),
+	("нарисуй картинку", "template", "generate_image"),
+	("Сгенерируй музыку", "template", "generate_speech"),
+	("озвучь этот текст", "template", "generate_speech"),
+	("создай видео про котов", "template", "generate_video"),
+	# Глагол и объект порознь — не просьба о генерации
+	("сделай код для загрузки фото на сервер", "full", "complex"),
+	("сделай анализ этой песни", "full", "complex"),
+	("сделай мне расписание, фото прикреплю позже", "fast", "simple"),
+	# Приветствие внутри вопроса — не шаблон
+	("привет, как дела?", "fast", "simple"),
+	("как дела?", "fast", "simple"),
+	("Какая столица Франции?", "fast", "simple"),
+	# Сложные запросы и код — основная модель
+	("почему небо голубое?", "full", "complex"),
+	("напиши функцию сортировки", "full", "complex"),
+	("сколько будет 2+2*3", "full", "complex"),
+	("что не так с if (x) { y; }", "full", "complex"),
+	("привет, объясни рекурсию", "full", "complex"),
+	("слово " * (ROUTER_SIMPLE_MAX_CHARS // 5), "full", "long"),
+])
+def test_route(text, route, reason):
+	decision = MessageRouter(fast_model="fast", full_model="full").route(text)
+	assert (decision.route, decision.reason) == (route, reason)
+	if route == "template":
+		assert decision.model is None and decision.reply == CANNED_TEMPLATES[reason]
+	else:
+		assert decision.model == route and decision.reply is None
+
+def test_browser_search_uses_full_model():
+	decision = MessageRouter(fast_model="fast", full_model="full").route("курс доллара", use_browser_search=True)
+	assert (decision.route, decision.model, decision.reason) == ("full", "full", "search")
+
+def test_template_wins_over_browser_search():
+	decision = MessageRouter().route("привет", use_browser_search=True)
+	assert decision.route == "template"
+
+def test_long_generation_request_is_not_template():
+	text = "нарисуй картинку " + "и еще добавь деталей " * 5
+	assert MessageRouter().route(text).route != "template"
+
+def test_stats_count_routes():
+	router = MessageRouter()
+	for text in ("привет", "как дела?", "почему?"):
+		router.route(text)
+	assert router.stats == {"template": 1, "fast": 1, "full": 1}
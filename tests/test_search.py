@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from config import SEARCH_CACHE_TTL
+from search import SearchResult, SearchService, StubSearchBackend
+
+RESULTS = {
+	query: [SearchResult(title=query, url="stub://result", snippet="")]
+	for query in ("курс", "погода", "новости", "час", "сегодня", "рецепт")
+}
+
+@pytest.fixture
+def service():
+	return SearchService(StubSearchBackend(RESULTS))
+
+@pytest.mark.parametrize("query, normalized", [
+	("Курс доллара?", "курс доллара"),
+	("  курс   доллара!!! ", "курс доллара"),
+	("Всё ещё ёлка", "все еще елка"),
+])
+def test_normalize_query(query, normalized):
+	assert SearchService.normalize_query(query) == normalized
+
+@pytest.mark.parametrize("query, query_class", [
+	("курс доллара", "rates"),
+	("погода в Москве", "weather"),
+	("последние новости", "news"),
+	("который час", "datetime"),
+	("что сегодня в кино", "datetime"),
+	("рецепт борща", "general"),
+])
+def test_cache_ttl_by_class(service, query, query_class):
+	started = time.monotonic()
+	assert asyncio.run(service.get_context(query))
+	cached = service._cache.get((query_class, service.normalize_query(query)))
+	ttl = SEARCH_CACHE_TTL[query_class]
+	if ttl == 0:
+		assert cached is None
+	else:
+		assert started + ttl <= cached[0] <= time.monotonic() + ttl
+
+def test_datetime_is_never_cached(service):
+	for _ in range(3):
+		asyncio.run(service.get_context("который час"))
+	assert service.backend.calls == 3
+
+def test_equivalent_queries_share_cache(service):
+	asyncio.run(service.get_context("Курс доллара?"))
+	asyncio.run(service.get_context("курс   доллара"))
+	assert service.backend.calls == 1
+
+def test_expired_entry_is_searched_again(service):
+	asyncio.run(service.get_context("курс доллара"))
+	key = ("rates", "курс доллара")
+	service._cache[key] = (time.monotonic() - 1, service._cache[key][1])
+	asyncio.run(service.get_context("курс доллара"))
+	assert service.backend.calls == 2
+
+def _slow_search(service, monkeypatch) -> asyncio.Event:
+	release = asyncio.Event()
+
+	async def search(query):
+		service.backend.calls += 1
+		await release.wait()
+		return f"результаты: {query}"
+
+	monkeypatch.setattr(service, "_search", search)
+	return release
+
+def test_concurrent_queries_share_one_search(service, monkeypatch):
+	async def scenario():
+		release = _slow_search(service, monkeypatch)
+		tasks = [asyncio.create_task(service.get_context(query)) for query in ("курс доллара", "Курс доллара?")]
+		await asyncio.sleep(0)
+		release.set()
+		return await asyncio.gather(*tasks)
+
+	assert asyncio.run(scenario()) == ["результаты: курс доллара"] * 2
+	assert service.backend.calls == 1
+	assert service._inflight == {}
+
+def test_waiter_survives_cancelled_owner(service, monkeypatch):
+	async def scenario():
+		release = _slow_search(service, monkeypatch)
+		owner = asyncio.create_task(service.get_context("курс доллара"))
+		await asyncio.sleep(0)
+		waiter = asyncio.create_task(service.get_context("курс доллара"))
+		await asyncio.sleep(0)
+		owner.cancel()
+		await asyncio.sleep(0)
+		release.set()
+		return await asyncio.wait_for(waiter, timeout=1), owner
+
+	result, owner = asyncio.run(scenario())
+	assert result == "результаты: курс доллара"
+	assert owner.cancelled()
+	assert service.backend.calls == 2
+	assert service._inflight == {}
+
+def test_cancelled_waiter_does_not_cancel_shared_search(service, monkeypatch):
+	async def scenario():
+		release = _slow_search(service, monkeypatch)
+		owner = asyncio.create_task(service.get_context("курс доллара"))
+		await asyncio.sleep(0)
+		waiter = asyncio.create_task(service.get_context("курс доллара"))
+		await asyncio.sleep(0)
+		waiter.cancel()
+		await asyncio.sleep(0)
+		release.set()
+		return await owner, waiter
+
+	result, waiter = asyncio.run(scenario())
+	assert result == "результаты: курс доллара"
+	assert waiter.cancelled()
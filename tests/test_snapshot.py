@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+import snapshot
+from database import Database
+from records import Store
+from test_records import LEGACY
+
+@pytest.mark.parametrize("codec_name", sorted(snapshot.CODECS))
+def test_codec_round_trip(tmp_path, codec_name):
+	if codec_name not in snapshot.available_codecs():
+		pytest.skip(f"{codec_name} не установлен")
+	path = str(tmp_path / "database.json")
+	snapshot.write(path, Store.from_legacy(LEGACY), snapshot.get_codec(codec_name))
+
+	with open(path, "rb") as f:
+		assert f.readline() == f"UMADB/{snapshot.SNAPSHOT_VERSION} {codec_name}\n".encode("ascii")
+	store, version = snapshot.read(path)
+	assert version == snapshot.SNAPSHOT_VERSION
+	assert store.to_legacy() == LEGACY
+
+def test_reads_legacy_json(tmp_path):
+	path = tmp_path / "database.json"
+	path.write_text(json.dumps(LEGACY, ensure_ascii=False), encoding="utf-8")
+	store, version = snapshot.read(str(path))
+	assert version == snapshot.LEGACY_VERSION
+	assert store.to_legacy() == LEGACY
+
+def test_newer_snapshot_raises(tmp_path):
+	path = tmp_path / "database.json"
+	path.write_bytes(f"UMADB/{snapshot.SNAPSHOT_VERSION + 1} json\n{{}}".encode("ascii"))
+	with pytest.raises(snapshot.SnapshotError):
+		snapshot.read(str(path))
+
+def test_database_does_not_overwrite_newer_snapshot(tmp_path):
+	path = tmp_path / "database.json"
+	content = f"UMADB/{snapshot.SNAPSHOT_VERSION + 1} json\n{{\"future\": true}}".encode("ascii")
+	path.write_bytes(content)
+	with pytest.raises(snapshot.SnapshotError):
+		Database(str(path), history_file=str(tmp_path / "history.sqlite3"))
+	assert path.read_bytes() == content
+	assert not (tmp_path / "database.json.broken").exists()
+
+def test_corrupt_snapshot_header_raises(tmp_path):
+	path = tmp_path / "database.json"
+	path.write_bytes(b"UMADB/x\n{}")
+	with pytest.raises(snapshot.SnapshotError):
+		snapshot.read(str(path))
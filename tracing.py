@@ -0,0 +1,230 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import TRACE_EXPORTER, TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_BATCH_SIZE, TRACE_FLUSH_INTERVAL
+
+SERVICE_NAME = "umabot"
+
+class Span:
+	__slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+	def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict) -> None:
+		self.name = name
+		self.trace_id = trace_id
+		self.span_id = os.urandom(8).hex()
+		self.parent_id = parent_id
+		self.start_ns = time.time_ns()
+		self.end_ns = 0
+		self.attributes = attributes
+		self.error: str | None = None
+
+	def set(self, **attributes) -> None:
+		self.attributes.update(attributes)
+
+	def to_otlp(self) -> dict:
+		"""Span в JSON-кодировке OTLP (opentelemetry-proto)"""
+		span = {
+			"traceId": self.trace_id,
+			"spanId": self.span_id,
+			"name": self.name,
+			"kind": 1,
+			"startTimeUnixNano": str(self.start_ns),
+			"endTimeUnixNano": str(self.end_ns),
+			"attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+			"status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+		}
+		if self.parent_id:
+			span["parentSpanId"] = self.parent_id
+		return span
+
+def _otlp_attribute(key: str, value) -> dict:
+	if isinstance(value, bool):
+		return {"key": key, "value": {"boolValue": value}}
+	if isinstance(value, int):
+		return {"key": key, "value": {"intValue": str(value)}}
+	if isinstance(value, float):
+		return {"key": key, "value": {"doubleValue": value}}
+	return {"key": key, "value": {"stringValue": str(value)}}
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+def current_span() -> Span | None:
+	return _current_span.get()
+
+# --- Экспорт ---
+
+class SpanExporter:
+	"""Копит завершенные span'ы в очереди и выгружает их пачками из фонового потока, не задерживая обработку"""
+
+	def __init__(self, batch_size: int = TRACE_BATCH_SIZE, flush_interval: float = TRACE_FLUSH_INTERVAL) -> None:
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.logger = logging.getLogger(__name__)
+		self._queue: queue.SimpleQueue[Span | None] = queue.SimpleQueue()
+		self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+		self._thread.start()
+
+	def submit(self, span: Span) -> None:
+		self._queue.put(span)
+
+	def shutdown(self) -> None:
+		"""Выгружает все, что накопилось, и останавливает поток"""
+		if self._thread.is_alive():
+			self._queue.put(None)
+			self._thread.join(timeout=5)
+
+	def _run(self) -> None:
+		batch: list[Span] = []
+		deadline = time.monotonic() + self.flush_interval
+		while True:
+			try:
+				span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+			except queue.Empty:
+				span = False
+			if span is None:
+				self._flush(batch)
+				return
+			if span:
+				batch.append(span)
+			if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+				self._flush(batch)
+				batch = []
+				deadline = time.monotonic() + self.flush_interval
+
+	def _flush(self, batch: list[Span]) -> None:
+		if not batch:
+			return
+		try:
+			self.export(batch)
+		except Exception as e:
+			self.logger.warning(f"Не удалось выгрузить {len(batch)} span'ов: {e}")
+
+	def export(self, spans: list[Span]) -> None:
+		raise NotImplementedError
+
+class JsonlSpanExporter(SpanExporter):
+	"""Пишет span'ы в файл: одна строка — один span в JSON-кодировке OTLP"""
+
+	def __init__(self, path: str = TRACE_FILE, **kwargs) -> None:
+		self.path = path
+		super().__init__(**kwargs)
+
+	def export(self, spans: list[Span]) -> None:
+		with open(self.path, "a", encoding="utf-8") as f:
+			for span in spans:
+				f.write(json.dumps(span.to_otlp(), ensure_ascii=False) + "\n")
+
+class OtlpHttpSpanExporter(SpanExporter):
+	"""Отправляет span'ы в OTLP/HTTP коллектор (JSON, POST /v1/traces)"""
+
+	def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, **kwargs) -> None:
+		self.endpoint = endpoint.rstrip("/") + "/v1/traces"
+		super().__init__(**kwargs)
+
+	def export(self, spans: list[Span]) -> None:
+		import requests
+		payload = {"resourceSpans": [{
+			"resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+			"scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+		}]}
+		response = requests.post(self.endpoint, json=payload, timeout=5)
+		response.raise_for_status()
+
+_exporter: SpanExporter | None = None
+
+def configure(exporter: str = TRACE_EXPORTER) -> None:
+	"""Включает экспорт span'ов: "file", "otlp" или "none" (span'ы только связывают логи)"""
+	global _exporter
+	shutdown()
+	if exporter == "file":
+		_exporter = JsonlSpanExporter()
+	elif exporter == "otlp":
+		_exporter = OtlpHttpSpanExporter()
+
+def shutdown() -> None:
+	global _exporter
+	if _exporter is not None:
+		_exporter.shutdown()
+		_exporter = None
+
+atexit.register(shutdown)
+
+def _finish(span: Span) -> None:
+	span.end_ns = span.end_ns or time.time_ns()
+	if _exporter is not None:
+		_exporter.submit(span)
+
+@contextmanager
+def span(name: str, **attributes):
+	"""Дочерний span текущего (или корневой с новым trace_id); работает и с await внутри блока"""
+	parent = _current_span.get()
+	trace_id = parent.trace_id if parent else os.urandom(16).hex()
+	current = Span(name, trace_id, parent.span_id if parent else None, attributes)
+	token = _current_span.set(current)
+	try:
+		yield current
+	except BaseException as e:
+		current.error = f"{type(e).__name__}: {e}"
+		raise
+	finally:
+		_current_span.reset(token)
+		_finish(current)
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes) -> None:
+	"""Задним числом добавляет завершенный дочерний span (например, ожидание блокировки)"""
+	parent = _current_span.get()
+	if parent is None:
+		return
+	recorded = Span(name, parent.trace_id, parent.span_id, attributes)
+	recorded.start_ns = start_ns
+	recorded.end_ns = end_ns
+	_finish(recorded)
+
+# --- Логирование ---
+
+class TraceContextFilter(logging.Filter):
+	"""Добавляет в запись лога trace_id и span_id текущего запроса"""
+
+	def filter(self, record: logging.LogRecord) -> bool:
+		current = _current_span.get()
+		record.trace_id = current.trace_id if current else "-"
+		record.span_id = current.span_id if current else "-"
+		return True
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [trace=%(trace_id)s span=%(span_id)s] %(message)s'
+
+_listener: logging.handlers.QueueListener | None = None
+
+def setup_logging(level: int = logging.INFO) -> None:
+	"""Логи пишутся через очередь: обработчик лишь кладет запись в очередь, а форматирование и вывод
+	идут в отдельном потоке QueueListener, так что логирование не блокирует event loop"""
+	global _listener
+	if _listener is not None:
+		return
+	log_queue: queue.SimpleQueue = queue.SimpleQueue()
+	queue_handler = logging.handlers.QueueHandler(log_queue)
+	# Фильтр стоит на QueueHandler: он выполняется в потоке вызова, где виден контекст span'а
+	queue_handler.addFilter(TraceContextFilter())
+	stream_handler = logging.StreamHandler()
+	stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+	root = logging.getLogger()
+	root.handlers = [queue_handler]
+	root.setLevel(level)
+	_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+	_listener.start()
+	atexit.register(stop_logging)
+
+def stop_logging() -> None:
+	global _listener
+	if _listener is not None:
+		_listener.stop()
+		_listener = None